@@ -1,6 +1,3 @@
-import logging
-from sqlalchemy.engine import Engine
-from sqlalchemy import event
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
@@ -8,34 +5,51 @@ from flask_migrate import Migrate
 db = SQLAlchemy()
 migrate = Migrate()
 
-def create_app():
+def create_app(config_class='config.Config'):
     app = Flask(__name__)
     
-    app.config.from_object('config.Config')
+    app.config.from_object(config_class)
     
     print(f"Database connected: {app.config['SQLALCHEMY_DATABASE_URI']}")
     
+    from app import engine
+    engine.pool_options(app)
     db.init_app(app)
     migrate.init_app(app, db)
     
+    from app import allocation, assets, events, fragments, fulltext, images, inventory, occupancy, passwords, profiles, request_metrics, reservations, sql_metrics, throttle, waitlist
     with app.app_context():
+        # Engine listeners go on before create_all opens the first connection
+        engine.init_app(app, db.engine)
+        sql_metrics.init_app(app, db.engine)
+        request_metrics.init_app(app, db.engine)
+        
         from . import models
         db.create_all()
+        reservations.init_app(app, db.engine)
+    
+    assets.init_app(app)
+    images.init_app(app)
+    events.init_app(app)
+    fragments.init_app(app)
+    inventory.init_app(app)
+    profiles.init_app(app)
+    passwords.init_app(app)
+    throttle.init_app(app)
+    waitlist.init_app(app)
     
     
     from app.routes import main 
     
     app.register_blueprint(main)
     
-    
-    # Set up SQLAlchemy logging
-    logging.basicConfig()
-    logging.getLogger('sqlalchemy.engine').setLevel(logging.INFO)
-
-    @event.listens_for(Engine, "before_cursor_execute")
-    def log_sql_query(conn, cursor, statement, parameters, context, executemany):
-        logging.info("Executing SQL: %s", statement)
-        logging.info("With parameters: %s", parameters)
+    from app.cli import rooms_cli
+    app.cli.add_command(rooms_cli)
+    app.cli.add_command(assets.assets_cli)
+    app.cli.add_command(images.images_cli)
+    app.cli.add_command(allocation.applications_cli)
+    app.cli.add_command(events.events_cli)
+    app.cli.add_command(occupancy.occupancy_cli)
     
     
     return app
\ No newline at end of file
@@ -0,0 +1,246 @@
+"""Batch room allocation for Pending applications.
+
+`flask applications allocate` decides, in one run, which Pending
+applications are approved and into which room. A room's capacity is its
+total_rooms less the seats held by applications already past Pending, so
+the run also settles rooms that are oversubscribed, e.g. after an import
+lowered total_rooms.
+
+Applicants are served from a heap in priority order: PRIORITY_RULES in
+app/reservations.py (education level, then program type) and then
+submission order, i.e. application id. Each gets the room they applied for if it has a free
+seat, otherwise the room with the most free seats of the same room_type in
+the same building, otherwise of the same room_type anywhere. Alternatives
+come from per-group heaps of (-free seats, room id) that are corrected
+lazily, so every placement is O(log rooms). Rooms the student already has
+an application for are never offered as alternatives (the unique index on
+(student_id, room_id) would reject the move), and a student is placed at
+most once per run. Applicants who cannot be placed, and a placed
+student's other Pending applications, are Rejected. The result is written back in one transaction with
+executemany UPDATEs, and the room counters are recomputed from it. Seats
+still free afterwards go to the rooms' waitlists.
+"""
+import heapq
+import time
+from collections import Counter
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import bindparam, case, func, select, update
+
+from app import db, waitlist
+from app.events import record_status_changes
+from app.models import Application, Room
+from app.reservations import HOLDING_STATUSES, PRIORITY_RULES, priority_key, promote_waitlisted, run_with_retry
+
+applications_cli = AppGroup('applications', help='Batch jobs over applications.')
+
+PLACED_STATUS = 'Application Approved'
+UNPLACED_STATUS = 'Rejected'
+
+
+class Applicant:
+    # applied holds the student's other rooms, which cannot be alternatives
+    __slots__ = ('id', 'room_id', 'priority', 'student_id', 'applied')
+
+    def __init__(self, id, room_id, priority, student_id=None, applied=()):
+        self.id = id
+        self.room_id = room_id
+        self.priority = priority
+        self.student_id = student_id
+        self.applied = applied
+
+
+class RoomPool:
+    # Free seats per room with lazily corrected heaps per (room_type, building) and room_type
+    def __init__(self, rooms):
+        self.free = {}
+        self.kind = {}
+        self._groups = {}
+        for room_id, room_type, building, seats in rooms:
+            self.free[room_id] = seats
+            self.kind[room_id] = (room_type, building)
+            if seats > 0:
+                self._groups.setdefault((room_type, building), []).append((-seats, room_id))
+                self._groups.setdefault((room_type,), []).append((-seats, room_id))
+        for heap in self._groups.values():
+            heapq.heapify(heap)
+
+    def take(self, room_id):
+        if self.free.get(room_id, 0) <= 0:
+            return False
+        self.free[room_id] -= 1
+        room_type, building = self.kind[room_id]
+        # The old heap entries go stale; a fresh one keeps the room findable
+        if self.free[room_id] > 0:
+            heapq.heappush(self._groups[(room_type, building)], (-self.free[room_id], room_id))
+            heapq.heappush(self._groups[(room_type,)], (-self.free[room_id], room_id))
+        return True
+
+    def take_alternative(self, group, excluded=()):
+        heap = self._groups.get(group)
+        skipped = []
+        found = None
+        while heap:
+            seats, room_id = heapq.heappop(heap)
+            if -seats != self.free[room_id]:
+                continue
+            if room_id in excluded:
+                skipped.append((seats, room_id))
+                continue
+            self.take(room_id)
+            found = room_id
+            break
+        # Rooms passed over for this applicant stay available to others
+        for entry in skipped:
+            heapq.heappush(heap, entry)
+        return found
+
+    def place(self, room_id, excluded=()):
+        # Returns the room the applicant gets, or None
+        if self.take(room_id):
+            return room_id
+        kind = self.kind.get(room_id)
+        if kind is None:
+            return None
+        room_type, building = kind
+        for group in ((room_type, building), (room_type,)):
+            alternative = self.take_alternative(group, excluded)
+            if alternative is not None:
+                return alternative
+        return None
+
+
+def allocate(applicants, rooms):
+    """Place applicants into rooms.
+
+    applicants is an iterable of Applicant, rooms of (room_id, room_type,
+    building, free seats). Returns {application_id: room_id or None}; the
+    result depends only on the inputs, not on their order.
+    """
+    pool = RoomPool(rooms)
+    heap = [(applicant.priority, applicant.id, applicant) for applicant in applicants]
+    heapq.heapify(heap)
+    placements = {}
+    placed_students = set()
+    while heap:
+        _, application_id, applicant = heapq.heappop(heap)
+        if applicant.student_id is not None and applicant.student_id in placed_students:
+            placements[application_id] = None
+            continue
+        room_id = pool.place(applicant.room_id, applicant.applied)
+        placements[application_id] = room_id
+        if room_id is not None and applicant.student_id is not None:
+            placed_students.add(applicant.student_id)
+    return placements
+
+
+def load_applicants():
+    applications = Application.__table__
+    columns = [applications.c[name] for name, _ in PRIORITY_RULES]
+    rows = db.session.execute(
+        select(applications.c.id, applications.c.room_id, applications.c.student_id, *columns)
+        .where(applications.c.status == 'Pending')
+    ).all()
+    # Every room each student with more than one application has applied
+    # for, whatever the status; served by the (student_id, room_id) index
+    several = select(applications.c.student_id).group_by(applications.c.student_id).having(func.count() > 1)
+    applied = {}
+    for student_id, room_id in db.session.execute(
+        select(applications.c.student_id, applications.c.room_id)
+        .where(applications.c.student_id.in_(several), applications.c.room_id.is_not(None))
+    ):
+        applied.setdefault(student_id, set()).add(room_id)
+    return [
+        Applicant(row[0], row[1], priority_key(row[3:]), row[2], applied.get(row[2], set()) - {row[1]})
+        for row in rows
+    ]
+
+
+def load_rooms():
+    applications = Application.__table__
+    rooms = Room.__table__
+    # Seats held by applications that are already past Pending
+    held = dict(db.session.execute(
+        select(applications.c.room_id, func.count())
+        .where(applications.c.status.in_([status for status in HOLDING_STATUSES if status != 'Pending']))
+        .group_by(applications.c.room_id)
+    ).all())
+    rows = db.session.execute(select(rooms.c.id, rooms.c.room_type, rooms.c.building, rooms.c.total_rooms))
+    return held, [(room_id, room_type, building, max(0, total - held.get(room_id, 0))) for room_id, room_type, building, total in rows]
+
+
+def write_back(placements, held):
+    applications = Application.__table__
+    rooms = Room.__table__
+    rows = [
+        {'application': application_id, 'room': room_id, 'status': PLACED_STATUS if room_id is not None else UNPLACED_STATUS}
+        for application_id, room_id in placements.items()
+    ]
+    if rows:
+        # Rejected applications keep the room they applied for
+        db.session.execute(
+            update(applications)
+            .where(applications.c.id == bindparam('application'), applications.c.status == 'Pending')
+            .values(status=bindparam('status'), room_id=func.coalesce(bindparam('room'), applications.c.room_id)),
+            rows,
+        )
+        record_status_changes((row['application'], 'Pending', row['status']) for row in rows)
+    booked = Counter(held)
+    booked.update(room_id for room_id in placements.values() if room_id is not None)
+    totals = dict(db.session.execute(select(rooms.c.id, rooms.c.total_rooms)).all())
+    counters = [{'room': room_id, 'booked': booked.get(room_id, 0)} for room_id in totals]
+    if counters:
+        db.session.execute(
+            update(rooms)
+            .where(rooms.c.id == bindparam('room'))
+            .values(
+                booked_rooms=bindparam('booked'),
+                available_rooms=case((rooms.c.total_rooms > bindparam('booked'), rooms.c.total_rooms - bindparam('booked')), else_=0),
+            )
+            .execution_options(seat_counts=True),
+            counters,
+        )
+    free = {room_id: total - booked.get(room_id, 0) for room_id, total in totals.items() if total > booked.get(room_id, 0)}
+    for room_id in sorted(waitlist.waiting_rooms(free)):
+        promote_waitlisted(room_id, free[room_id])
+
+
+def run_allocation(dry_run=False):
+    # Returns (placements, timings); writes nothing when dry_run is set.
+    # Loading, allocating and writing share one transaction, so a busy
+    # error from a concurrent booking retries the whole run
+    timings = {}
+
+    def work():
+        start = time.perf_counter()
+        applicants = load_applicants()
+        held, rooms = load_rooms()
+        timings['load'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        placements = allocate(applicants, rooms)
+        timings['allocate'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        if not dry_run:
+            write_back(placements, held)
+        timings['write'] = time.perf_counter() - start
+        return placements
+
+    if dry_run:
+        placements = work()
+        db.session.rollback()
+        return placements, timings
+    return run_with_retry(work), timings
+
+
+@applications_cli.command('allocate')
+@click.option('--dry-run', is_flag=True, help='Compute the allocation without writing it.')
+def allocate_command(dry_run):
+    """Approve Pending applications into rooms, in priority order."""
+    placements, timings = run_allocation(dry_run)
+    placed = sum(1 for room_id in placements.values() if room_id is not None)
+    total = sum(timings.values())
+    click.echo(f"{len(placements)} pending: {placed} placed, {len(placements) - placed} unplaced in {total:.2f}s"
+               + (' (dry run, nothing written)' if dry_run else ''))
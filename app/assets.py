@@ -0,0 +1,171 @@
+"""Fingerprinted, precompressed static assets.
+
+`flask assets build` copies app/static (except uploads) into ASSET_BUILD_DIR
+under content-hashed names, points url() references inside CSS at the
+hashed names, writes .gz and .br siblings for text assets, and records
+everything in manifest.json. When a manifest is present, url_for('static',
+filename=...) in templates resolves to /assets/<hashed name>, served with a
+one-year immutable Cache-Control and the best precompressed variant the
+client accepts. Without a build, templates keep using /static. Rerun the
+build after changing anything under app/static.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+
+import click
+from flask import current_app, request, send_from_directory, url_for
+from flask.cli import AppGroup
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional, gzip alone still works
+    brotli = None
+
+assets_cli = AppGroup('assets', help='Build fingerprinted static assets.')
+
+MANIFEST = 'manifest.json'
+SKIP_DIRS = {'uploads'}
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt'}
+ONE_YEAR = 365 * 24 * 3600
+CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+
+def _fingerprint(path, data):
+    root, ext = posixpath.splitext(path)
+    return f"{root}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+
+
+def _source_files(source_dir):
+    for root, dirs, files in os.walk(source_dir):
+        dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS)
+        for name in sorted(files):
+            full = os.path.join(root, name)
+            yield os.path.relpath(full, source_dir).replace(os.sep, '/'), full
+
+
+def _rewrite_css(path, text, assets):
+    # url('../images/a.png') and url('/static/images/a.png') -> hashed name, relative to the CSS file
+    base = posixpath.dirname(path)
+
+    def replace(match):
+        quote, ref = match.groups()
+        if ref.startswith('/static/'):
+            target = ref[len('/static/'):]
+        elif ref.startswith(('/', 'data:', 'http:', 'https:', '#')):
+            return match.group(0)
+        else:
+            target = posixpath.normpath(posixpath.join(base, ref))
+        if target not in assets:
+            return match.group(0)
+        return f"url({quote}{posixpath.relpath(assets[target], base or '.')}{quote})"
+
+    return CSS_URL.sub(replace, text)
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as fh:
+        fh.write(data)
+
+
+def _compress(full_path, data):
+    # Keep a variant only when it is actually smaller
+    encodings = []
+    if brotli is not None:
+        compressed = brotli.compress(data, quality=11)
+        if len(compressed) < len(data):
+            _write(full_path + '.br', compressed)
+            encodings.append('br')
+    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(compressed) < len(data):
+        _write(full_path + '.gz', compressed)
+        encodings.append('gzip')
+    return encodings
+
+
+def build_assets(source_dir, build_dir):
+    """Build every static file into build_dir and return the manifest.
+
+    Files from earlier builds are left in place, pages cached before a
+    deploy may still reference them.
+    """
+    sources = dict(_source_files(source_dir))
+    assets = {}
+    encodings = {}
+    # CSS last, so its url() references can point at already hashed files
+    for path in sorted(sources, key=lambda p: (p.endswith('.css'), p)):
+        with open(sources[path], 'rb') as fh:
+            data = fh.read()
+        if path.endswith('.css'):
+            data = _rewrite_css(path, data.decode('utf-8'), assets).encode('utf-8')
+        hashed = _fingerprint(path, data)
+        full_path = os.path.join(build_dir, hashed)
+        _write(full_path, data)
+        assets[path] = hashed
+        if posixpath.splitext(path)[1].lower() in COMPRESSIBLE:
+            variants = _compress(full_path, data)
+            if variants:
+                encodings[hashed] = variants
+    manifest = {'assets': assets, 'encodings': encodings}
+    _write(os.path.join(build_dir, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+def load_manifest(build_dir):
+    try:
+        with open(os.path.join(build_dir, MANIFEST)) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {'assets': {}, 'encodings': {}}
+
+
+def asset_url_for(endpoint, **values):
+    # Template url_for: static files that were built resolve to their hashed copy
+    if endpoint == 'static':
+        hashed = current_app.extensions['assets']['assets'].get(values.get('filename'))
+        if hashed is not None:
+            endpoint, values['filename'] = 'assets', hashed
+    return url_for(endpoint, **values)
+
+
+def serve_asset(filename):
+    build_dir = current_app.config['ASSET_BUILD_DIR']
+    variants = current_app.extensions['assets']['encodings'].get(filename, ())
+    accepted = request.accept_encodings
+    encoding = next((name for name in variants if accepted[name]), None)
+    if encoding is None:
+        response = send_from_directory(build_dir, filename, max_age=ONE_YEAR)
+    else:
+        suffix = '.br' if encoding == 'br' else '.gz'
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = send_from_directory(build_dir, filename + suffix, mimetype=mimetype, max_age=ONE_YEAR)
+        response.headers['Content-Encoding'] = encoding
+    if variants:
+        response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def init_app(app):
+    app.config.setdefault('ASSET_BUILD_DIR', os.path.join(os.path.dirname(app.root_path), 'build', 'assets'))
+    app.extensions['assets'] = load_manifest(app.config['ASSET_BUILD_DIR'])
+    app.add_url_rule('/assets/<path:filename>', 'assets', serve_asset)
+    app.jinja_env.globals['url_for'] = asset_url_for
+
+
+@assets_cli.command('build')
+def build_command():
+    """Fingerprint and precompress app/static into ASSET_BUILD_DIR."""
+    build_dir = current_app.config['ASSET_BUILD_DIR']
+    manifest = build_assets(current_app.static_folder, build_dir)
+    current_app.extensions['assets'] = manifest
+    compressed = sum(len(variants) for variants in manifest['encodings'].values())
+    click.echo(f"Built {len(manifest['assets'])} assets ({compressed} precompressed variants) in {build_dir}")
+    if brotli is None:
+        click.echo('brotli is not installed, only gzip variants were written')
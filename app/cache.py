@@ -0,0 +1,106 @@
+"""A small thread-safe LRU cache bounded by entry count and total size, and
+the per-transaction change tracking the in-process caches invalidate with."""
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class LRUCache:
+    def __init__(self, max_entries=256, max_bytes=None, sizeof=len):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or (self.max_bytes is not None and self._bytes > self.max_bytes):
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def discard(self, key):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size(self):
+        return self._bytes
+
+
+class TransactionChanges:
+    """What the current transaction changed, for one in-process cache.
+
+    Listeners collect changes in get(session), a dict kept in session.info
+    until the transaction ends. Bulk INSERT/UPDATE/DELETE statements on
+    table_name set 'stale' in it, unless tagged with the execution option
+    named by tracked, and are passed to on_bulk_write. After a commit
+    apply(changes) runs with whatever was collected; a rollback drops it.
+    """
+
+    def __init__(self, name, table_name, apply, tracked=None, on_bulk_write=None):
+        self.name = name
+        self.table_name = table_name
+        self.apply = apply
+        self.tracked = tracked
+        self.on_bulk_write = on_bulk_write
+        event.listen(Session, 'do_orm_execute', self._collect_bulk_write)
+        event.listen(Session, 'after_commit', self._commit)
+        event.listen(Session, 'after_rollback', self._rollback)
+
+    def get(self, session):
+        return session.info.setdefault(self.name, {})
+
+    def _collect_bulk_write(self, orm_execute_state):
+        if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+            return
+        # Covers both ORM statements and Core statements against the table
+        table = getattr(orm_execute_state.statement, 'table', None)
+        if getattr(table, 'name', None) != self.table_name:
+            return
+        session = orm_execute_state.session
+        if self.tracked is None or not orm_execute_state.execution_options.get(self.tracked):
+            self.get(session)['stale'] = True
+        if self.on_bulk_write is not None:
+            self.on_bulk_write(session)
+
+    def _commit(self, session):
+        changes = session.info.pop(self.name, None)
+        if changes:
+            self.apply(changes)
+
+    def _rollback(self, session):
+        session.info.pop(self.name, None)
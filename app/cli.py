@@ -0,0 +1,233 @@
+"""flask rooms import / export.
+
+Room inventory is loaded from CSV or JSON Lines, streamed row by row,
+validated, and written in batches. Each batch is one executemany INSERT
+... ON CONFLICT(id) DO UPDATE in its own transaction. Rows without an id
+are inserted as new rooms. available_rooms is always recomputed as
+total_rooms - booked_rooms. A row that gives booked_rooms replaces the
+stored counter; a row without it keeps the seats already taken through
+the app and is rejected if its total_rooms is below them. Afterwards,
+responsive variants of the room images are generated (app/images.py)
+unless --no-images is given.
+"""
+import csv
+import json
+import sys
+import time
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import insert, select
+
+from app import db, images
+from app.models import Room
+
+rooms_cli = AppGroup('rooms', help='Import and export the room inventory.')
+
+FIELDS = ['id', 'building', 'room_type', 'floor_number', 'description', 'total_rooms', 'booked_rooms', 'available_rooms', 'image_url']
+
+
+class RowError(ValueError):
+    pass
+
+
+def _int(row, name, required=True, minimum=0):
+    value = row.get(name)
+    if value in (None, ''):
+        if required:
+            raise RowError(f"{name} is required")
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise RowError(f"{name} must be an integer") from None
+    if value < minimum:
+        raise RowError(f"{name} must be at least {minimum}")
+    return value
+
+
+def _text(row, name):
+    value = row.get(name)
+    if value is None or not str(value).strip():
+        raise RowError(f"{name} is required")
+    return str(value).strip()
+
+
+def validate_row(row):
+    values = {
+        'id': _int(row, 'id', required=False, minimum=1),
+        'building': _int(row, 'building', minimum=1),
+        'room_type': _text(row, 'room_type'),
+        'floor_number': _int(row, 'floor_number'),
+        'description': _text(row, 'description'),
+        'total_rooms': _int(row, 'total_rooms'),
+        # None when the file does not give it: existing rooms keep theirs
+        'booked_rooms': _int(row, 'booked_rooms', required=False),
+        'image_url': _text(row, 'image_url'),
+    }
+    if (values['booked_rooms'] or 0) > values['total_rooms']:
+        raise RowError('booked_rooms cannot exceed total_rooms')
+    values['available_rooms'] = values['total_rooms'] - (values['booked_rooms'] or 0)
+    return values
+
+
+def read_rows(stream, fmt):
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    else:
+        for line in stream:
+            if line.strip():
+                try:
+                    value = json.loads(line)
+                except ValueError as exc:
+                    yield RowError(f"invalid JSON: {exc}")
+                    continue
+                yield value if isinstance(value, dict) else RowError("expected a JSON object")
+
+
+def _upsert_statements():
+    # (upsert that sets booked_rooms from the file, upsert that keeps the stored one)
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        raise click.ClickException(f"Upserts are not supported on {dialect}")
+    rooms = Room.__table__
+    stmt = dialect_insert(rooms)
+    given = stmt.on_conflict_do_update(
+        index_elements=['id'],
+        set_={name: stmt.excluded[name] for name in FIELDS if name != 'id'},
+    )
+    set_ = {name: stmt.excluded[name] for name in FIELDS if name not in ('id', 'booked_rooms', 'available_rooms')}
+    set_['available_rooms'] = stmt.excluded.total_rooms - rooms.c.booked_rooms
+    # Rooms the WHERE leaves alone are not returned, and are rejected
+    kept = stmt.on_conflict_do_update(
+        index_elements=['id'], set_=set_, where=rooms.c.booked_rooms <= stmt.excluded.total_rooms,
+    ).returning(rooms.c.id)
+    return given, kept
+
+
+def write_batch(upserts, batch):
+    # batch is [(line number, values)]. Rows with an id are upserts, rows
+    # without one are new rooms. Returns [(line number, RowError)] for rows
+    # that were not written
+    given, kept = upserts
+    with_booked = [row for _, row in batch if row['id'] is not None and row['booked_rooms'] is not None]
+    without_booked = [(line_number, row) for line_number, row in batch if row['id'] is not None and row['booked_rooms'] is None]
+    new = [{k: v for k, v in row.items() if k != 'id'} for _, row in batch if row['id'] is None]
+    errors = []
+    if with_booked:
+        db.session.execute(given, with_booked)
+    if without_booked:
+        written = set(db.session.execute(kept, [{**row, 'booked_rooms': 0} for _, row in without_booked]).scalars())
+        errors = [
+            (line_number, RowError(f"total_rooms is below the seats already booked in room {row['id']}"))
+            for line_number, row in without_booked if row['id'] not in written
+        ]
+    if new:
+        db.session.execute(insert(Room.__table__), [{**row, 'booked_rooms': row['booked_rooms'] or 0} for row in new])
+    db.session.commit()
+    return errors
+
+
+def import_rooms(stream, fmt='csv', batch_size=1000, on_error=None):
+    # Returns (rows written, rows rejected)
+    upserts = _upsert_statements()
+    written = rejected = 0
+    batch = []
+
+    def flush():
+        nonlocal written, rejected
+        errors = write_batch(upserts, batch)
+        written += len(batch) - len(errors)
+        rejected += len(errors)
+        for line_number, exc in errors:
+            if on_error:
+                on_error(line_number, exc)
+        batch.clear()
+
+    for line_number, row in enumerate(read_rows(stream, fmt), start=2 if fmt == 'csv' else 1):
+        try:
+            if isinstance(row, RowError):
+                raise row
+            batch.append((line_number, validate_row(row)))
+        except RowError as exc:
+            rejected += 1
+            if on_error:
+                on_error(line_number, exc)
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return written, rejected
+
+
+def export_rooms(stream, fmt='csv', batch_size=1000):
+    rows = db.session.execute(
+        select(*(Room.__table__.c[name] for name in FIELDS)).order_by(Room.id).execution_options(yield_per=batch_size)
+    )
+    count = 0
+    if fmt == 'csv':
+        writer = csv.writer(stream)
+        writer.writerow(FIELDS)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in rows:
+            stream.write(json.dumps(dict(zip(FIELDS, row))) + '\n')
+            count += 1
+    return count
+
+
+def _open(path, mode):
+    # '-' means stdin/stdout; files are opened with newline='' for the csv module
+    if path == '-':
+        return click.open_file(path, mode)
+    return open(path, mode, encoding='utf-8', newline='')
+
+
+def _format(path, fmt):
+    if fmt:
+        return fmt
+    return 'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+@rooms_cli.command('import')
+@click.argument('path', type=click.Path(allow_dash=True))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension.')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows per transaction.')
+@click.option('--images/--no-images', 'build_images', default=True, help='Generate image variants for the imported rooms.')
+def import_command(path, fmt, batch_size, build_images):
+    """Load rooms from a CSV or JSON Lines file ('-' for stdin)."""
+    fmt = _format(path, fmt)
+
+    def report(line_number, exc):
+        click.echo(f"line {line_number}: {exc}", err=True)
+
+    start = time.perf_counter()
+    with _open(path, 'r') as stream:
+        written, rejected = import_rooms(stream, fmt, batch_size, on_error=report)
+    click.echo(f"Imported {written} rooms ({rejected} rejected) in {time.perf_counter() - start:.2f}s")
+    if build_images and written:
+        # Incremental, images that were already processed are skipped
+        if images.Image is None:
+            click.echo('Pillow is not installed, skipping image variants', err=True)
+        else:
+            images.report(*images.build_room_images())
+    if rejected:
+        sys.exit(1)
+
+
+@rooms_cli.command('export')
+@click.argument('path', type=click.Path(allow_dash=True), default='-')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension.')
+def export_command(path, fmt):
+    """Write every room to a CSV or JSON Lines file ('-' for stdout)."""
+    with _open(path, 'w') as stream:
+        count = export_rooms(stream, _format(path, fmt))
+    if path != '-':
+        click.echo(f"Exported {count} rooms to {path}")
@@ -0,0 +1,46 @@
+"""Per-connection SQLite tuning.
+
+Applies SQLITE_PRAGMAS to every new DBAPI connection through the engine's
+connect event. WAL lets readers keep going while a booking commits, and
+busy_timeout makes writers wait for the lock instead of failing straight
+away with "database is locked". Other databases are left untouched.
+
+pool_options drops the pool sizing from SQLALCHEMY_ENGINE_OPTIONS for
+in-memory SQLite, which runs on one shared connection (StaticPool) that
+does not take pool_size, max_overflow or pool_timeout.
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+POOL_SIZING = ('pool_size', 'max_overflow', 'pool_timeout')
+
+
+def is_memory_sqlite(uri):
+    url = make_url(uri)
+    if url.get_backend_name() != 'sqlite':
+        return False
+    return url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory'
+
+
+def pool_options(app):
+    # Runs before db.init_app, which creates the engine from these options
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    if is_memory_sqlite(app.config['SQLALCHEMY_DATABASE_URI']):
+        for name in POOL_SIZING:
+            options.pop(name, None)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+
+def init_app(app, engine):
+    pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
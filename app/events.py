@@ -0,0 +1,156 @@
+"""Append-only history of applications.
+
+Every creation, status change, edit and receipt upload adds one row to
+application_events in the transaction that made the change. ORM changes
+are picked up by mapper events, which insert straight from the flush
+using the attribute history already in memory. The set-based paths
+(release, promotion, bulk transitions, allocation) call
+record_status_changes with the statuses they already hold. Either way a
+write is a single INSERT with no read before it.
+
+Rows are never updated. `flask events prune` deletes rows older than
+EVENT_RETENTION_DAYS in batches of EVENT_PRUNE_BATCH_SIZE, one transaction
+per batch, so it never holds the write lock for long.
+"""
+import csv
+import io
+import json
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app, has_request_context, session
+from flask.cli import AppGroup
+from sqlalchemy import delete, event, insert, inspect, select
+
+from app import db
+from app.models import Application, ApplicationEvent, Receipt
+
+events_cli = AppGroup('events', help='Export and prune the application event log.')
+
+EVENTS = ApplicationEvent.__table__
+EXPORT_FIELDS = ['id', 'ts', 'application_id', 'kind', 'old_status', 'new_status', 'actor', 'detail']
+# Columns whose changes are logged as edits; status has its own events
+EDIT_FIELDS = [column.key for column in Application.__table__.columns if column.key not in ('id', 'status')]
+
+
+def _actor():
+    if has_request_context():
+        student_id = session.get('student_id')
+        if student_id is not None:
+            return str(student_id)
+    return None
+
+
+def event_row(application_id, kind, old_status=None, new_status=None, detail=None, actor=None, ts=None):
+    return {
+        'application_id': application_id,
+        'ts': ts or datetime.utcnow(),
+        'kind': kind,
+        'old_status': old_status,
+        'new_status': new_status,
+        'actor': actor if actor is not None else _actor(),
+        'detail': json.dumps(detail) if detail is not None else None,
+    }
+
+
+def record_status_changes(changes, kind='status'):
+    # changes is an iterable of (application_id, old_status, new_status), written in the current transaction
+    ts, actor = datetime.utcnow(), _actor()
+    rows = [event_row(application_id, kind, old, new, actor=actor, ts=ts) for application_id, old, new in changes]
+    if rows:
+        db.session.execute(insert(EVENTS), rows)
+
+
+def export_events(fmt='jsonl', application_id=None, batch_size=1000):
+    # Yields the log oldest first as CSV or JSON Lines chunks, batch_size rows at a time
+    query = select(*(EVENTS.c[name] for name in EXPORT_FIELDS)).order_by(EVENTS.c.id)
+    if application_id is not None:
+        query = query.where(EVENTS.c.application_id == application_id)
+    result = db.session.execute(query.execution_options(yield_per=batch_size))
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+    if writer:
+        writer.writerow(EXPORT_FIELDS)
+    for partition in result.partitions():
+        for row in partition:
+            values = dict(zip(EXPORT_FIELDS, row))
+            values['ts'] = values['ts'].isoformat()
+            if writer:
+                writer.writerow(values.values())
+            else:
+                buffer.write(json.dumps(values) + '\n')
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def prune(before, batch_size=5000, pause=0):
+    # Delete events older than before, oldest first, one transaction per batch. Returns rows deleted
+    deleted = 0
+    while True:
+        oldest = select(EVENTS.c.id).where(EVENTS.c.ts < before).order_by(EVENTS.c.ts).limit(batch_size)
+        result = db.session.execute(delete(EVENTS).where(EVENTS.c.id.in_(oldest.scalar_subquery())))
+        db.session.commit()
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            return deleted
+        if pause:
+            time.sleep(pause)
+
+
+def init_app(app):
+    app.config.setdefault('EVENT_RETENTION_DAYS', 365)
+    app.config.setdefault('EVENT_PRUNE_BATCH_SIZE', 5000)
+
+
+@event.listens_for(Application, 'after_insert')
+def _application_created(mapper, connection, target):
+    connection.execute(insert(EVENTS), [event_row(target.id, 'created', new_status=target.status)])
+
+
+@event.listens_for(Application, 'after_update')
+def _application_updated(mapper, connection, target):
+    state = inspect(target)
+    rows = []
+    status = state.attrs.status.history
+    if status.has_changes():
+        old = status.deleted[0] if status.deleted else None
+        rows.append(event_row(target.id, 'status', old_status=old, new_status=target.status))
+    edited = [name for name in EDIT_FIELDS if state.attrs[name].history.has_changes()]
+    if edited:
+        rows.append(event_row(target.id, 'edit', new_status=target.status, detail={'fields': edited}))
+    if rows:
+        connection.execute(insert(EVENTS), rows)
+
+
+@event.listens_for(Receipt, 'after_insert')
+@event.listens_for(Receipt, 'after_update')
+def _receipt_uploaded(mapper, connection, target):
+    detail = {'sha256': target.sha256, 'size': target.size, 'filename': target.original_filename}
+    connection.execute(insert(EVENTS), [event_row(target.application_id, 'upload', detail=detail)])
+
+
+@events_cli.command('prune')
+@click.option('--days', type=int, help='Keep this many days of events; defaults to EVENT_RETENTION_DAYS.')
+@click.option('--batch-size', type=int, help='Rows per delete; defaults to EVENT_PRUNE_BATCH_SIZE.')
+@click.option('--pause', type=float, default=0.0, help='Seconds to sleep between batches.')
+def prune_command(days, batch_size, pause):
+    """Delete events older than the retention period."""
+    days = days if days is not None else current_app.config['EVENT_RETENTION_DAYS']
+    batch_size = batch_size or current_app.config['EVENT_PRUNE_BATCH_SIZE']
+    before = datetime.utcnow() - timedelta(days=days)
+    deleted = prune(before, batch_size, pause)
+    click.echo(f"Deleted {deleted} events from before {before:%Y-%m-%d %H:%M}")
+
+
+@events_cli.command('export')
+@click.argument('path', type=click.Path(allow_dash=True), default='-')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default='jsonl')
+def export_command(path, fmt):
+    """Write the event log to a CSV or JSON Lines file ('-' for stdout)."""
+    with click.open_file(path, 'w', encoding='utf-8') as stream:
+        for chunk in export_events(fmt):
+            stream.write(chunk)
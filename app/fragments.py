@@ -0,0 +1,135 @@
+"""Cached template fragments for room cards.
+
+Templates wrap markup in {% cache key, ... %} ... {% endcache %}. The body
+is rendered once per key and kept in a per-worker LRU capped at
+FRAGMENT_CACHE_MAX_ENTRIES entries and FRAGMENT_CACHE_MAX_BYTES characters.
+Room cards key on room_version(room.id), a per-room counter bumped on
+commit for rooms the Room mapper reported in after_update/after_delete.
+Bulk statements on the rooms table drop the whole cache on commit, except
+seat counter updates tagged with execution_options(seat_counts=True);
+cards that show seat counts add them to the key instead. Entries also
+expire after FRAGMENT_CACHE_MAX_AGE seconds so edits made by other
+workers show up.
+"""
+import itertools
+import threading
+import time
+
+from flask import current_app, has_app_context
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.cache import LRUCache, TransactionChanges
+from app.models import Room
+
+
+class FragmentCache:
+    def __init__(self, max_entries, max_bytes, max_age=None):
+        self.max_age = max_age
+        self._entries = LRUCache(max_entries=max_entries, max_bytes=max_bytes, sizeof=lambda entry: len(entry[0]))
+        self._versions = {}
+        # Versions are never reused, so a render racing an invalidation cannot
+        # store old markup under a current key
+        self._generation = itertools.count(1)
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def room_version(self, room_id):
+        return self._versions.get(room_id, self._epoch)
+
+    def bump_rooms(self, room_ids):
+        with self._lock:
+            for room_id in room_ids:
+                self._versions[room_id] = next(self._generation)
+
+    def clear(self):
+        with self._lock:
+            self._versions.clear()
+            self._epoch = next(self._generation)
+        self._entries.clear()
+
+    def render(self, key, render):
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None and (self.max_age is None or now - entry[1] < self.max_age):
+            return entry[0]
+        html = render()
+        self._entries.put(key, (html, now))
+        return html
+
+    @property
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'size': self._entries.size,
+            'hits': self._entries.hits,
+            'misses': self._entries.misses,
+        }
+
+
+class FragmentCacheExtension(Extension):
+    # {% cache 'room_card', room.id, room_version(room.id) %}...{% endcache %}
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        key = nodes.Tuple(parts, 'load', lineno=lineno)
+        return nodes.CallBlock(self.call_method('_render', [key]), [], [], body).set_lineno(lineno)
+
+    def _render(self, key, caller):
+        fragments = _active_fragments()
+        if fragments is None:
+            return caller()
+        return Markup(fragments.render(key, caller))
+
+
+def init_app(app):
+    app.config.setdefault('FRAGMENT_CACHE_MAX_ENTRIES', 5000)
+    app.config.setdefault('FRAGMENT_CACHE_MAX_BYTES', 4 * 1024 * 1024)
+    app.config.setdefault('FRAGMENT_CACHE_MAX_AGE', 300)
+    fragments = FragmentCache(
+        app.config['FRAGMENT_CACHE_MAX_ENTRIES'],
+        app.config['FRAGMENT_CACHE_MAX_BYTES'],
+        app.config['FRAGMENT_CACHE_MAX_AGE'],
+    )
+    app.extensions['fragment_cache'] = fragments
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.globals['room_version'] = fragments.room_version
+
+
+def get_fragments():
+    return current_app.extensions['fragment_cache']
+
+
+def _active_fragments():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('fragment_cache')
+
+
+def _apply_changes(changes):
+    fragments = _active_fragments()
+    if fragments is None:
+        return
+    if changes.get('stale'):
+        fragments.clear()
+    elif changes.get('rooms'):
+        fragments.bump_rooms(changes['rooms'])
+
+
+_changes = TransactionChanges('room_fragments', Room.__tablename__, _apply_changes, tracked='seat_counts')
+
+
+@event.listens_for(Room, 'after_update')
+@event.listens_for(Room, 'after_delete')
+def _collect_room_update(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        _changes.get(session).setdefault('rooms', set()).add(target.id)
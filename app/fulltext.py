@@ -0,0 +1,95 @@
+"""Keyword search over room descriptions with SQLite FTS5.
+
+rooms_fts is an external-content FTS5 index over rooms.description (the
+text lives only in rooms). Triggers on rooms keep it in step on insert,
+delete and on updates of description, so seat counter updates never touch
+it. The migration creates the index and triggers for existing databases;
+create_all creates them for new ones.
+
+rank_matches joins the index to an already filtered Room query and adds
+bm25() as a column, so the text match, the structured filters and the
+ranking run as one statement. Pages are keyed on (rank, id). Where FTS5
+is not available the keywords become LIKE filters instead.
+"""
+import re
+
+from flask import current_app
+from sqlalchemy import column, event, func, literal_column, table, text
+
+from app import db
+from app.models import Room
+
+FTS_TABLE = 'rooms_fts'
+# Longer queries are cut to this many terms
+MAX_TERMS = 8
+
+FTS_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "description, content='rooms', content_rowid='id', tokenize='porter unicode61')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON rooms BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, description) VALUES (new.id, new.description); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON rooms BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description) VALUES ('delete', old.id, old.description); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF description ON rooms BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description) VALUES ('delete', old.id, old.description); "
+    f"INSERT INTO {FTS_TABLE}(rowid, description) VALUES (new.id, new.description); END",
+]
+
+_fts = table(FTS_TABLE, column('rowid'))
+
+
+def keyword_terms(keywords):
+    # Words only, so user input can never be read as FTS5 query syntax
+    return re.findall(r'\w+', (keywords or '').lower())[:MAX_TERMS]
+
+
+def match_expression(terms):
+    # Every term must match; quoting keeps words like AND/NEAR literal
+    return ' '.join(f'"{term}"' for term in terms)
+
+
+def _has_fts(connection):
+    if connection.dialect.name != 'sqlite':
+        return False
+    return bool(connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': FTS_TABLE}
+    ).scalar())
+
+
+def fts_available():
+    available = current_app.extensions.get('room_fulltext')
+    if available is None:
+        available = current_app.extensions['room_fulltext'] = _has_fts(db.session.connection())
+    return available
+
+
+def rank_matches(query, keywords):
+    # (query, rank) with the text match applied and bm25 added as a column,
+    # best first when ordered by rank; None when FTS5 is not available
+    if not fts_available():
+        return None
+    rank = func.bm25(literal_column(FTS_TABLE))
+    query = (
+        query.join(_fts, _fts.c.rowid == Room.id)
+        .filter(text(f"{FTS_TABLE} MATCH :match").bindparams(match=match_expression(keyword_terms(keywords))))
+        .add_columns(rank)
+    )
+    return query, rank
+
+
+def like_matches(query, keywords):
+    for term in keyword_terms(keywords):
+        query = query.filter(Room.description.ilike(f'%{term}%'))
+    return query
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_index(target, connection, **kw):
+    # Creates the index next to existing rooms too, so it is filled here
+    if connection.dialect.name != 'sqlite' or _has_fts(connection):
+        return
+    if not connection.execute(text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar():
+        return
+    for statement in FTS_DDL:
+        connection.execute(text(statement))
+    connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
@@ -0,0 +1,197 @@
+"""Responsive derivatives for room images.
+
+`flask images build` (and `flask rooms import`, once the rows are in) takes
+every image referenced by Room.image_url and writes resized copies at
+IMAGE_WIDTHS plus WebP versions next to the original, e.g.
+images/singleroom-irvine-320w.png and images/singleroom-irvine-320w.webp.
+Images are never upscaled. Resizing runs in a process pool of
+IMAGE_WORKERS processes. The manifest (IMAGE_MANIFEST) records the source's
+SHA-256, so unchanged images are skipped on the next run. Templates call
+image_srcset(path, format) to build srcset attributes from it.
+
+Pillow is needed to generate derivatives; without it the build is
+skipped and templates fall back to the original image.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import posixpath
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import select
+
+from app import db
+from app.assets import asset_url_for
+from app.models import Room
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - optional
+    Image = None
+
+images_cli = AppGroup('images', help='Generate responsive room image variants.')
+
+WEBP_QUALITY = 80
+# JPEG has no alpha or palette, and WebP no CMYK: these are saved as RGB
+JPEG_EXTS = ('jpg', 'jpeg')
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _variant_path(path, width, ext):
+    root = posixpath.splitext(path)[0]
+    return f"{root}-{width}w.{ext}"
+
+
+def _source_path(static_dir, path):
+    # Absolute path of a source image, or None if path leads outside static_dir
+    root = os.path.realpath(static_dir)
+    full = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, full]) != root:
+        return None
+    return full
+
+
+def render_variants(static_dir, path, widths):
+    # Runs in a pool worker: returns the manifest entry for one source image
+    with Image.open(os.path.join(static_dir, path)) as source:
+        source.load()
+        ext = posixpath.splitext(path)[1].lstrip('.').lower()
+        if source.mode == 'CMYK' or (ext in JPEG_EXTS and source.mode not in ('RGB', 'L')):
+            source = source.convert('RGB')
+        elif source.mode in ('P', '1'):
+            # Palette images would otherwise be resized with nearest-neighbour
+            source = source.convert('RGBA' if 'transparency' in source.info else 'RGB')
+        original_width, original_height = source.size
+        sizes = sorted({width for width in widths if width < original_width} | {original_width})
+        variants = {ext: [], 'webp': []}
+        for width in sizes:
+            if width == original_width:
+                resized = source
+                variants[ext].append([width, path])
+            else:
+                height = max(1, round(original_height * width / original_width))
+                resized = source.resize((width, height), Image.LANCZOS)
+                target = _variant_path(path, width, ext)
+                resized.save(os.path.join(static_dir, target), optimize=True)
+                variants[ext].append([width, target])
+            target = _variant_path(path, width, 'webp')
+            resized.save(os.path.join(static_dir, target), 'WEBP', quality=WEBP_QUALITY)
+            variants['webp'].append([width, target])
+    return {'width': original_width, 'widths': list(widths), 'variants': variants}
+
+
+def load_manifest(manifest_path):
+    try:
+        with open(manifest_path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def _up_to_date(static_dir, entry, digest, widths):
+    if entry is None or entry.get('sha256') != digest or entry.get('widths') != list(widths):
+        return False
+    return all(
+        os.path.exists(os.path.join(static_dir, target))
+        for targets in entry['variants'].values()
+        for _, target in targets
+    )
+
+
+def build_images(static_dir, paths, widths, workers, manifest_path):
+    """Generate variants for paths and return (generated, skipped, missing).
+
+    Paths that resolve outside static_dir are reported as missing.
+    """
+    if Image is None:
+        raise RuntimeError('Pillow is required to generate image variants')
+    manifest = load_manifest(manifest_path)
+    todo = {}
+    skipped = []
+    missing = []
+    for path in sorted(set(paths)):
+        full = _source_path(static_dir, path)
+        if full is None or not os.path.isfile(full):
+            missing.append(path)
+            continue
+        digest = _sha256(full)
+        if _up_to_date(static_dir, manifest.get(path), digest, widths):
+            skipped.append(path)
+        else:
+            todo[path] = digest
+
+    if todo:
+        if workers and len(todo) > 1:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                futures = {path: pool.submit(render_variants, static_dir, path, widths) for path in todo}
+                entries = {path: future.result() for path, future in futures.items()}
+        else:
+            entries = {path: render_variants(static_dir, path, widths) for path in todo}
+        for path, entry in entries.items():
+            entry['sha256'] = todo[path]
+            manifest[path] = entry
+        tmp_path = manifest_path + '.tmp'
+        with open(tmp_path, 'w') as fh:
+            json.dump(manifest, fh, indent=2, sort_keys=True)
+        os.replace(tmp_path, manifest_path)
+    return sorted(todo), skipped, missing
+
+
+def room_image_paths():
+    return db.session.execute(select(Room.image_url).distinct()).scalars().all()
+
+
+def build_room_images():
+    # Variants for every image a room points at, shared by the CLI and the import hook
+    config = current_app.config
+    result = build_images(
+        current_app.static_folder, room_image_paths(), config['IMAGE_WIDTHS'],
+        config['IMAGE_WORKERS'], config['IMAGE_MANIFEST'],
+    )
+    current_app.extensions['image_manifest'] = load_manifest(config['IMAGE_MANIFEST'])
+    return result
+
+
+def image_srcset(path, fmt=None):
+    # "url 320w, url 640w" for path in fmt (default: the original format), '' if not built
+    entry = current_app.extensions['image_manifest'].get(path)
+    if entry is None:
+        return ''
+    fmt = fmt or posixpath.splitext(path)[1].lstrip('.').lower()
+    return ', '.join(
+        f"{asset_url_for('static', filename=target)} {width}w"
+        for width, target in entry['variants'].get(fmt, ())
+    )
+
+
+def init_app(app):
+    app.config.setdefault('IMAGE_WIDTHS', (320, 640, 960))
+    app.config.setdefault('IMAGE_WORKERS', 2)
+    app.config.setdefault('IMAGE_MANIFEST', os.path.join(app.static_folder, 'images', 'variants.json'))
+    app.extensions['image_manifest'] = load_manifest(app.config['IMAGE_MANIFEST'])
+    app.jinja_env.globals['image_srcset'] = image_srcset
+
+
+def report(generated, skipped, missing):
+    click.echo(f"Image variants: {len(generated)} generated, {len(skipped)} unchanged")
+    for path in missing:
+        click.echo(f"  missing source image: {path}", err=True)
+
+
+@images_cli.command('build')
+def build_command():
+    """Generate resized and WebP variants for every room image."""
+    if Image is None:
+        raise click.ClickException('Pillow is required to generate image variants (pip install Pillow)')
+    report(*build_room_images())
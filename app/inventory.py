@@ -0,0 +1,215 @@
+"""In-process room inventory index used by room_search.
+
+The rooms table is small and read on every search, so each worker keeps a
+snapshot of it grouped by (room_type, building, floor_number). The snapshot
+is built lazily, patched from session events when rooms are flushed and
+committed, and dropped entirely after bulk UPDATE/DELETE statements or once
+it is older than ROOM_INVENTORY_MAX_AGE (other workers may have written).
+Seat changes from take_seat/give_back_seat are tagged inventory_tracked and
+hand their RETURNING counters to record_seats, so bookings patch the
+snapshot instead of dropping it.
+
+Searches iterate the snapshot without the lock. Patches therefore never
+resize a dict or set a reader may hold: they copy what they change and
+swap the copies in, and only replace records in place.
+
+Every transaction that writes rooms also bumps the single-row
+inventory_version counter, so readers can tell cheaply whether anything
+changed (the JSON room API uses it for ETags and to resync the snapshot).
+"""
+import threading
+import time
+from collections import namedtuple
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+
+from app import db
+from app.cache import LRUCache, TransactionChanges
+from app.models import InventoryVersion, Room
+
+RoomRecord = namedtuple('RoomRecord', [column.name for column in Room.__table__.columns])
+
+
+def room_sort_key(room):
+    # Same order as room_search's keyset pagination
+    return (room.building, room.floor_number, room.id)
+
+
+def _record(room):
+    return RoomRecord(*(getattr(room, name) for name in RoomRecord._fields))
+
+
+class RoomInventory:
+    def __init__(self, max_age=None):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._rooms = None
+        self._buckets = None
+        self._built_at = 0.0
+        self._version = None
+
+    def sync(self, version):
+        # Drop the snapshot if rooms changed since the last version seen here
+        with self._lock:
+            if version != self._version:
+                self._rooms = None
+                self._buckets = None
+                self._version = version
+
+    def invalidate(self):
+        with self._lock:
+            self._rooms = None
+            self._buckets = None
+
+    def patch(self, changes):
+        # changes maps room id -> RoomRecord, or None for deleted rooms
+        with self._lock:
+            if self._rooms is None:
+                return
+            rooms, buckets = self._rooms, self._buckets
+            for room_id, record in changes.items():
+                old = rooms.get(room_id)
+                if old is not None and record is not None and self._key(old) == self._key(record):
+                    rooms[room_id] = record
+                    continue
+                if rooms is self._rooms:
+                    rooms, buckets = dict(rooms), dict(buckets)
+                if old is not None:
+                    del rooms[room_id]
+                    buckets[self._key(old)] = buckets[self._key(old)] - {room_id}
+                if record is not None:
+                    rooms[room_id] = record
+                    buckets[self._key(record)] = buckets.get(self._key(record), frozenset()) | {room_id}
+            self._rooms, self._buckets = rooms, buckets
+
+    def patch_seats(self, seats):
+        # seats maps room id -> (booked_rooms, available_rooms)
+        with self._lock:
+            if self._rooms is None:
+                return
+            for room_id, (booked, available) in seats.items():
+                record = self._rooms.get(room_id)
+                if record is not None:
+                    self._rooms[room_id] = record._replace(booked_rooms=booked, available_rooms=available)
+
+    def search(self, room_type=None, building=None, floor_number=None, available_only=False):
+        rooms, buckets = self._snapshot()
+        matches = []
+        for (bucket_type, bucket_building, bucket_floor), ids in buckets.items():
+            if room_type is not None and bucket_type != room_type:
+                continue
+            if building is not None and bucket_building != building:
+                continue
+            if floor_number is not None and bucket_floor != floor_number:
+                continue
+            for room_id in ids:
+                room = rooms[room_id]
+                if available_only and not room.available_rooms > 0:
+                    continue
+                matches.append(room)
+        matches.sort(key=room_sort_key)
+        return matches
+
+    def _snapshot(self):
+        with self._lock:
+            expired = self.max_age is not None and time.monotonic() - self._built_at > self.max_age
+            if self._rooms is None or expired:
+                self._build()
+            return self._rooms, self._buckets
+
+    def _build(self):
+        rows = db.session.execute(select(*Room.__table__.columns)).all()
+        self._rooms = {}
+        self._buckets = {}
+        for row in rows:
+            record = RoomRecord(*row)
+            self._rooms[record.id] = record
+            self._buckets.setdefault(self._key(record), set()).add(record.id)
+        self._buckets = {key: frozenset(ids) for key, ids in self._buckets.items()}
+        self._built_at = time.monotonic()
+
+    @staticmethod
+    def _key(record):
+        return (record.room_type, record.building, record.floor_number)
+
+
+def init_app(app):
+    app.config.setdefault('ROOM_INVENTORY_INDEX', False)
+    app.config.setdefault('ROOM_INVENTORY_MAX_AGE', 30)
+    app.config.setdefault('API_CACHE_SIZE', 256)
+    app.extensions['room_inventory'] = RoomInventory(max_age=app.config['ROOM_INVENTORY_MAX_AGE'])
+    # Serialized /api/rooms bodies, keyed by (filters, cursor, inventory version)
+    app.extensions['room_api_cache'] = LRUCache(max_entries=app.config['API_CACHE_SIZE'])
+
+
+def get_inventory():
+    return current_app.extensions['room_inventory']
+
+
+def inventory_version():
+    version = db.session.execute(
+        select(InventoryVersion.version).where(InventoryVersion.id == 1)
+    ).scalar()
+    return version or 0
+
+
+def _bump_version(session):
+    # Once per transaction is enough, the counter only has to change
+    changes = _changes.get(session)
+    if changes.get('bumped'):
+        return
+    changes['bumped'] = True
+    versions = InventoryVersion.__table__
+    session.connection().execute(
+        update(versions).where(versions.c.id == 1).values(version=versions.c.version + 1)
+    )
+
+
+def record_seats(rows):
+    # rows of (room id, booked_rooms, available_rooms) returned by an
+    # inventory_tracked seat update in the current transaction
+    seats = _changes.get(db.session).setdefault('seats', {})
+    for room_id, booked, available in rows:
+        seats[room_id] = (booked, available)
+
+
+def _active_inventory():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('room_inventory')
+
+
+def _apply_changes(changes):
+    inventory = _active_inventory()
+    if inventory is None:
+        return
+    if changes.get('stale'):
+        inventory.invalidate()
+        return
+    if changes.get('rooms'):
+        inventory.patch(changes['rooms'])
+    if changes.get('seats'):
+        inventory.patch_seats(changes['seats'])
+
+
+# Every write to rooms bumps inventory_version, tracked or not
+_changes = TransactionChanges(
+    'room_inventory', Room.__tablename__, _apply_changes, tracked='inventory_tracked', on_bulk_write=_bump_version,
+)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_room_changes(session, flush_context):
+    changed = False
+    for obj in session.new | session.dirty:
+        if isinstance(obj, Room) and (obj in session.new or session.is_modified(obj)):
+            _changes.get(session).setdefault('rooms', {})[obj.id] = _record(obj)
+            changed = True
+    for obj in session.deleted:
+        if isinstance(obj, Room):
+            _changes.get(session).setdefault('rooms', {})[obj.id] = None
+            changed = True
+    if changed:
+        _bump_version(session)
@@ -1,3 +1,6 @@
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload, selectinload
 from . import db
 
 class User(db.Model):
@@ -12,6 +15,12 @@ class User(db.Model):
     
 class Room(db.Model):
     __tablename__ = 'rooms'
+    __table_args__ = (
+        # room_search filters on any combination of these columns and pages
+        # through results ordered by (building, floor_number, id)
+        db.Index('ix_rooms_type_building_floor', 'room_type', 'building', 'floor_number'),
+        db.Index('ix_rooms_building_floor', 'building', 'floor_number'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     building = db.Column(db.Integer, nullable=False)
     room_type = db.Column(db.String(50), nullable=False)
@@ -23,8 +32,25 @@ class Room(db.Model):
     image_url = db.Column(db.String(255), nullable=False)
 
 
+class InventoryVersion(db.Model):
+    # Single row (id=1) counting writes to rooms, bumped in the writing transaction
+    __tablename__ = 'inventory_version'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+@event.listens_for(InventoryVersion.__table__, 'after_create')
+def _seed_inventory_version(target, connection, **kw):
+    connection.execute(target.insert().values(id=1, version=0))
+
+
 class Application(db.Model):
     __tablename__ = 'applications'
+    __table_args__ = (
+        # One application per student and room; also covers lookups by
+        # student_id alone and by (student_id, room_id)
+        db.Index('uq_applications_student_id_room_id', 'student_id', 'room_id', unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)  
     student_id = db.Column(db.String(20), nullable=False) 
     first_name = db.Column(db.String(100), nullable=False)  
@@ -40,3 +66,85 @@ class Application(db.Model):
     agreement = db.Column(db.Boolean, nullable=False) 
     room_id = db.Column(db.Integer, db.ForeignKey('rooms.id'))
     status = db.Column(db.String(50))
+
+    room = db.relationship('Room', lazy='select')
+    receipt = db.relationship('Receipt', uselist=False, back_populates='application')
+
+
+class Receipt(db.Model):
+    __tablename__ = 'receipts'
+    id = db.Column(db.Integer, primary_key=True)
+    application_id = db.Column(db.Integer, db.ForeignKey('applications.id'), nullable=False, unique=True)
+    sha256 = db.Column(db.String(64), nullable=False, index=True)
+    path = db.Column(db.String(255), nullable=False)
+    original_filename = db.Column(db.String(255))
+    size = db.Column(db.Integer, nullable=False)
+    uploaded_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    application = db.relationship('Application', back_populates='receipt')
+
+
+class WaitlistEntry(db.Model):
+    __tablename__ = 'waitlist'
+    __table_args__ = (
+        # Serves the next applicant for a room straight from the index
+        db.Index('ix_waitlist_room_priority', 'room_id', 'priority', 'application_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    application_id = db.Column(db.Integer, db.ForeignKey('applications.id'), nullable=False, unique=True)
+    room_id = db.Column(db.Integer, db.ForeignKey('rooms.id'), nullable=False)
+    # Lower goes first, see app/reservations.py priority_rank
+    priority = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class ApplicationEvent(db.Model):
+    # Append-only history, written by app/events.py. No foreign key so the
+    # history outlives the application
+    __tablename__ = 'application_events'
+    __table_args__ = (
+        db.Index('ix_application_events_application_ts', 'application_id', 'ts'),
+        db.Index('ix_application_events_ts', 'ts'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    application_id = db.Column(db.Integer, nullable=False)
+    ts = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    kind = db.Column(db.String(20), nullable=False)
+    old_status = db.Column(db.String(50))
+    new_status = db.Column(db.String(50))
+    actor = db.Column(db.String(20))
+    detail = db.Column(db.Text)
+
+
+class OccupancySummary(db.Model):
+    # Counts per (building, floor_number, room_type, status) bucket, kept by
+    # app/occupancy.py. Seat counters from rooms use the SEAT_BUCKETS statuses
+    __tablename__ = 'occupancy_summary'
+    building = db.Column(db.Integer, primary_key=True)
+    floor_number = db.Column(db.Integer, primary_key=True)
+    room_type = db.Column(db.String(50), primary_key=True)
+    status = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class OccupancyState(db.Model):
+    # Single row (id=1); dirty is set by writes the summary could not follow
+    __tablename__ = 'occupancy_state'
+    id = db.Column(db.Integer, primary_key=True)
+    dirty = db.Column(db.Boolean, nullable=False, default=False)
+    rebuilt_at = db.Column(db.DateTime)
+
+
+@event.listens_for(OccupancyState.__table__, 'after_create')
+def _seed_occupancy_state(target, connection, **kw):
+    # Tables created next to existing data start stale and are filled on first read
+    connection.execute(target.insert().values(id=1, dirty=True))
+
+
+def room_loader(strategy='joined'):
+    # Loader option for Application.room, 'joined' or 'selectin'
+    if strategy == 'selectin':
+        return selectinload(Application.room)
+    if strategy == 'joined':
+        return joinedload(Application.room)
+    raise ValueError(f"Unknown room loading strategy: {strategy}")
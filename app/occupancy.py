@@ -0,0 +1,317 @@
+"""Occupancy summary for the admin dashboard.
+
+occupancy_summary holds one count per (building, floor_number, room_type,
+status) bucket: applications by status, plus the rooms' seat counters
+under the SEAT_BUCKETS statuses. The report reads only this table, so its
+cost depends on the number of buckets, not on the number of rooms or
+applications.
+
+The counts are kept in the transaction that changes the source rows, as
+INSERT ... SELECT ... ON CONFLICT DO UPDATE SET count = count + delta
+statements that look the bucket up from the room:
+
+- ORM inserts, updates and deletes of Application and Room are followed
+  by mapper events, using the attribute history already in memory.
+- The set-based paths (take_seat, give_back_seat, release, promotion, bulk
+  transitions) tag their statements with occupancy_tracked=True and call
+  record_moves / record_seats with what they already know.
+
+Any other write to rooms or applications (allocation runs, imports, raw
+bulk statements) sets occupancy_state.dirty in the same transaction, and
+the next read rebuilds the table with one GROUP BY. `flask occupancy
+rebuild` does that on demand, `flask occupancy check` compares the table
+with the source rows.
+"""
+from collections import Counter
+from datetime import datetime
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import Integer, String, bindparam, delete, event, func, insert, inspect, literal, select, update
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import Application, OccupancyState, OccupancySummary, Room
+
+occupancy_cli = AppGroup('occupancy', help='Rebuild and check the occupancy summary.')
+
+SUMMARY = OccupancySummary.__table__
+STATE = OccupancyState.__table__
+KEY = ['building', 'floor_number', 'room_type', 'status']
+# Room counter -> status used for its bucket
+SEAT_BUCKETS = {
+    'total_rooms': 'seats:total',
+    'booked_rooms': 'seats:booked',
+    'available_rooms': 'seats:available',
+}
+ROOM_KEY = ('building', 'floor_number', 'room_type')
+
+_MARKED_KEY = 'occupancy_marked'
+_statements = {}
+
+
+def _delta_statement(dialect):
+    # None when the dialect has no upsert; callers mark the summary dirty instead
+    if dialect not in _statements:
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        elif dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            _statements[dialect] = None
+            return None
+        rooms = Room.__table__
+        stmt = dialect_insert(SUMMARY).from_select(
+            KEY + ['count'],
+            select(
+                rooms.c.building, rooms.c.floor_number, rooms.c.room_type,
+                bindparam('status', type_=String), bindparam('delta', type_=Integer),
+            ).where(rooms.c.id == bindparam('room')),
+        )
+        _statements[dialect] = stmt.on_conflict_do_update(
+            index_elements=KEY, set_={'count': SUMMARY.c.count + stmt.excluded['count']},
+        )
+    return _statements[dialect]
+
+
+def _rows(deltas):
+    return [{'room': room_id, 'status': status, 'delta': delta} for (room_id, status), delta in deltas.items() if delta]
+
+
+def _apply(connection, session, deltas):
+    rows = _rows(deltas)
+    if not rows:
+        return
+    stmt = _delta_statement(connection.dialect.name)
+    if stmt is None:
+        _mark_dirty(connection, session)
+    else:
+        connection.execute(stmt, rows)
+
+
+def _mark_dirty(connection, session):
+    # Once per transaction is enough
+    if session is not None and session.info.get(_MARKED_KEY):
+        return
+    if session is not None:
+        session.info[_MARKED_KEY] = True
+    connection.execute(update(STATE).where(STATE.c.id == 1).values(dirty=True))
+
+
+def mark_dirty():
+    _mark_dirty(db.session.connection(), db.session)
+
+
+def record_moves(moves):
+    # moves is an iterable of (room_id, old_status, new_status) for applications
+    # whose status changed in the current transaction, by a tracked statement
+    deltas = Counter()
+    for room_id, old, new in moves:
+        if room_id is None or old == new:
+            continue
+        deltas[room_id, old or ''] -= 1
+        deltas[room_id, new or ''] += 1
+    _apply(db.session.connection(), db.session, deltas)
+
+
+def record_seats(seats):
+    # seats maps room_id -> seats taken (negative when given back) by a tracked statement
+    deltas = Counter()
+    for room_id, taken in seats.items():
+        deltas[room_id, SEAT_BUCKETS['booked_rooms']] += taken
+        deltas[room_id, SEAT_BUCKETS['available_rooms']] -= taken
+    _apply(db.session.connection(), db.session, deltas)
+
+
+def _source_selects():
+    # The summary computed from scratch, one SELECT per kind of bucket
+    rooms = Room.__table__
+    applications = Application.__table__
+    key = [rooms.c.building, rooms.c.floor_number, rooms.c.room_type]
+    status = func.coalesce(applications.c.status, '')
+    yield (
+        select(*key, status, func.count())
+        .select_from(applications.join(rooms, rooms.c.id == applications.c.room_id))
+        .group_by(*key, status)
+    )
+    for column, bucket in SEAT_BUCKETS.items():
+        yield select(*key, literal(bucket, String), func.sum(func.coalesce(rooms.c[column], 0))).group_by(*key)
+
+
+def rebuild():
+    # Recompute every bucket in the current transaction; the caller commits
+    db.session.execute(delete(SUMMARY))
+    for query in _source_selects():
+        db.session.execute(insert(SUMMARY).from_select(KEY + ['count'], query))
+    db.session.execute(update(STATE).where(STATE.c.id == 1).values(dirty=False, rebuilt_at=datetime.utcnow()))
+
+
+def is_dirty():
+    return bool(db.session.execute(select(STATE.c.dirty).where(STATE.c.id == 1)).scalar())
+
+
+def summary_rows():
+    # Buckets with a non-zero count, rebuilding first if the table is stale
+    if is_dirty():
+        rebuild()
+        db.session.commit()
+    return db.session.execute(
+        select(*(SUMMARY.c[name] for name in KEY), SUMMARY.c['count'])
+        .where(SUMMARY.c['count'] != 0)
+        .order_by(SUMMARY.c.building, SUMMARY.c.floor_number, SUMMARY.c.room_type)
+    ).all()
+
+
+def check():
+    # Returns [(bucket, expected, stored)] for every bucket that disagrees with the source rows
+    expected = {}
+    for query in _source_selects():
+        for *bucket, count in db.session.execute(query):
+            if count:
+                expected[tuple(bucket)] = count
+    stored = {
+        tuple(bucket): count
+        for *bucket, count in db.session.execute(select(*(SUMMARY.c[name] for name in KEY), SUMMARY.c['count']))
+        if count
+    }
+    return [
+        (bucket, expected.get(bucket, 0), stored.get(bucket, 0))
+        for bucket in sorted(expected.keys() | stored.keys(), key=lambda bucket: tuple(map(str, bucket)))
+        if expected.get(bucket, 0) != stored.get(bucket, 0)
+    ]
+
+
+def report():
+    # rows of (building, floor_number, room_type, seats, {status: count}) and the statuses seen
+    rows = {}
+    statuses = set()
+    for building, floor_number, room_type, status, count in summary_rows():
+        seats, counts = rows.setdefault((building, floor_number, room_type), ({}, {}))
+        if status in SEAT_BUCKETS.values():
+            seats[status] = count
+        else:
+            counts[status] = count
+            statuses.add(status)
+    return [(*bucket, seats, counts) for bucket, (seats, counts) in rows.items()], statuses
+
+
+def _previous(state, key):
+    # (value before this flush, known). An attribute set without being
+    # loaded first has no old value in memory
+    history = state.attrs[key].history
+    if not history.has_changes():
+        return state.attrs[key].value, True
+    if history.deleted:
+        return history.deleted[0], True
+    return None, False
+
+
+@event.listens_for(Application, 'after_insert')
+def _application_inserted(mapper, connection, target):
+    if target.room_id is not None:
+        _apply(connection, inspect(target).session, {(target.room_id, target.status or ''): 1})
+
+
+@event.listens_for(Application, 'after_update')
+def _application_updated(mapper, connection, target):
+    state = inspect(target)
+    if not (state.attrs.status.history.has_changes() or state.attrs.room_id.history.has_changes()):
+        return
+    old_status, known_status = _previous(state, 'status')
+    old_room, known_room = _previous(state, 'room_id')
+    if not (known_status and known_room):
+        _mark_dirty(connection, state.session)
+        return
+    deltas = Counter()
+    if old_room is not None:
+        deltas[old_room, old_status or ''] -= 1
+    if target.room_id is not None:
+        deltas[target.room_id, target.status or ''] += 1
+    _apply(connection, state.session, deltas)
+
+
+@event.listens_for(Application, 'after_delete')
+def _application_deleted(mapper, connection, target):
+    state = inspect(target)
+    status, known_status = _previous(state, 'status')
+    room_id, known_room = _previous(state, 'room_id')
+    if not (known_status and known_room):
+        _mark_dirty(connection, state.session)
+    elif room_id is not None:
+        _apply(connection, state.session, {(room_id, status or ''): -1})
+
+
+@event.listens_for(Room, 'after_insert')
+def _room_inserted(mapper, connection, target):
+    _apply(connection, inspect(target).session, {
+        (target.id, bucket): getattr(target, column) or 0 for column, bucket in SEAT_BUCKETS.items()
+    })
+
+
+@event.listens_for(Room, 'after_update')
+def _room_updated(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in ROOM_KEY):
+        # Moves every application of the room to other buckets
+        _mark_dirty(connection, state.session)
+        return
+    deltas = {}
+    for column, bucket in SEAT_BUCKETS.items():
+        old, known = _previous(state, column)
+        if not known:
+            _mark_dirty(connection, state.session)
+            return
+        deltas[target.id, bucket] = (getattr(target, column) or 0) - (old or 0)
+    _apply(connection, state.session, deltas)
+
+
+@event.listens_for(Room, 'after_delete')
+def _room_deleted(mapper, connection, target):
+    # The row is gone, so its bucket can no longer be looked up
+    _mark_dirty(connection, inspect(target).session)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_untracked_writes(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        if getattr(table, 'name', None) in (Room.__tablename__, Application.__tablename__):
+            if not orm_execute_state.execution_options.get('occupancy_tracked'):
+                session = orm_execute_state.session
+                _mark_dirty(session.connection(), session)
+
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _reset_marked(session):
+    session.info.pop(_MARKED_KEY, None)
+
+
+@occupancy_cli.command('rebuild')
+def rebuild_command():
+    """Recompute the occupancy summary from rooms and applications."""
+    rebuild()
+    db.session.commit()
+    buckets = db.session.execute(select(func.count()).select_from(SUMMARY)).scalar()
+    click.echo(f"Rebuilt occupancy summary: {buckets} buckets")
+
+
+@occupancy_cli.command('check')
+@click.option('--fix', is_flag=True, help='Rebuild the summary when it disagrees with the source rows.')
+def check_command(fix):
+    """Compare the occupancy summary with rooms and applications."""
+    if is_dirty():
+        click.echo("Occupancy summary is marked stale; it is rebuilt on the next read")
+        return
+    mismatches = check()
+    for bucket, expected, stored in mismatches:
+        click.echo(f"{' / '.join(map(str, bucket))}: expected {expected}, stored {stored}")
+    if not mismatches:
+        click.echo("Occupancy summary matches the source rows")
+        return
+    if fix:
+        rebuild()
+        db.session.commit()
+        click.echo(f"Rebuilt after {len(mismatches)} mismatched buckets")
+        return
+    raise click.ClickException(f"{len(mismatches)} buckets disagree with the source rows")
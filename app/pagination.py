@@ -0,0 +1,65 @@
+"""Keyset (seek) pagination with opaque cursor tokens.
+
+A cursor is the sort key of the last row on the previous page, encoded as
+url-safe base64 JSON. The next page is WHERE (keys) > (cursor) ORDER BY
+keys LIMIT n, so page 50 costs the same as page 1. Newest-first pages use
+descending=True, i.e. < and ORDER BY ... DESC. Cursors that cannot be
+decoded fall back to the first page.
+"""
+import base64
+import binascii
+import json
+from bisect import bisect_right
+from collections import namedtuple
+
+from sqlalchemy import tuple_
+
+Page = namedtuple('Page', ['items', 'next_cursor'])
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, size):
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return tuple(values)
+
+
+def paginate_query(query, columns, key, cursor, per_page, descending=False):
+    # columns are the ORDER BY columns, key(item) returns the same values for a row
+    values = decode_cursor(cursor, len(columns))
+    if values is not None:
+        after = tuple_(*columns) < tuple_(*values) if descending else tuple_(*columns) > tuple_(*values)
+        query = query.filter(after)
+    order = [column.desc() for column in columns] if descending else columns
+    items = query.order_by(*order).limit(per_page + 1).all()
+    return _page(items, key, per_page)
+
+
+def paginate_sorted(items, key, cursor, per_page):
+    # Same contract for a list that is already sorted by key
+    values = decode_cursor(cursor, len(key(items[0])) if items else 0)
+    start = 0
+    if values is not None:
+        try:
+            start = bisect_right([key(item) for item in items], values)
+        except TypeError:
+            start = 0
+    return _page(items[start:start + per_page + 1], key, per_page)
+
+
+def _page(items, key, per_page):
+    if len(items) > per_page:
+        items = items[:per_page]
+        return Page(items, encode_cursor(key(items[-1])))
+    return Page(items, None)
@@ -0,0 +1,97 @@
+"""Password hashing off the request thread.
+
+The KDF runs in a small process pool (PASSWORD_HASH_WORKERS processes, at
+most PASSWORD_HASH_MAX_PENDING jobs queued), so a login storm cannot pin
+every request thread on PBKDF2 at once. The cost comes from
+PASSWORD_HASH_METHOD. Hashes made with another method are upgraded the
+next time their owner logs in. A job that takes longer than
+PASSWORD_HASH_TIMEOUT is reported as PasswordServiceBusy and keeps its
+queue slot until it finishes. With PASSWORD_HASH_WORKERS = 0 hashing
+runs inline.
+"""
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from app.request_metrics import phase
+
+
+class PasswordServiceBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    def __init__(self, method, workers, max_pending, timeout):
+        self.method = method
+        self.workers = workers
+        self.timeout = timeout
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        return pwhash.split('$', 1)[0] != self.method
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def _run(self, fn, *args):
+        with phase('hash'):
+            if not self.workers:
+                return fn(*args)
+            if not self._pending.acquire(timeout=self.timeout):
+                raise PasswordServiceBusy()
+            try:
+                future = self._executor().submit(fn, *args)
+            except Exception:
+                self._pending.release()
+                raise
+            # The slot is freed when the job finishes, not when the caller
+            # stops waiting, so abandoned jobs still count against the limit
+            future.add_done_callback(lambda _: self._pending.release())
+            try:
+                return future.result(timeout=self.timeout)
+            except FutureTimeout:
+                raise PasswordServiceBusy() from None
+
+    def _executor(self):
+        # Started lazily so each gunicorn worker gets its own pool after fork
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+            return self._pool
+
+
+def init_app(app):
+    app.config.setdefault('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000000')
+    app.config.setdefault('PASSWORD_HASH_WORKERS', 0)
+    app.config.setdefault('PASSWORD_HASH_MAX_PENDING', 32)
+    app.config.setdefault('PASSWORD_HASH_TIMEOUT', 10)
+    hasher = PasswordHasher(
+        app.config['PASSWORD_HASH_METHOD'],
+        app.config['PASSWORD_HASH_WORKERS'],
+        app.config['PASSWORD_HASH_MAX_PENDING'],
+        app.config['PASSWORD_HASH_TIMEOUT'],
+    )
+    app.extensions['password_hasher'] = hasher
+    atexit.register(hasher.shutdown)
+
+
+def get_hasher():
+    return current_app.extensions['password_hasher']
@@ -0,0 +1,121 @@
+"""Cached, read-only user profiles.
+
+Pages that only need a user's name, email or type call get_profile(user_id)
+instead of loading a User. Profiles are plain frozen objects, not ORM
+instances, kept in a per-worker LRU of PROFILE_CACHE_SIZE entries for at
+most PROFILE_CACHE_TTL seconds. Inserts, updates and deletes of User rows
+through the ORM drop the affected entries when their transaction commits;
+bulk statements on the user table drop every entry.
+"""
+import time
+from dataclasses import dataclass
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from app import db
+from app.cache import LRUCache, TransactionChanges
+from app.models import User
+
+
+@dataclass(frozen=True)
+class UserProfile:
+    __slots__ = ('user_id', 'fname', 'lname', 'email', 'usertype')
+    user_id: int
+    fname: str
+    lname: str
+    email: str
+    usertype: str
+
+
+PROFILE_COLUMNS = [User.__table__.c[name] for name in UserProfile.__slots__]
+
+
+class ProfileCache:
+    def __init__(self, max_entries, ttl):
+        self.ttl = ttl
+        self._entries = LRUCache(max_entries=max_entries)
+
+    def get(self, user_id, load):
+        entry = self._entries.get(user_id)
+        now = time.monotonic()
+        if entry is not None and entry[1] > now:
+            return entry[0]
+        profile = load(user_id)
+        if profile is not None:
+            self._entries.put(user_id, (profile, now + self.ttl))
+        return profile
+
+    def put(self, profile):
+        self._entries.put(profile.user_id, (profile, time.monotonic() + self.ttl))
+
+    def discard(self, user_ids):
+        for user_id in user_ids:
+            self._entries.discard(user_id)
+
+    def clear(self):
+        self._entries.clear()
+
+    @property
+    def stats(self):
+        return {'entries': len(self._entries), 'hits': self._entries.hits, 'misses': self._entries.misses}
+
+
+def profile_from_user(user):
+    return UserProfile(*(getattr(user, name) for name in UserProfile.__slots__))
+
+
+def load_profile(user_id):
+    row = db.session.execute(select(*PROFILE_COLUMNS).where(User.user_id == user_id)).first()
+    return UserProfile(*row) if row is not None else None
+
+
+def get_profile(user_id):
+    # None when there is no such user
+    if user_id is None:
+        return None
+    return current_app.extensions['user_profiles'].get(int(user_id), load_profile)
+
+
+def remember_user(user):
+    # Prime the cache from a User that was just loaded anyway, e.g. at login
+    current_app.extensions['user_profiles'].put(profile_from_user(user))
+
+
+def init_app(app):
+    app.config.setdefault('PROFILE_CACHE_SIZE', 10000)
+    app.config.setdefault('PROFILE_CACHE_TTL', 300)
+    app.extensions['user_profiles'] = ProfileCache(app.config['PROFILE_CACHE_SIZE'], app.config['PROFILE_CACHE_TTL'])
+
+
+def _active_profiles():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('user_profiles')
+
+
+def _apply_changes(changes):
+    profiles = _active_profiles()
+    if profiles is None:
+        return
+    if changes.get('stale'):
+        profiles.clear()
+    elif changes.get('users'):
+        profiles.discard(int(user_id) for user_id in changes['users'] if user_id is not None)
+
+
+_changes = TransactionChanges('user_profiles', User.__tablename__, _apply_changes)
+
+
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _collect_user_change(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is None:
+        return
+    changed = _changes.get(session).setdefault('users', set())
+    changed.add(target.user_id)
+    # A changed user_id leaves the old key behind too
+    changed.update(inspect(target).attrs.user_id.history.deleted or ())
@@ -0,0 +1,98 @@
+"""Content-addressed storage for payment receipts.
+
+Uploads are streamed to a temporary file in chunks while their SHA-256 is
+computed, then moved to <root>/<aa>/<bb>/<sha256>.<ext>. Each application's
+current receipt is a row in the receipts table, so finding or replacing it
+is an indexed lookup instead of a scan of the uploads directory.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+from datetime import datetime
+
+from flask import current_app
+from werkzeug.utils import secure_filename
+
+from app import db
+from app.models import Receipt
+from app.request_metrics import phase
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ReceiptTooLarge(Exception):
+    pass
+
+
+def storage_root():
+    return current_app.config['RECEIPT_STORAGE_DIR']
+
+
+def stream_to_storage(stream, extension, max_bytes=None):
+    # Returns (sha256, path relative to the storage root, size in bytes)
+    root = storage_root()
+    os.makedirs(root, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=root, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise ReceiptTooLarge(max_bytes)
+                digest.update(chunk)
+                out.write(chunk)
+
+        sha256 = digest.hexdigest()
+        path = posixpath.join(sha256[:2], sha256[2:4], f"{sha256}.{extension}")
+        final_path = os.path.join(root, *path.split('/'))
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        if os.path.exists(final_path):
+            # Same content already stored
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, final_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return sha256, path, size
+
+
+def save_receipt(application, file):
+    # Store the upload and point the application's receipt row at it.
+    # Returns the replaced path (if any) to pass to discard_file after commit.
+    extension = file.filename.rsplit('.', 1)[1].lower()
+    max_bytes = current_app.config.get('RECEIPT_MAX_BYTES')
+    with phase('io'):
+        sha256, path, size = stream_to_storage(file.stream, extension, max_bytes)
+
+    receipt = application.receipt
+    replaced = None
+    if receipt is None:
+        receipt = Receipt(application=application)
+        db.session.add(receipt)
+    elif receipt.path != path:
+        replaced = receipt.path
+
+    receipt.sha256 = sha256
+    receipt.path = path
+    receipt.size = size
+    receipt.original_filename = secure_filename(file.filename)
+    receipt.uploaded_at = datetime.utcnow()
+    return replaced
+
+
+def discard_file(path):
+    # Remove a stored file once no receipt row refers to it any more
+    sha256 = posixpath.basename(path).split('.', 1)[0]
+    if Receipt.query.filter_by(sha256=sha256, path=path).first() is not None:
+        return
+    full_path = os.path.join(storage_root(), *path.split('/'))
+    if os.path.exists(full_path):
+        os.remove(full_path)
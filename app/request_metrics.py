@@ -0,0 +1,209 @@
+"""Per-request timing for the main blueprint.
+
+With REQUEST_METRICS_ENABLED on, every request handled by the main
+blueprint records its query count, SQL time, template render time, time
+in named phases (password hashing, receipt I/O) and total handler time.
+The numbers go out as a Server-Timing header, optionally as one JSON log
+line per request (REQUEST_METRICS_LOG), and into per-endpoint latency
+histograms over a rolling window of REQUEST_METRICS_WINDOW seconds, which
+/metrics serves in Prometheus text format. When the flag is off no
+listeners are registered and phase() is a no-op.
+"""
+import bisect
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import before_render_template, current_app, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in milliseconds, the last bucket is +Inf
+BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class RequestTimings:
+    __slots__ = ('start', 'queries', 'sql', 'template', 'phases', '_template_starts')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.sql = 0.0
+        self.template = 0.0
+        self.phases = {}
+        self._template_starts = []
+
+
+class _Window:
+    def __init__(self):
+        self.endpoints = {}
+
+    def add(self, endpoint, elapsed_ms, queries):
+        entry = self.endpoints.get(endpoint)
+        if entry is None:
+            entry = self.endpoints[endpoint] = {'buckets': [0] * (len(BUCKETS) + 1), 'count': 0, 'sum_ms': 0.0, 'queries': 0}
+        entry['buckets'][bisect.bisect_left(BUCKETS, elapsed_ms)] += 1
+        entry['count'] += 1
+        entry['sum_ms'] += elapsed_ms
+        entry['queries'] += queries
+
+
+class EndpointHistograms:
+    # Two windows: a scrape sees the current one plus the one before it
+    def __init__(self, window):
+        self.window = window
+        self._lock = threading.Lock()
+        self._current = _Window()
+        self._previous = _Window()
+        self._rotated_at = time.monotonic()
+
+    def record(self, endpoint, elapsed_ms, queries):
+        with self._lock:
+            self._rotate()
+            self._current.add(endpoint, elapsed_ms, queries)
+
+    def snapshot(self):
+        with self._lock:
+            self._rotate()
+            merged = {}
+            for window in (self._previous, self._current):
+                for endpoint, entry in window.endpoints.items():
+                    total = merged.setdefault(endpoint, {'buckets': [0] * (len(BUCKETS) + 1), 'count': 0, 'sum_ms': 0.0, 'queries': 0})
+                    total['buckets'] = [a + b for a, b in zip(total['buckets'], entry['buckets'])]
+                    total['count'] += entry['count']
+                    total['sum_ms'] += entry['sum_ms']
+                    total['queries'] += entry['queries']
+            return merged
+
+    def _rotate(self):
+        now = time.monotonic()
+        if now - self._rotated_at < self.window:
+            return
+        # A window that passed with no rotation at all leaves nothing recent
+        self._previous = self._current if now - self._rotated_at < 2 * self.window else _Window()
+        self._current = _Window()
+        self._rotated_at = now
+
+
+def prometheus_text(snapshot):
+    lines = [
+        '# HELP uwidorm_request_duration_ms Handler time per endpoint',
+        '# TYPE uwidorm_request_duration_ms histogram',
+    ]
+    for endpoint in sorted(snapshot):
+        entry = snapshot[endpoint]
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), entry['buckets']):
+            cumulative += count
+            lines.append(f'uwidorm_request_duration_ms_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+        lines.append(f'uwidorm_request_duration_ms_sum{{endpoint="{endpoint}"}} {entry["sum_ms"]:.3f}')
+        lines.append(f'uwidorm_request_duration_ms_count{{endpoint="{endpoint}"}} {entry["count"]}')
+    lines.append('# HELP uwidorm_request_queries_total SQL statements per endpoint')
+    lines.append('# TYPE uwidorm_request_queries_total counter')
+    for endpoint in sorted(snapshot):
+        lines.append(f'uwidorm_request_queries_total{{endpoint="{endpoint}"}} {snapshot[endpoint]["queries"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def _timings():
+    if not has_request_context():
+        return None
+    return g.get('request_timings')
+
+
+@contextmanager
+def phase(name):
+    # Time a named part of the current request, e.g. with phase('hash'): ...
+    timings = _timings()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.phases[name] = timings.phases.get(name, 0.0) + time.perf_counter() - start
+
+
+def server_timing(timings, total):
+    parts = [f'db;dur={timings.sql * 1000:.2f};desc="{timings.queries} queries"']
+    if timings.template:
+        parts.append(f'tpl;dur={timings.template * 1000:.2f}')
+    for name, elapsed in timings.phases.items():
+        parts.append(f'{name};dur={elapsed * 1000:.2f}')
+    parts.append(f'app;dur={total * 1000:.2f}')
+    return ', '.join(parts)
+
+
+def init_app(app, engine):
+    app.config.setdefault('REQUEST_METRICS_ENABLED', False)
+    app.config.setdefault('REQUEST_METRICS_LOG', False)
+    app.config.setdefault('REQUEST_METRICS_WINDOW', 300)
+
+    histograms = EndpointHistograms(app.config['REQUEST_METRICS_WINDOW'])
+    app.extensions['request_metrics'] = histograms
+    if not app.config['REQUEST_METRICS_ENABLED']:
+        return histograms
+    log_requests = app.config['REQUEST_METRICS_LOG']
+
+    @app.before_request
+    def start_request():
+        if request.blueprint == 'main':
+            g.request_timings = RequestTimings()
+
+    @app.after_request
+    def finish_request(response):
+        timings = _timings()
+        if timings is None:
+            return response
+        total = time.perf_counter() - timings.start
+        response.headers['Server-Timing'] = server_timing(timings, total)
+        histograms.record(request.endpoint, total * 1000, timings.queries)
+        if log_requests:
+            logger.info(json.dumps({
+                'endpoint': request.endpoint,
+                'method': request.method,
+                'status': response.status_code,
+                'total_ms': round(total * 1000, 3),
+                'sql_ms': round(timings.sql * 1000, 3),
+                'queries': timings.queries,
+                'template_ms': round(timings.template * 1000, 3),
+                **{f'{name}_ms': round(elapsed * 1000, 3) for name, elapsed in timings.phases.items()},
+            }))
+        return response
+
+    # Kept on the execution context, like app/sql_metrics.py, so failed
+    # statements leave nothing on the connection
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        if _timings() is not None:
+            context._request_metrics_start = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def stop_query(conn, cursor, statement, parameters, context, executemany):
+        timings = _timings()
+        start = getattr(context, '_request_metrics_start', None)
+        if timings is not None and start is not None:
+            timings.sql += time.perf_counter() - start
+            timings.queries += 1
+
+    def start_template(sender, template, context, **extra):
+        timings = _timings()
+        if timings is not None:
+            timings._template_starts.append(time.perf_counter())
+
+    def stop_template(sender, template, context, **extra):
+        timings = _timings()
+        if timings is not None and timings._template_starts:
+            timings.template += time.perf_counter() - timings._template_starts.pop()
+
+    before_render_template.connect(start_template, app, weak=False)
+    template_rendered.connect(stop_template, app, weak=False)
+    return histograms
+
+
+def get_histograms():
+    return current_app.extensions['request_metrics']
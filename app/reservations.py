@@ -0,0 +1,245 @@
+"""Seat reservation against the rooms counters.
+
+Seats are taken and given back with single conditional UPDATEs, so two
+workers can never both take the last seat. The database serialises the
+writes and the WHERE clause rejects the loser. Work that hits a SQLite
+"database is locked" error is rolled back and retried with exponential
+backoff. A second application for the same (student, room) pair is
+rejected by the unique index on applications and surfaces as
+DuplicateApplicationError. init_app checks that the index exists; on a
+database `flask db upgrade` has not reached yet it logs a warning and
+submissions fall back to looking for an existing application first.
+
+When a room is full, submit_or_waitlist puts the application on the room's
+waitlist (app/waitlist.py) instead, and every seat given back is handed to
+the next waitlisted applicant in the same transaction.
+"""
+import random
+import time
+
+from flask import current_app
+from sqlalchemy import inspect, select, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from app import db, inventory, occupancy, waitlist
+from app.events import record_status_changes
+from app.models import Application, Room
+
+# Statuses that hold a seat in the room, and the ones that give it back
+HOLDING_STATUSES = ('Pending', 'Application Approved', 'Payment Under Review', 'Room Booked')
+RELEASED_STATUSES = ('Withdrawn', 'Rejected')
+WAITLISTED_STATUS = 'Waitlisted'
+UNIQUE_INDEX = 'uq_applications_student_id_room_id'
+
+# Who is served first by the allocation run and the waitlists: the option
+# values book_room.html posts, lowercased. Lower ranks go first; values not
+# listed rank after all listed ones
+PRIORITY_RULES = (
+    ('education_level', ('postgraduate', 'undergraduate')),
+    ('program_type', ('phd', 'mphil', 'masters', 'bachelors')),
+)
+
+
+class RoomFullError(Exception):
+    pass
+
+
+class DuplicateApplicationError(Exception):
+    pass
+
+
+def init_app(app, engine):
+    # create_all does not add indexes to an existing applications table;
+    # migration 3e8a6d0f2c71 does, after removing duplicates
+    indexes = {index['name'] for index in inspect(engine).get_indexes(Application.__tablename__)}
+    app.extensions['unique_applications'] = UNIQUE_INDEX in indexes
+    if UNIQUE_INDEX not in indexes:
+        app.logger.warning(
+            "applications has no %s index; run `flask db upgrade`. Until then duplicate "
+            "submissions are only caught by a query and can race", UNIQUE_INDEX,
+        )
+
+
+def is_busy_error(exc):
+    message = str(getattr(exc, 'orig', exc)).lower()
+    return 'database is locked' in message or 'database table is locked' in message or 'busy' in message
+
+
+def is_duplicate_error(exc):
+    message = str(getattr(exc, 'orig', exc)).lower()
+    return 'unique' in message or 'duplicate' in message
+
+
+def run_with_retry(work):
+    # Run work() and commit, retrying the whole transaction on busy errors
+    attempts = current_app.config.get('RESERVATION_MAX_ATTEMPTS', 5)
+    backoff = current_app.config.get('RESERVATION_BACKOFF', 0.05)
+    for attempt in range(attempts):
+        try:
+            result = work()
+            db.session.commit()
+            return result
+        except OperationalError as exc:
+            db.session.rollback()
+            if not is_busy_error(exc) or attempt == attempts - 1:
+                raise
+            time.sleep(backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+def priority_key(values):
+    # values follow PRIORITY_RULES, e.g. (education_level, program_type)
+    key = []
+    for (name, order), value in zip(PRIORITY_RULES, values):
+        value = (value or '').strip().lower()
+        key.append(order.index(value) if value in order else len(order))
+    return tuple(key)
+
+
+def priority_rank(application):
+    # priority_key folded into one integer for the waitlist table
+    rank = 0
+    for (name, order), part in zip(PRIORITY_RULES, priority_key([getattr(application, name) for name, _ in PRIORITY_RULES])):
+        rank = rank * (len(order) + 1) + part
+    return rank
+
+
+def take_seat(room_id):
+    # Returns False when the room has no seats left. seat_counts tells
+    # app/fragments.py that cached room cards stay valid; occupancy_tracked
+    # and inventory_tracked that the occupancy summary and the inventory
+    # index are updated here instead
+    return _change_seats(
+        update(Room)
+        .where(Room.id == room_id, Room.available_rooms > 0)
+        .values(available_rooms=Room.available_rooms - 1, booked_rooms=Room.booked_rooms + 1),
+        room_id, 1,
+    )
+
+
+def give_back_seat(room_id):
+    return _change_seats(
+        update(Room)
+        .where(Room.id == room_id, Room.booked_rooms > 0)
+        .values(available_rooms=Room.available_rooms + 1, booked_rooms=Room.booked_rooms - 1),
+        room_id, -1,
+    )
+
+
+def _change_seats(statement, room_id, taken):
+    rows = db.session.execute(
+        statement
+        .returning(Room.id, Room.booked_rooms, Room.available_rooms)
+        .execution_options(synchronize_session=False, seat_counts=True, occupancy_tracked=True, inventory_tracked=True)
+    ).all()
+    if not rows:
+        return False
+    occupancy.record_seats({room_id: taken})
+    inventory.record_seats(rows)
+    return True
+
+
+def _insert(application, work):
+    if not current_app.extensions.get('unique_applications', True):
+        with db.session.no_autoflush:
+            existing = db.session.execute(
+                select(Application.id).filter_by(student_id=application.student_id, room_id=application.room_id).limit(1)
+            ).scalar()
+        if existing is not None:
+            raise DuplicateApplicationError(application.room_id)
+    try:
+        return run_with_retry(work)
+    except IntegrityError as exc:
+        if not is_duplicate_error(exc):
+            raise
+        raise DuplicateApplicationError(application.room_id) from exc
+
+
+def submit_with_seat(application):
+    # Insert the application and take its seat in one transaction. The
+    # insert goes first so a duplicate fails before the room row is touched
+    def work():
+        db.session.add(application)
+        db.session.flush()
+        if not take_seat(application.room_id):
+            raise RoomFullError(application.room_id)
+        return application
+
+    return _insert(application, work)
+
+
+def submit_or_waitlist(application):
+    # Like submit_with_seat, but a full room puts the application on the
+    # room's waitlist. Returns the queue position, or None when it got a seat
+    def work():
+        db.session.add(application)
+        db.session.flush()
+        if take_seat(application.room_id):
+            return False
+        application.status = WAITLISTED_STATUS
+        waitlist.enqueue(application, priority_rank(application))
+        return True
+
+    if _insert(application, work):
+        return waitlist.position(application)
+    return None
+
+
+def promote_waitlisted(room_id, seats=1):
+    # Hand up to seats free seats to the head of the room's waitlist, in the
+    # current transaction. Returns the promoted application ids
+    promoted = []
+    while len(promoted) < seats:
+        entries = waitlist.next_entries(room_id, seats - len(promoted))
+        if not entries:
+            break
+        for application_id in entries:
+            if not take_seat(room_id):
+                return promoted
+            waitlist.leave([application_id])
+            result = db.session.execute(
+                update(Application)
+                .where(Application.id == application_id, Application.status == WAITLISTED_STATUS)
+                .values(status='Pending')
+                .execution_options(synchronize_session=False, occupancy_tracked=True)
+            )
+            if result.rowcount != 1:
+                # A stale entry for an application that is no longer
+                # waiting: it is dropped and the seat goes to the next one
+                give_back_seat(room_id)
+                continue
+            record_status_changes([(application_id, WAITLISTED_STATUS, 'Pending')])
+            occupancy.record_moves([(room_id, WAITLISTED_STATUS, 'Pending')])
+            promoted.append(application_id)
+    return promoted
+
+
+def release_application(application, status):
+    # Move the application to a released status and give its seat back
+    if status not in RELEASED_STATUSES:
+        raise ValueError(f"{status} does not release a seat")
+
+    old_status = application.status
+
+    def work():
+        # Only the transition out of a holding status gives the seat back
+        result = db.session.execute(
+            update(Application)
+            .where(Application.id == application.id, Application.status.in_(HOLDING_STATUSES))
+            .values(status=status)
+            .execution_options(synchronize_session=False, occupancy_tracked=True)
+        )
+        if result.rowcount == 1:
+            record_status_changes([(application.id, old_status, status)])
+            occupancy.record_moves([(application.room_id, old_status, status)])
+        if result.rowcount == 1 and application.room_id:
+            give_back_seat(application.room_id)
+            promote_waitlisted(application.room_id)
+        else:
+            waitlist.leave([application.id])
+            application.status = status
+        return application
+
+    return run_with_retry(work)
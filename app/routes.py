@@ -1,19 +1,106 @@
-import os
-from flask import Blueprint, render_template, request, redirect, session, url_for, flash
+import hashlib
+import hmac
+import json
+from flask import Blueprint, render_template, request, redirect, session, url_for, flash, current_app, jsonify, stream_with_context
 from sqlalchemy import func
-from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
-from app.models import Application, User, Room
-from app import db
+from werkzeug.exceptions import RequestEntityTooLarge
+from app.models import Application, ApplicationEvent, User, Room, room_loader
+from app import db, waitlist
+from app.events import export_events
+from app.fulltext import keyword_terms, like_matches, rank_matches
+from app.inventory import RoomRecord, get_inventory, inventory_version, room_sort_key
+from app.occupancy import SEAT_BUCKETS, report as occupancy_report
+from app.pagination import Page, paginate_query, paginate_sorted
+from app.passwords import PasswordServiceBusy, get_hasher
+from app.profiles import get_profile, remember_user
+from app.receipts import ReceiptTooLarge, discard_file, save_receipt
+from app.request_metrics import BUCKETS, get_histograms, prometheus_text
+from app.reservations import HOLDING_STATUSES, RELEASED_STATUSES, WAITLISTED_STATUS, DuplicateApplicationError, priority_rank, release_application, submit_or_waitlist
+from app.throttle import admission
+from app.transitions import InvalidTransition, transition_applications
 
 main = Blueprint('main', __name__)
 
+ADMIN_USERTYPES = ('admin', 'IT')
+
+# A receipt is only accepted once the application is approved; re-uploads keep it under review
+RECEIPT_STATUSES = ('Application Approved', 'Payment Under Review')
+
+# Keyset pagination sort keys, see app/pagination.py
+ROOM_PAGE_KEYS = (Room.building, Room.floor_number, Room.id)
+APPLICATION_PAGE_KEYS = (Application.id,)
+EVENT_PAGE_KEYS = (ApplicationEvent.id,)
+
+# Column order of the occupancy dashboard; other statuses follow alphabetically
+STATUS_ORDER = HOLDING_STATUSES + (WAITLISTED_STATUS,) + RELEASED_STATUSES
+
+
+def application_sort_key(application):
+    return (application.id,)
+
+
+def event_sort_key(event):
+    return (event.id,)
+
+
+def ranked_sort_key(row):
+    # Keyword results are (room, bm25 rank) rows, best first
+    room, rank = row
+    return (rank, room.id)
+
+
+def room_filters(values):
+    # Normalised search criteria, raises ValueError for non-numeric dormitory/level
+    dormitory = values.get('dormitory')
+    level = values.get('level')
+    return {
+        'room_type': values.get('room_type') or None,
+        'building': int(dormitory) if dormitory else None,
+        'floor_number': int(level) if level else None,
+        'available_only': values.get('availability') == 'now',
+        'keywords': ' '.join(keyword_terms(values.get('keywords'))) or None,
+    }
+
+
+def search_rooms(criteria, cursor, per_page):
+    keywords = criteria.get('keywords')
+    if current_app.config['ROOM_INVENTORY_INDEX'] and not keywords:
+        matches = get_inventory().search(**{name: value for name, value in criteria.items() if name != 'keywords'})
+        return paginate_sorted(matches, room_sort_key, cursor, per_page)
+
+    # Query the database based on the search criteria
+    query = Room.query
+    if criteria['room_type']:
+        query = query.filter_by(room_type=criteria['room_type'])
+    if criteria['building'] is not None:
+        query = query.filter_by(building=criteria['building'])
+    if criteria['floor_number'] is not None:
+        query = query.filter_by(floor_number=criteria['floor_number'])
+    if criteria['available_only']:
+        query = query.filter(Room.available_rooms > 0)
+    if keywords:
+        # Text match, filters and ranking in one statement
+        ranked = rank_matches(query, keywords)
+        if ranked is not None:
+            query, rank = ranked
+            rows, next_cursor = paginate_query(query, (rank, Room.id), ranked_sort_key, cursor, per_page)
+            return Page([room for room, _ in rows], next_cursor)
+        query = like_matches(query, keywords)
+    return paginate_query(query, ROOM_PAGE_KEYS, room_sort_key, cursor, per_page)
+
+
+def student_applications(student_id, **filters):
+    # Load a student's applications together with their rooms in one query
+    strategy = current_app.config.get('ROOM_LOADING_STRATEGY', 'joined')
+    return Application.query.options(room_loader(strategy)).filter_by(student_id=student_id, **filters)
+
 
 @main.route('/')
 def index():
     return render_template('index.html')
 
 @main.route('/login', methods=['GET', 'POST'])
+@admission('auth')
 def login():
     
     session.pop('_flashes', None)
@@ -23,10 +110,22 @@ def login():
         password = request.form.get('password')
         
         user = User.query.filter_by(user_id = student_id).first()
+        hasher = get_hasher()
+        
+        try:
+            valid = user is not None and hasher.verify(user.password, password)
+            if valid and hasher.needs_rehash(user.password):
+                # Upgrade hashes made with an older cost setting
+                user.password = hasher.hash(password)
+                db.session.commit()
+        except PasswordServiceBusy:
+            flash('The server is busy, please try again in a moment.', 'danger')
+            return render_template('login.html'), 503
         
-        if user and check_password_hash(user.password, password):
+        if valid:
             session['student_id'] = int(user.user_id)
             session['usertype'] = user.usertype
+            remember_user(user)
             
             return redirect(url_for('main.dashboard'))
         else:
@@ -50,13 +149,14 @@ def dashboard():
 
     student_id = session['student_id']
 
-    bookings = Application.query.filter_by(student_id=student_id).all()
-    rooms = [Room.query.get(booking.room_id) for booking in bookings if booking.room_id]
+    bookings = student_applications(student_id).all()
+    rooms = [booking.room for booking in bookings if booking.room_id]
 
     return render_template('dashboard.html', rooms=rooms)
 
 
 @main.route('/create_account', methods = ['GET','POST'])
+@admission('auth')
 def create_account():
     if request.method == 'POST':
         first_name = request.form.get('first_name')
@@ -80,7 +180,11 @@ def create_account():
             flash('Email is already registered', 'danger')
             return redirect(url_for('main.create_account'))
 
-        hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
+        try:
+            hashed_password = get_hasher().hash(password)
+        except PasswordServiceBusy:
+            flash('The server is busy, please try again in a moment.', 'danger')
+            return redirect(url_for('main.create_account'))
         new_user = User(fname=first_name, lname=last_name, user_id=student_id, email=email, usertype='student', password=hashed_password)
         db.session.add(new_user)
         db.session.commit()
@@ -109,31 +213,49 @@ def room_search():
         return redirect(url_for('main.dashboard'))
     
     rooms = []
-    if request.method == 'POST':
-        room_type = request.form.get('room_type')
-        dormitory = request.form.get('dormitory')  
-        level = request.form.get('level')  
-        availability = request.form.get('availability')
-        
-        # Query the database based on the search criteria
-        query = Room.query
-        if room_type:
-            query = query.filter_by(room_type=room_type)
-            
-        if dormitory:
-            query = query.filter_by(building=int(dormitory))
-               
-        if level:
-            query = query.filter_by(floor_number=int(level))   
-            
-        if availability == 'now':
-            query = query.filter(Room.available_rooms > 0)
-        
-        print(query.statement.compile(dialect=db.engine.dialect, compile_kwargs={"literal_binds": True}))
-            
-        rooms = query.all()
+    filters = {}
+    next_cursor = None
+    # The form POSTs the first page, "Next page" links GET the following ones
+    if request.method == 'POST' or 'cursor' in request.args:
+        filters = {name: request.values.get(name) for name in ('room_type', 'dormitory', 'level', 'availability', 'keywords') if request.values.get(name)}
+        rooms, next_cursor = search_rooms(room_filters(request.values), request.args.get('cursor'), current_app.config['PAGE_SIZE'])
     
-    return render_template('room_search.html', rooms=rooms)
+    return render_template('room_search.html', rooms=rooms, filters=filters, next_cursor=next_cursor)
+
+
+@main.route('/api/rooms', methods=['GET'])
+def api_rooms():
+    # Same filters as room_search; responses are keyed on the inventory version
+    # so clients can revalidate with If-None-Match and repeats skip the search
+    if session.get('usertype') != 'student':
+        return jsonify(error='Unauthorized access'), 403
+    try:
+        criteria = room_filters(request.args)
+    except ValueError:
+        return jsonify(error='dormitory and level must be numbers'), 400
+
+    version = inventory_version()
+    key = (tuple(sorted(criteria.items())), request.args.get('cursor') or '', version)
+    etag = hashlib.sha1(repr(key).encode()).hexdigest()
+    if etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+    else:
+        cache = current_app.extensions['room_api_cache']
+        body = cache.get(key)
+        if body is None:
+            inventory = get_inventory()
+            inventory.sync(version)
+            rooms, next_cursor = search_rooms(criteria, key[1], current_app.config['PAGE_SIZE'])
+            body = json.dumps({
+                'rooms': [{name: getattr(room, name) for name in RoomRecord._fields} for room in rooms],
+                'next_cursor': next_cursor,
+                'version': version,
+            }, separators=(',', ':')).encode()
+            cache.put(key, body)
+        response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 @main.route('/book_room/<int:room_id>/<string:action>', methods=['GET', 'POST'])
@@ -146,7 +268,7 @@ def book_room(room_id, action):
     room = Room.query.get_or_404(room_id)
     
     if action == 'book':
-        student = User.query.filter_by(user_id=session['student_id']).first()
+        student = get_profile(session['student_id'])
         form_data = {
             'student_id': student.user_id if student else '',
             'first_name': student.fname if student else '',
@@ -184,12 +306,8 @@ def submit_application():
     
     if request.method == 'POST':
         
-        # Cannot book the same room more than one time
         room_id = int(request.form.get('room_id'))
         data = request.form
-        application = Application.query.filter_by(student_id=session['student_id'], room_id=int(room_id)).first()
-        if application:
-            errors['room'] = 'You\'ve already booked the selected room'
         
         student_id = request.form.get('student_id')
         first_name = request.form.get('first_name')
@@ -262,9 +380,20 @@ def submit_application():
             room_id = int(room_id),
             status = "Pending"
         )
-        db.session.add(data)
-        db.session.commit()
         
+        # Takes a seat from the room's counters in the same transaction, or
+        # joins the room's waitlist when it is full; the unique index stops
+        # the same room being booked more than one time
+        try:
+            position = submit_or_waitlist(data)
+        except DuplicateApplicationError:
+            errors['room'] = 'You\'ve already booked the selected room'
+            room = Room.query.filter_by(id=room_id).first()
+            return render_template('book_room.html', errors=errors, room=room, form_data=request.form)
+        
+        if position is not None:
+            flash(f'The room is full. You are number {position} on its waitlist.', 'info')
+            return redirect(url_for('main.track_application'))
         flash('Application submitted successfully!', 'success')
         return redirect(url_for('main.dashboard'))
     
@@ -289,11 +418,14 @@ def edit_application(room_id):
         application.email = request.form.get('email', application.email)
         application.telephone = request.form.get('telephone', application.telephone)
         application.gender = request.form.get('gender', application.gender)
-        application.education_level = request.form.get('educationLevel', application.education_level)
+        application.education_level = request.form.get('education_level', application.education_level)
         application.program_type = request.form.get('programType', application.program_type)
         application.reason_for_applying = request.form.get('reason_for_applying', application.reason_for_applying)
         application.co_curricular_activities = request.form.get('co_curricular_activities', application.co_curricular_activities)
         application.agreement = request.form.get('agreement', application.agreement) == 'on'
+        if application.status == WAITLISTED_STATUS:
+            # education_level and program_type set the place in the queue
+            waitlist.reprioritize(application.id, priority_rank(application))
 
         # Save changes to the database
         db.session.commit()
@@ -331,10 +463,13 @@ def view_booking():
 
     student_id = session['student_id']
 
-    bookings = Application.query.filter_by(student_id=student_id).all()
-    rooms = [Room.query.get(booking.room_id) for booking in bookings if booking.room_id]
+    bookings, next_cursor = paginate_query(
+        student_applications(student_id), APPLICATION_PAGE_KEYS, application_sort_key,
+        request.args.get('cursor'), current_app.config['PAGE_SIZE']
+    )
+    rooms = [booking.room for booking in bookings if booking.room_id]
 
-    return render_template('view_booking.html', rooms=rooms)
+    return render_template('view_booking.html', rooms=rooms, next_cursor=next_cursor)
 
 @main.route('/track_application', methods=['GET', 'POST'])
 def track_application():
@@ -342,41 +477,71 @@ def track_application():
 
     room_id = request.args.get('room_id')
     student_id = session['student_id']
+    next_cursor = None
 
     if room_id:
         # Fetch the specific application by room_id and student_id
-        application = Application.query.filter_by(room_id=room_id, student_id=student_id).first()
+        application = student_applications(student_id, room_id=room_id).first()
         if application:
-            room = Room.query.get(application.room_id) if application.room_id else None
             applications_with_rooms = [
-                {"application": application, "room": room}
+                {"application": application, "room": application.room}
             ]
         else:
             applications_with_rooms = []
     else:
         # Fetch all applications for the student
-        applications = Application.query.filter_by(student_id=student_id).all()
+        applications, next_cursor = paginate_query(
+            student_applications(student_id), APPLICATION_PAGE_KEYS, application_sort_key,
+            request.args.get('cursor'), current_app.config['PAGE_SIZE']
+        )
         applications_with_rooms = [
             {
                 "application": application,
-                "room": Room.query.get(application.room_id) if application.room_id else None
+                "room": application.room
             }
             for application in applications
         ]
 
+    # Served from the in-memory waitlists, not counted per view
+    waitlist_positions = {
+        item['application'].id: waitlist.position(item['application'])
+        for item in applications_with_rooms
+        if item['application'].status == WAITLISTED_STATUS
+    }
+
     return render_template(
         'track_application.html',
         applications_with_rooms=applications_with_rooms,
         statuses=statuses,
-        enumerate=enumerate
+        waitlist_positions=waitlist_positions,
+        enumerate=enumerate,
+        next_cursor=next_cursor
     )
     
+@main.route('/withdraw_application/<int:application_id>', methods=['POST'])
+def withdraw_application(application_id):
+    if session.get('usertype') != 'student':
+        flash("Unauthorized access", "danger")
+        return redirect(url_for('main.dashboard'))
+    
+    application = student_applications(session['student_id'], id=application_id).first()
+    if not application:
+        flash('Application not found.', 'danger')
+        return redirect(url_for('main.track_application'))
+    
+    if application.status not in RELEASED_STATUSES:
+        release_application(application, 'Withdrawn')
+        flash('Your application has been withdrawn.', 'info')
+    
+    return redirect(url_for('main.track_application'))
+    
 ALLOWED_EXTENSIONS = {'pdf', 'jpg', 'png'}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 @main.route('/upload_receipt/<int:application_id>', methods=['GET', 'POST'])
+@admission('upload')
 def upload_receipt(application_id):
     if session.get('usertype') != 'student':
         flash("Unauthorized access", "danger")
@@ -394,33 +559,30 @@ def upload_receipt(application_id):
         return redirect(url_for('main.track_application'))
 
     if file and allowed_file(file.filename):
-        # Get the application and its details
-        application = Application.query.get(application_id)
+        # Get the application and its details; only the owner may upload
+        application = student_applications(session['student_id'], id=application_id).first()
         if not application:
             flash('Application not found', 'danger')
             return redirect(url_for('main.track_application'))
+        if application.status not in RECEIPT_STATUSES:
+            flash('A receipt can only be uploaded once the application is approved.', 'danger')
+            return redirect(url_for('main.track_application'))
 
-        student_id = application.student_id
         room_id = application.room_id
 
-        # Directory to save uploads
-        upload_folder = os.path.join(os.getcwd(), 'app', 'static', 'uploads')
-        os.makedirs(upload_folder, exist_ok=True)  # Ensure the directory exists
-
-        # Check if a previous receipt exists and delete it
-        previous_receipt_prefix = f"Payment_receipt_{student_id}_{room_id}_{application_id}"
-        for existing_file in os.listdir(upload_folder):
-            if existing_file.startswith(previous_receipt_prefix):
-                os.remove(os.path.join(upload_folder, existing_file))
-
-        # Save the new file with a unique name
-        filename = f"{previous_receipt_prefix}.{file.filename.rsplit('.', 1)[1].lower()}"
-        filepath = os.path.join(upload_folder, secure_filename(filename))
-        file.save(filepath)
+        # Stream the file into content-addressed storage and record it
+        try:
+            replaced = save_receipt(application, file)
+        except ReceiptTooLarge:
+            db.session.rollback()
+            flash('The receipt is too large to upload.', 'danger')
+            return redirect(url_for('main.track_application', room_id=room_id))
 
         # Update application status
         application.status = 'Payment Under Review'
         db.session.commit()
+        if replaced:
+            discard_file(replaced)
 
          # Flash a success message specific to the application
         flash(f'Payment receipt uploaded successfully and is under review', f'success_{application_id}')
@@ -429,12 +591,98 @@ def upload_receipt(application_id):
         flash(f'Invalid file format for application {application_id}. Only PDF, JPG, and PNG are allowed.', 'danger')
         return redirect(url_for('main.track_application', room_id=application_id))
     
+@main.app_errorhandler(RequestEntityTooLarge)
+def upload_too_large(error):
+    flash('The uploaded file is too large.', 'danger')
+    return redirect(url_for('main.track_application'))
+    
 @main.route('/create_admin', methods=['GET', 'POST'])
 def create_admin():
     errors = {}
     form_data = None
     return render_template('create_admin.html', errors = errors, form_data=form_data)
     
-@main.route('/system_log', methods=['GET', 'POST'])
+@main.route('/sql_stats', methods=['GET'])
+def sql_stats():
+    if session.get('usertype') not in ADMIN_USERTYPES:
+        flash("Unauthorized access", "danger")
+        return redirect(url_for('main.dashboard'))
+    
+    stats = current_app.extensions['sql_stats']
+    return jsonify(enabled=current_app.config['SQL_METRICS_ENABLED'], statements=stats.snapshot(limit=request.args.get('limit', 50, type=int)))
+
+@main.route('/admin/applications/status', methods=['POST'])
+def admin_transition_applications():
+    if session.get('usertype') not in ADMIN_USERTYPES:
+        return jsonify(error='Unauthorized access'), 403
+    
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids')
+    status = data.get('status')
+    if not isinstance(ids, list) or not status:
+        return jsonify(error='Expected a JSON body with "ids" (a list) and "status"'), 400
+    
+    try:
+        outcomes = transition_applications(ids, status)
+    except (InvalidTransition, ValueError, TypeError) as exc:
+        return jsonify(error=str(exc)), 400
+    
+    applied = sum(1 for outcome in outcomes if outcome['outcome'] == 'applied')
+    return jsonify(status=status, applied=applied, results=outcomes)
+
+@main.route('/system_log', methods=['GET'])
 def system_log():
-    pass
\ No newline at end of file
+    # Newest application events first, optionally for one application
+    if session.get('usertype') not in ADMIN_USERTYPES:
+        flash("Unauthorized access", "danger")
+        return redirect(url_for('main.dashboard'))
+    
+    application_id = request.args.get('application_id', type=int)
+    query = ApplicationEvent.query
+    if application_id is not None:
+        query = query.filter_by(application_id=application_id)
+    events, next_cursor = paginate_query(
+        query, EVENT_PAGE_KEYS, event_sort_key,
+        request.args.get('cursor'), current_app.config['PAGE_SIZE'], descending=True
+    )
+    return render_template('system_log.html', events=events, next_cursor=next_cursor, application_id=application_id)
+
+@main.route('/system_log/export', methods=['GET'])
+def export_system_log():
+    # Streams the whole log, oldest first, as JSON Lines or ?format=csv
+    if session.get('usertype') not in ADMIN_USERTYPES:
+        return jsonify(error='Unauthorized access'), 403
+    
+    fmt = 'csv' if request.args.get('format') == 'csv' else 'jsonl'
+    chunks = export_events(fmt, request.args.get('application_id', type=int))
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    response = current_app.response_class(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=application-events.{fmt}'
+    return response
+
+@main.route('/admin/occupancy', methods=['GET'])
+def occupancy():
+    # Reads only the occupancy summary, see app/occupancy.py
+    if session.get('usertype') not in ADMIN_USERTYPES:
+        flash("Unauthorized access", "danger")
+        return redirect(url_for('main.dashboard'))
+    
+    rows, statuses = occupancy_report()
+    statuses = sorted(statuses, key=lambda status: (STATUS_ORDER.index(status) if status in STATUS_ORDER else len(STATUS_ORDER), status))
+    totals = {status: sum(counts.get(status, 0) for *_, counts in rows) for status in statuses}
+    seat_totals = {bucket: sum(seats.get(bucket, 0) for *_, seats, counts in rows) for bucket in SEAT_BUCKETS.values()}
+    return render_template('occupancy.html', rows=rows, statuses=statuses, totals=totals,
+                           seat_totals=seat_totals, seat_buckets=SEAT_BUCKETS)
+
+@main.route('/metrics', methods=['GET'])
+def metrics():
+    # Per-endpoint request histograms, Prometheus text or ?format=json
+    token = current_app.config.get('METRICS_TOKEN')
+    scraper = token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not scraper and session.get('usertype') not in ADMIN_USERTYPES:
+        return jsonify(error='Unauthorized access'), 403
+    
+    snapshot = get_histograms().snapshot()
+    if request.args.get('format') == 'json':
+        return jsonify(enabled=current_app.config['REQUEST_METRICS_ENABLED'], buckets_ms=list(BUCKETS), endpoints=snapshot)
+    return current_app.response_class(prometheus_text(snapshot), mimetype='text/plain; version=0.0.4')
\ No newline at end of file
@@ -0,0 +1,106 @@
+"""Timing and sampled logging for SQL statements.
+
+When SQL_METRICS_ENABLED is off no engine listeners are registered, so the
+layer costs nothing. When on, every statement is timed with
+before/after_cursor_execute, folded into per-fingerprint totals, and logged
+only if it is slower than SQL_SLOW_THRESHOLD_MS or picked by
+SQL_LOG_SAMPLE_RATE. Parameters are redacted unless SQL_LOG_PARAMETERS is set.
+"""
+import logging
+import random
+import re
+import threading
+import time
+from functools import lru_cache
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(statement):
+    # Collapse literals and IN lists so the same query shape shares a bucket
+    text = _STRING_LITERAL.sub('?', statement)
+    text = _NUMBER_LITERAL.sub('?', text)
+    text = _WHITESPACE.sub(' ', text).strip()
+    return _PLACEHOLDER_LIST.sub('(?)', text)
+
+
+class SQLStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, statement, elapsed):
+        key = fingerprint(statement)
+        with self._lock:
+            entry = self._stats.get(key)
+            if entry is None:
+                self._stats[key] = [1, elapsed, elapsed]
+            else:
+                entry[0] += 1
+                entry[1] += elapsed
+                if elapsed > entry[2]:
+                    entry[2] = elapsed
+
+    def snapshot(self, limit=None):
+        with self._lock:
+            items = [(key, list(entry)) for key, entry in self._stats.items()]
+        items.sort(key=lambda item: item[1][1], reverse=True)
+        return [
+            {
+                'statement': key,
+                'count': count,
+                'total_ms': round(total * 1000, 3),
+                'mean_ms': round(total / count * 1000, 3),
+                'max_ms': round(longest * 1000, 3),
+            }
+            for key, (count, total, longest) in items[:limit]
+        ]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+def init_app(app, engine):
+    app.config.setdefault('SQL_METRICS_ENABLED', False)
+    app.config.setdefault('SQL_SLOW_THRESHOLD_MS', 100)
+    app.config.setdefault('SQL_LOG_SAMPLE_RATE', 0.0)
+    app.config.setdefault('SQL_LOG_PARAMETERS', False)
+
+    stats = SQLStats()
+    app.extensions['sql_stats'] = stats
+    if not app.config['SQL_METRICS_ENABLED']:
+        return stats
+
+    threshold = app.config['SQL_SLOW_THRESHOLD_MS'] / 1000.0
+    sample_rate = app.config['SQL_LOG_SAMPLE_RATE']
+    log_parameters = app.config['SQL_LOG_PARAMETERS']
+
+    # The start time lives on the execution context, so a statement that
+    # raises leaves nothing behind on the pooled connection
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        context._sql_metrics_start = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def stop_timer(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._sql_metrics_start
+        stats.record(statement, elapsed)
+        if elapsed >= threshold or (sample_rate and random.random() < sample_rate):
+            logger.warning(
+                "SQL %.1fms%s: %s | params=%s",
+                elapsed * 1000,
+                ' (slow)' if elapsed >= threshold else ' (sampled)',
+                _WHITESPACE.sub(' ', statement).strip(),
+                parameters if log_parameters else '<redacted>',
+            )
+
+    return stats
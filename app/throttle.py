@@ -0,0 +1,95 @@
+"""Token-bucket admission control for expensive endpoints.
+
+Routes opt in with @admission('<class>'). Each endpoint class has a bucket
+per client plus one shared bucket, both configured in ADMISSION_LIMITS. A
+request that finds either bucket empty gets an immediate 429 with
+Retry-After instead of waiting for a worker, so a flood of logins or
+uploads cannot starve the cheap pages.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, make_response, request
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, now):
+        # Returns 0 when a token was taken, otherwise seconds until one is free
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    def __init__(self, limits, max_clients=10000):
+        self.limits = limits
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._clients = OrderedDict()
+        self._totals = {
+            name: TokenBucket(limit['total_rate'], limit['total_burst'])
+            for name, limit in limits.items() if limit.get('total_rate')
+        }
+
+    def admit(self, endpoint_class, client):
+        limit = self.limits.get(endpoint_class)
+        if limit is None:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            key = (endpoint_class, client)
+            bucket = self._clients.get(key)
+            if bucket is None:
+                bucket = TokenBucket(limit['client_rate'], limit['client_burst'])
+                self._clients[key] = bucket
+                if len(self._clients) > self.max_clients:
+                    self._clients.popitem(last=False)
+            else:
+                self._clients.move_to_end(key)
+
+            wait = bucket.take(now)
+            if wait:
+                return wait
+            total = self._totals.get(endpoint_class)
+            if total is not None:
+                wait = total.take(now)
+                if wait:
+                    # Give the client its token back, the rejection was not its fault
+                    bucket.tokens += 1
+            return wait
+
+
+def init_app(app):
+    app.config.setdefault('ADMISSION_CONTROL_ENABLED', False)
+    app.config.setdefault('ADMISSION_LIMITS', {})
+    app.config.setdefault('ADMISSION_MAX_CLIENTS', 10000)
+    app.extensions['admission'] = AdmissionController(app.config['ADMISSION_LIMITS'], app.config['ADMISSION_MAX_CLIENTS'])
+
+
+def admission(endpoint_class, methods=('POST',)):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if current_app.config['ADMISSION_CONTROL_ENABLED'] and request.method in methods:
+                wait = current_app.extensions['admission'].admit(endpoint_class, request.remote_addr)
+                if wait:
+                    response = make_response('Too many requests, please try again shortly.', 429)
+                    response.headers['Retry-After'] = str(math.ceil(wait))
+                    return response
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
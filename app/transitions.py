@@ -0,0 +1,114 @@
+"""Set-based application status transitions for admins.
+
+A transition to one target status is applied to many applications with
+one UPDATE ... WHERE id IN (...) AND status IN (<allowed sources>)
+RETURNING per chunk of ids. When the target gives seats back (Rejected,
+Withdrawn), one executemany UPDATE on rooms adjusts every affected room,
+and the freed seats go to the rooms' waitlists. One executemany INSERT
+logs the changes (app/events.py). Everything happens in a single
+transaction, along with the occupancy summary updates (app/occupancy.py).
+"""
+from collections import Counter
+
+from sqlalchemy import bindparam, select, update
+
+from app import db, occupancy, waitlist
+from app.events import record_status_changes
+from app.models import Application, Room
+from app.reservations import HOLDING_STATUSES, RELEASED_STATUSES, WAITLISTED_STATUS, promote_waitlisted, run_with_retry
+
+# Allowed moves along the lifecycle shown on track_application
+TRANSITIONS = {
+    'Pending': {'Application Approved', 'Rejected', 'Withdrawn'},
+    'Application Approved': {'Payment Under Review', 'Rejected', 'Withdrawn'},
+    'Payment Under Review': {'Room Booked', 'Application Approved', 'Rejected', 'Withdrawn'},
+    'Room Booked': {'Withdrawn'},
+    WAITLISTED_STATUS: {'Rejected', 'Withdrawn'},
+}
+
+# Stays under SQLite's bound parameter limit
+CHUNK_SIZE = 5000
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+def allowed_sources(target):
+    return [source for source, targets in TRANSITIONS.items() if target in targets]
+
+
+def _chunks(ids):
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield ids[start:start + CHUNK_SIZE]
+
+
+def _apply(ids, target):
+    sources = allowed_sources(target)
+    applications = Application.__table__
+    current = {}
+    applied = {}
+    for chunk in _chunks(ids):
+        current.update(db.session.execute(
+            select(applications.c.id, applications.c.status).where(applications.c.id.in_(chunk))
+        ).all())
+        applied.update(db.session.execute(
+            update(applications)
+            .where(applications.c.id.in_(chunk), applications.c.status.in_(sources))
+            .values(status=target)
+            .returning(applications.c.id, applications.c.room_id)
+            .execution_options(occupancy_tracked=True)
+        ).all())
+
+    record_status_changes((application_id, current[application_id], target) for application_id in applied)
+    occupancy.record_moves((room_id, current[application_id], target) for application_id, room_id in applied.items())
+
+    if target in RELEASED_STATUSES:
+        # Rows that left a holding status give one seat back each, the
+        # waitlisted ones only leave their waitlist
+        released = Counter(
+            room_id for application_id, room_id in applied.items()
+            if room_id is not None and current[application_id] in HOLDING_STATUSES
+        )
+        waitlist.leave([application_id for application_id in applied if current[application_id] == WAITLISTED_STATUS])
+        if released:
+            rooms = Room.__table__
+            result = db.session.execute(
+                update(rooms)
+                .where(rooms.c.id == bindparam('room'), rooms.c.booked_rooms >= bindparam('seats'))
+                .values(
+                    booked_rooms=rooms.c.booked_rooms - bindparam('seats'),
+                    available_rooms=rooms.c.available_rooms + bindparam('seats'),
+                )
+                .execution_options(seat_counts=True, occupancy_tracked=True),
+                [{'room': room_id, 'seats': seats} for room_id, seats in released.items()],
+            )
+            if result.rowcount == len(released):
+                occupancy.record_seats({room_id: -seats for room_id, seats in released.items()})
+            else:
+                # Some room had fewer booked seats than released; recount
+                occupancy.mark_dirty()
+            for room_id in sorted(waitlist.waiting_rooms(released)):
+                promote_waitlisted(room_id, released[room_id])
+
+    outcomes = []
+    for application_id in ids:
+        if application_id in applied:
+            outcomes.append({'id': application_id, 'outcome': 'applied', 'status': target})
+        elif application_id not in current:
+            outcomes.append({'id': application_id, 'outcome': 'not_found'})
+        else:
+            outcomes.append({
+                'id': application_id,
+                'outcome': 'invalid_transition',
+                'status': current[application_id],
+            })
+    return outcomes
+
+
+def transition_applications(ids, target):
+    # Returns one outcome dict per requested id, in request order
+    if not any(target in targets for targets in TRANSITIONS.values()):
+        raise InvalidTransition(f"Unknown target status: {target}")
+    ids = list(dict.fromkeys(int(application_id) for application_id in ids))
+    return run_with_retry(lambda: _apply(ids, target))
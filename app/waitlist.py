@@ -0,0 +1,229 @@
+"""Per-room waitlists.
+
+An application for a full room is stored as Waitlisted with a row in the
+waitlist table. The table is the queue: promotions read the next entries
+for a room from ix_waitlist_room_priority (priority, then application id)
+inside the transaction that frees the seat, see app/reservations.py.
+
+Queue positions for track_application come from a per-worker copy of each
+room's queue, loaded from the table on first use. Entries are kept in one
+id-sorted list per priority, so a position is a bisect plus the lengths of
+the higher priorities, and removing the head is O(1). Adds and removals
+made through this module are applied to the copy when their transaction
+commits; copies are reloaded after WAITLIST_MAX_AGE seconds so changes made
+by other workers show up. Copies are changed in place, so reads and writes
+both hold the Waitlist lock.
+"""
+import bisect
+import threading
+import time
+
+from flask import current_app, has_app_context
+from sqlalchemy import delete, event, select, update
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import WaitlistEntry
+
+_OPS_KEY = 'waitlist_ops'
+
+# Stays under SQLite's bound parameter limit
+CHUNK_SIZE = 5000
+
+
+class _Bucket:
+    __slots__ = ('ids', 'head')
+
+    def __init__(self):
+        self.ids = []
+        self.head = 0
+
+
+class RoomQueue:
+    # One room's waitlist: application ids per priority, lowest priority first
+    def __init__(self, rows):
+        self.buckets = {}
+        self.priority_of = {}
+        self.loaded_at = time.monotonic()
+        for priority, application_id in rows:
+            self.add(priority, application_id)
+
+    def __len__(self):
+        return len(self.priority_of)
+
+    def add(self, priority, application_id):
+        if application_id in self.priority_of:
+            return
+        bucket = self.buckets.get(priority)
+        if bucket is None:
+            bucket = self.buckets[priority] = _Bucket()
+        # Ids only grow, so new entries nearly always go on the end
+        if bucket.ids and application_id < bucket.ids[-1]:
+            bisect.insort(bucket.ids, application_id, bucket.head)
+        else:
+            bucket.ids.append(application_id)
+        self.priority_of[application_id] = priority
+
+    def remove(self, application_id):
+        priority = self.priority_of.pop(application_id, None)
+        if priority is None:
+            return False
+        bucket = self.buckets[priority]
+        index = bisect.bisect_left(bucket.ids, application_id, bucket.head)
+        if index == bucket.head:
+            bucket.head += 1
+            if bucket.head > 32 and bucket.head * 2 > len(bucket.ids):
+                del bucket.ids[:bucket.head]
+                bucket.head = 0
+        else:
+            del bucket.ids[index]
+        return True
+
+    def position(self, application_id):
+        # 1-based, None when the application is not queued
+        priority = self.priority_of.get(application_id)
+        if priority is None:
+            return None
+        ahead = sum(len(bucket.ids) - bucket.head for other, bucket in self.buckets.items() if other < priority)
+        bucket = self.buckets[priority]
+        return ahead + bisect.bisect_left(bucket.ids, application_id, bucket.head) - bucket.head + 1
+
+
+class Waitlist:
+    def __init__(self, max_age=None):
+        self.max_age = max_age
+        self._rooms = {}
+        self._lock = threading.Lock()
+
+    def queue(self, room_id, reload=False):
+        queue = self._rooms.get(room_id)
+        if reload or queue is None or (self.max_age is not None and time.monotonic() - queue.loaded_at >= self.max_age):
+            rows = db.session.execute(
+                select(WaitlistEntry.priority, WaitlistEntry.application_id)
+                .where(WaitlistEntry.room_id == room_id)
+                .order_by(WaitlistEntry.priority, WaitlistEntry.application_id)
+            )
+            queue = RoomQueue(rows)
+            with self._lock:
+                self._rooms[room_id] = queue
+        return queue
+
+    def position(self, room_id, application_id):
+        # apply() changes queues in place, so reads take the lock too
+        queue = self.queue(room_id)
+        with self._lock:
+            position = queue.position(application_id)
+        if position is None:
+            # Possibly queued by another worker since the copy was loaded
+            queue = self.queue(room_id, reload=True)
+            with self._lock:
+                position = queue.position(application_id)
+        return position
+
+    def apply(self, ops):
+        with self._lock:
+            for op, room_id, priority, application_id in ops:
+                queue = self._rooms.get(room_id)
+                if queue is None:
+                    continue
+                if op == 'add':
+                    queue.add(priority, application_id)
+                else:
+                    queue.remove(application_id)
+
+    def clear(self):
+        with self._lock:
+            self._rooms.clear()
+
+
+def init_app(app):
+    app.config.setdefault('WAITLIST_MAX_AGE', 30)
+    app.extensions['waitlist'] = Waitlist(app.config['WAITLIST_MAX_AGE'])
+
+
+def get_waitlist():
+    return current_app.extensions['waitlist']
+
+
+def _record(op, room_id, priority, application_id):
+    db.session.info.setdefault(_OPS_KEY, []).append((op, room_id, priority, application_id))
+
+
+def enqueue(application, priority):
+    # Queue a flushed application for its room in the current transaction
+    db.session.add(WaitlistEntry(application_id=application.id, room_id=application.room_id, priority=priority))
+    _record('add', application.room_id, priority, application.id)
+
+
+def next_entries(room_id, limit):
+    return db.session.execute(
+        select(WaitlistEntry.application_id)
+        .where(WaitlistEntry.room_id == room_id)
+        .order_by(WaitlistEntry.priority, WaitlistEntry.application_id)
+        .limit(limit)
+    ).scalars().all()
+
+
+def leave(application_ids):
+    # Drop entries in the current transaction; returns {application_id: room_id} for those that were queued
+    left = {}
+    application_ids = list(application_ids)
+    for start in range(0, len(application_ids), CHUNK_SIZE):
+        rows = db.session.execute(
+            delete(WaitlistEntry)
+            .where(WaitlistEntry.application_id.in_(application_ids[start:start + CHUNK_SIZE]))
+            .returning(WaitlistEntry.application_id, WaitlistEntry.room_id, WaitlistEntry.priority)
+            .execution_options(synchronize_session=False)
+        ).all()
+        for application_id, room_id, priority in rows:
+            _record('remove', room_id, priority, application_id)
+            left[application_id] = room_id
+    return left
+
+
+def reprioritize(application_id, priority):
+    # Move a queued application to a new priority in the current transaction
+    rows = db.session.execute(
+        update(WaitlistEntry)
+        .where(WaitlistEntry.application_id == application_id, WaitlistEntry.priority != priority)
+        .values(priority=priority)
+        .returning(WaitlistEntry.room_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    for (room_id,) in rows:
+        _record('remove', room_id, None, application_id)
+        _record('add', room_id, priority, application_id)
+
+
+def waiting_rooms(room_ids):
+    # The subset of room_ids with anyone waiting
+    room_ids = list(room_ids)
+    waiting = set()
+    for start in range(0, len(room_ids), CHUNK_SIZE):
+        waiting.update(db.session.execute(
+            select(WaitlistEntry.room_id).where(WaitlistEntry.room_id.in_(room_ids[start:start + CHUNK_SIZE])).distinct()
+        ).scalars())
+    return waiting
+
+
+def position(application):
+    return get_waitlist().position(application.room_id, application.id)
+
+
+def _active_waitlist():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('waitlist')
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_waitlist_ops(session):
+    ops = session.info.pop(_OPS_KEY, None)
+    waitlist = _active_waitlist()
+    if ops and waitlist is not None:
+        waitlist.apply(ops)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_waitlist_ops(session):
+    session.info.pop(_OPS_KEY, None)
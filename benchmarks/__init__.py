@@ -0,0 +1,7 @@
+"""Local benchmarks, each run as `python -m benchmarks.<name>`.
+
+benchmarks.seed fills a database at a chosen scale, benchmarks.journey
+drives the student journey through create_app and writes a JSON report,
+and benchmarks.compare diffs two reports. The other modules each measure
+one change in isolation.
+"""
@@ -0,0 +1,97 @@
+"""Read-only page latency while /login is flooded.
+
+Runs three phases: no flood, a login flood with admission control off, and
+the same flood with it on. The flood comes from many client addresses with
+wrong passwords at a fixed arrival rate, so every admitted request pays for
+the full KDF.
+
+    python -m benchmarks.admission_load [seconds] [flood_threads]
+"""
+import sys
+import threading
+import time
+
+from werkzeug.security import generate_password_hash
+
+from app import db
+from app.models import User
+from benchmarks.common import login_as, make_app, remove_db, sample_application, sample_room, summarize
+
+STUDENT_ID = 620000001
+FLOOD_INTERVAL = 0.02  # seconds between login attempts per flood thread
+METHOD = 'pbkdf2:sha256:200000'
+# Sized so admitted logins use a fraction of one core at this KDF cost
+LIMITS = {'auth': {'client_rate': 0.5, 'client_burst': 5, 'total_rate': 2, 'total_burst': 4}}
+
+
+def phase(app, seconds, flood_threads):
+    stop = threading.Event()
+    flood = {'sent': 0, 'rejected': 0}
+    lock = threading.Lock()
+
+    def flooder(n):
+        client = app.test_client()
+        sent = rejected = 0
+        i = 0
+        next_send = time.perf_counter()
+        while not stop.is_set():
+            next_send += FLOOD_INTERVAL
+            i += 1
+            response = client.post(
+                '/login', data={'userID': str(STUDENT_ID), 'password': 'wrong'},
+                environ_base={'REMOTE_ADDR': f'10.{n}.{i // 250 % 250}.{i % 250}'},
+            )
+            sent += 1
+            rejected += response.status_code == 429
+            stop.wait(max(0.0, next_send - time.perf_counter()))
+        with lock:
+            flood['sent'] += sent
+            flood['rejected'] += rejected
+
+    threads = [threading.Thread(target=flooder, args=(n,)) for n in range(flood_threads)]
+    for thread in threads:
+        thread.start()
+
+    reader = app.test_client()
+    login_as(reader, STUDENT_ID)
+    samples = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        for page in ('/dashboard', '/track_application'):
+            assert reader.get(page).status_code == 200
+        samples.append(time.perf_counter() - start)
+
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return summarize(samples), flood
+
+
+def main(seconds=5, flood_threads=8):
+    phases = [
+        ('no flood', {'ADMISSION_CONTROL_ENABLED': False}, 0),
+        ('flood, admission off', {'ADMISSION_CONTROL_ENABLED': False}, flood_threads),
+        ('flood, admission on', {'ADMISSION_CONTROL_ENABLED': True, 'ADMISSION_LIMITS': LIMITS}, flood_threads),
+    ]
+    for label, overrides, threads in phases:
+        app, db_path = make_app(PASSWORD_HASH_WORKERS=0, PASSWORD_HASH_METHOD=METHOD, **overrides)
+        try:
+            with app.app_context():
+                db.session.add(User(user_id=STUDENT_ID, fname='Test', lname='Student', email='t@mymona.uwi.edu', usertype='student', password=generate_password_hash('secret', METHOD)))
+                room = sample_room()
+                db.session.add(room)
+                db.session.flush()
+                db.session.add(sample_application(STUDENT_ID, room.id))
+                db.session.commit()
+            stats, flood = phase(app, seconds, threads)
+            print(
+                f"{label:22} pages p50={stats['p50_ms']:7.1f}ms p99={stats['p99_ms']:7.1f}ms "
+                f"logins sent={flood['sent']} rejected_429={flood['rejected']}"
+            )
+        finally:
+            remove_db(db_path)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
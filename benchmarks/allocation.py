@@ -0,0 +1,196 @@
+"""Batch allocation of Pending applications (app/allocation.py).
+
+Checks how the form's education levels and program types rank, a small
+hand-worked case, that the result does not depend on input
+order, that a student is placed once and never moved into a room they
+already applied for, then allocates --applicants Pending applications across --rooms
+rooms with fewer seats than applicants and checks the written result: no
+room over capacity, counters matching the applications, and for every
+room type all placed applicants ahead of all unplaced ones.
+
+    python -m benchmarks.allocation [applicants] [rooms]
+"""
+import random
+import sys
+import time
+from collections import Counter
+
+from sqlalchemy import func, select
+
+from app import db
+from app.allocation import Applicant, allocate, priority_key, run_allocation
+from app.models import Application, Room
+from app.reservations import HOLDING_STATUSES
+from benchmarks.common import LEVELS, PROGRAMS, application_row, make_app, remove_db, sample_room
+
+FIRST_STUDENT_ID = 620000000
+
+
+def check_priorities():
+    # The form's values, best first: postgraduates, then research degrees
+    ranked = [
+        ('postgraduate', 'PhD'), ('postgraduate', 'Mphil'), ('postgraduate', 'masters'),
+        ('undergraduate', 'bachelors'), ('undergraduate', 'unknown'),
+    ]
+    keys = [priority_key(values) for values in ranked]
+    assert keys == sorted(keys) and len(set(keys)) == len(keys), keys
+    assert priority_key(('Postgraduate', 'phd')) == keys[0], 'case does not matter'
+    assert len({priority_key((level, program)) for level in LEVELS for program in PROGRAMS}) == len(LEVELS) * len(PROGRAMS)
+
+
+def check_small_case():
+    rooms = [
+        (1, 'Single', 1, 1),
+        (2, 'Single', 1, 2),
+        (3, 'Single', 2, 1),
+        (4, 'Double', 1, 0),
+    ]
+    undergrad = priority_key(('undergraduate', 'bachelors'))
+    postgrad = priority_key(('postgraduate', 'masters'))
+    applicants = [
+        Applicant(10, 1, undergrad),  # first choice taken by 11, moves to room 2
+        Applicant(11, 1, postgrad),   # postgraduates go first
+        Applicant(12, 1, undergrad),  # room 2's last seat
+        Applicant(13, 1, undergrad),  # building 1 is full, room 3 in building 2
+        Applicant(14, 2, undergrad),  # no Single seats left
+        Applicant(15, 4, postgrad),   # no Double seats at all
+    ]
+    expected = {11: 1, 10: 2, 12: 2, 13: 3, 14: None, 15: None}
+    placements = allocate(applicants, rooms)
+    assert placements == expected, placements
+
+    shuffled = applicants[:]
+    for seed in range(5):
+        random.Random(seed).shuffle(shuffled)
+        assert allocate(shuffled, list(reversed(rooms))) == expected, 'input order does not change the result'
+
+
+def check_students():
+    rooms = [(1, 'Single', 1, 1), (2, 'Single', 1, 2), (3, 'Single', 1, 1)]
+    rank = priority_key(('undergraduate', 'bachelors'))
+    applicants = [
+        Applicant(20, 1, rank, 'a'),
+        Applicant(21, 1, rank, 'b', {2}),  # room 1 is full and room 2 is taken by b's own application
+        Applicant(22, 2, rank, 'b', {1}),  # b is already placed
+        Applicant(23, 2, rank, 'c'),
+    ]
+    assert allocate(applicants, rooms) == {20: 1, 21: 3, 22: None, 23: 2}
+
+    # The same through the database, where a move into room 2 would break the unique index
+    app, db_path = make_app()
+    try:
+        with app.app_context():
+            first, second = sample_room(total_rooms=1, available_rooms=1), sample_room(total_rooms=1, available_rooms=1)
+            db.session.add_all([first, second])
+            db.session.flush()
+            db.session.execute(Application.__table__.insert(), [
+                application_row(FIRST_STUDENT_ID, first.id),
+                application_row(FIRST_STUDENT_ID + 1, first.id),
+                application_row(FIRST_STUDENT_ID + 1, second.id),
+            ])
+            db.session.commit()
+            run_allocation()
+            statuses = db.session.execute(
+                select(Application.student_id, Application.room_id, Application.status).order_by(Application.id)
+            ).all()
+            assert statuses == [
+                (str(FIRST_STUDENT_ID), first.id, 'Application Approved'),
+                (str(FIRST_STUDENT_ID + 1), first.id, 'Rejected'),
+                (str(FIRST_STUDENT_ID + 1), second.id, 'Application Approved'),
+            ], statuses
+    finally:
+        remove_db(db_path)
+
+
+def seed(n_applicants, n_rooms, rnd):
+    db.session.execute(Room.__table__.insert(), [
+        {
+            'building': rnd.randint(1, 10), 'room_type': rnd.choice(['Single', 'Double']),
+            'floor_number': rnd.randint(1, 6), 'description': 'Synthetic room',
+            'total_rooms': rnd.randint(1, 10), 'booked_rooms': 0, 'available_rooms': 0,
+            'image_url': 'images/singleroom-irvine.png',
+        }
+        for _ in range(n_rooms)
+    ])
+    rows = []
+    for index in range(n_applicants):
+        status = 'Pending' if rnd.random() < 0.9 else 'Room Booked'
+        rows.append(application_row(
+            FIRST_STUDENT_ID + index, rnd.randint(1, n_rooms), status=status,
+            education_level=rnd.choice(LEVELS),
+            program_type=rnd.choice(PROGRAMS),
+        ))
+    db.session.execute(Application.__table__.insert(), rows)
+    db.session.commit()
+
+
+def held_seats(statuses):
+    applications = Application.__table__
+    return Counter(dict(db.session.execute(
+        select(applications.c.room_id, func.count())
+        .where(applications.c.status.in_(statuses))
+        .group_by(applications.c.room_id)
+    ).all()))
+
+
+def check_result(pending_before, held_before):
+    applications = Application.__table__
+    rooms = {row.id: row for row in db.session.execute(select(Room.__table__))}
+    holding = held_seats(HOLDING_STATUSES)
+    assert db.session.execute(select(func.count()).where(applications.c.status == 'Pending')).scalar() == 0
+    for room_id, room in rooms.items():
+        assert room.booked_rooms == holding[room_id], (room_id, room.booked_rooms, holding[room_id])
+        assert room.available_rooms == max(0, room.total_rooms - room.booked_rooms)
+        # Seats held before the run are kept even if over capacity
+        assert holding[room_id] <= max(room.total_rooms, held_before[room_id]), room_id
+
+    rows = db.session.execute(
+        select(applications.c.id, applications.c.status, applications.c.room_id,
+               applications.c.education_level, applications.c.program_type)
+        .where(applications.c.id.in_(pending_before))
+    ).all()
+    by_type = {}
+    for row in rows:
+        room_type = rooms[row.room_id].room_type
+        key = (priority_key((row.education_level, row.program_type)), row.id)
+        entry = by_type.setdefault(room_type, {'placed': [], 'unplaced': []})
+        entry['placed' if row.status == 'Application Approved' else 'unplaced'].append(key)
+    for room_type, entry in by_type.items():
+        free = sum(room.available_rooms for room in rooms.values() if room.room_type == room_type)
+        if entry['unplaced']:
+            assert free == 0, f"{room_type}: applicants left out while seats are free"
+            assert max(entry['placed']) < min(entry['unplaced']), f"{room_type}: a lower priority applicant was placed first"
+    return sum(len(entry['placed']) for entry in by_type.values())
+
+
+def main(n_applicants=50_000, n_rooms=3_000):
+    check_priorities()
+    check_small_case()
+    check_students()
+    app, db_path = make_app()
+    try:
+        with app.app_context():
+            seed(n_applicants, n_rooms, random.Random(0))
+            pending = db.session.execute(select(Application.id).where(Application.status == 'Pending')).scalars().all()
+            held_before = held_seats(['Room Booked'])
+
+            first, _ = run_allocation(dry_run=True)
+            second, _ = run_allocation(dry_run=True)
+            assert first == second, 'dry runs over the same data agree'
+
+            start = time.perf_counter()
+            placements, timings = run_allocation()
+            elapsed = time.perf_counter() - start
+            assert placements == first, 'the written run matches the dry run'
+            placed = check_result(pending, held_before)
+
+            seats = db.session.execute(select(func.sum(Room.total_rooms))).scalar()
+            print(f"{len(pending)} pending across {n_rooms} rooms ({seats} seats): {placed} placed in {elapsed:.2f}s "
+                  f"(load {timings['load']:.2f}s, allocate {timings['allocate']:.2f}s, write {timings['write']:.2f}s)")
+            assert run_allocation()[0] == {}, 'a second run has nothing left to do'
+    finally:
+        remove_db(db_path)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,136 @@
+"""Shared helpers for the benchmark scripts.
+
+Every benchmark runs against a throwaway SQLite file so the checked-in
+uwidormfinder.db is never touched.
+"""
+import os
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from config import Config
+
+# Option values posted by the book_room.html form
+LEVELS = ['undergraduate', 'postgraduate']
+PROGRAMS = ['bachelors', 'masters', 'Mphil', 'PhD']
+
+
+def bench_config(db_path, **overrides):
+    attrs = {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{db_path}",
+        'SQLALCHEMY_ECHO': False,
+        'TESTING': True,
+        # Benchmarks drive many requests from one address; the admission
+        # benchmark turns this back on
+        'ADMISSION_CONTROL_ENABLED': False,
+    }
+    attrs.update(overrides)
+    return type('BenchConfig', (Config,), attrs)
+
+
+def make_app(db_path=None, **overrides):
+    from app import create_app
+
+    if db_path is None:
+        fd, db_path = tempfile.mkstemp(suffix='.db', prefix='uwidorm-bench-')
+        os.close(fd)
+    app = create_app(bench_config(db_path, **overrides))
+    return app, db_path
+
+
+def remove_db(db_path):
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+
+@contextmanager
+def count_queries(engine):
+    counter = {'count': 0}
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        counter['count'] += 1
+
+    event.listen(engine, 'before_cursor_execute', _count)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', _count)
+
+
+def login_as(client, student_id, usertype='student'):
+    with client.session_transaction() as sess:
+        sess['student_id'] = student_id
+        sess['usertype'] = usertype
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def summarize(samples):
+    return {
+        'n': len(samples),
+        'mean_ms': statistics.fmean(samples) * 1000 if samples else 0.0,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p95_ms': percentile(samples, 95) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+    }
+
+
+def sample_room(**fields):
+    from app.models import Room
+
+    values = {
+        'building': 1,
+        'room_type': 'Single',
+        'floor_number': 1,
+        'description': 'Single room with a desk and wardrobe',
+        'total_rooms': 10,
+        'booked_rooms': 0,
+        'available_rooms': 10,
+        'image_url': 'images/singleroom-irvine.png',
+    }
+    values.update(fields)
+    return Room(**values)
+
+
+def application_row(student_id, room_id, **fields):
+    values = {
+        'student_id': str(student_id),
+        'first_name': 'Test',
+        'last_name': 'Student',
+        'email': f'{student_id}@mymona.uwi.edu',
+        'telephone': '8765550000',
+        'gender': 'Female',
+        'education_level': 'undergraduate',
+        'program_type': 'bachelors',
+        'reason_for_applying': 'Closer to campus',
+        'agreement': True,
+        'room_id': room_id,
+        'status': 'Pending',
+    }
+    values.update(fields)
+    return values
+
+
+def sample_application(student_id, room_id, **fields):
+    from app.models import Application
+
+    return Application(**application_row(student_id, room_id, **fields))
@@ -0,0 +1,38 @@
+"""Compare two benchmarks.journey reports route by route.
+
+    python -m benchmarks.compare base.json head.json
+"""
+import json
+import sys
+
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request')
+
+
+def _change(old, new):
+    if not old:
+        return '     n/a'
+    return f"{(new - old) / old * 100:+7.1f}%"
+
+
+def compare(base, head):
+    lines = [f"base {base['meta'].get('commit')}  head {head['meta'].get('commit')}"]
+    for route in sorted(set(base['routes']) | set(head['routes'])):
+        old, new = base['routes'].get(route), head['routes'].get(route)
+        if old is None or new is None:
+            lines.append(f"{route:20} only in {'head' if old is None else 'base'}")
+            continue
+        cells = [f"{name} {old[name]:.2f} -> {new[name]:.2f} ({_change(old[name], new[name]).strip()})" for name in METRICS]
+        lines.append(f"{route:20} " + '  '.join(cells))
+    return '\n'.join(lines)
+
+
+def main(base_path, head_path):
+    with open(base_path) as fh:
+        base = json.load(fh)
+    with open(head_path) as fh:
+        head = json.load(fh)
+    print(compare(base, head))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:3])
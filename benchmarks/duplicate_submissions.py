@@ -0,0 +1,156 @@
+"""The same application submitted from many threads at once.
+
+Every thread posts an identical submit_application form for one student
+and room, as a double click or several open tabs would. Exactly one
+application may be created and exactly one seat taken; the rest get the
+"already booked" error. Also runs the unique index migration
+(3e8a6d0f2c71) over a table with duplicates and checks the cleanup, and
+upgrades a copy of the shipped uwidormfinder.db: before the upgrade the
+app warns and still refuses a second submission, after it the index is
+there.
+
+    python -m benchmarks.duplicate_submissions [threads] [rounds]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from flask_migrate import stamp, upgrade
+from sqlalchemy import text
+
+from app import db
+from app.models import Application, Receipt, Room
+from benchmarks.common import application_row, login_as, make_app, remove_db, sample_room
+from benchmarks.journey import application_form
+from config import BASE_DIR
+
+MIGRATIONS = os.path.join(BASE_DIR, 'migrations')
+FIRST_STUDENT_ID = 620000000
+
+
+def race(app, room_id, sid, threads):
+    outcomes = {'booked': 0, 'duplicate': 0, 'other': 0}
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def worker():
+        client = app.test_client()
+        login_as(client, sid)
+        barrier.wait()
+        response = client.post('/submit_application', data=application_form(sid, room_id))
+        if response.status_code == 302:
+            outcome = 'booked'
+        elif 'already booked' in response.get_data(as_text=True):
+            outcome = 'duplicate'
+        else:
+            outcome = 'other'
+        with lock:
+            outcomes[outcome] += 1
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return outcomes
+
+
+def check_migration(app):
+    with app.app_context():
+        db.session.execute(text("DROP INDEX uq_applications_student_id_room_id"))
+        db.session.execute(text("CREATE INDEX ix_applications_student_id_room_id ON applications (student_id, room_id)"))
+        room = sample_room(total_rooms=10, booked_rooms=4, available_rooms=6)
+        db.session.add(room)
+        db.session.commit()
+        rows = [
+            application_row(FIRST_STUDENT_ID + 900, room.id, status='Pending'),
+            application_row(FIRST_STUDENT_ID + 900, room.id, status='Payment Under Review'),
+            application_row(FIRST_STUDENT_ID + 900, room.id, status='Withdrawn'),
+            application_row(FIRST_STUDENT_ID + 901, room.id, status='Rejected'),
+            application_row(FIRST_STUDENT_ID + 901, room.id, status='Pending'),
+            application_row(FIRST_STUDENT_ID + 902, room.id, status='Pending'),
+        ]
+        ids = [db.session.execute(Application.__table__.insert(), row).inserted_primary_key[0] for row in rows]
+        db.session.add(Receipt(application_id=ids[1], sha256='0' * 64, path='x', size=1))
+        db.session.commit()
+        room_id = room.id
+        db.session.remove()
+
+        stamp(directory=MIGRATIONS, revision='5b0c2e7a91d4')
+        upgrade(directory=MIGRATIONS, revision='3e8a6d0f2c71')
+
+        kept = sorted(db.session.execute(text("SELECT id FROM applications WHERE room_id = :room"), {'room': room_id}).scalars())
+        # The receipt holder, the one still holding a seat, and the lone application
+        assert kept == [ids[1], ids[4], ids[5]], kept
+        room = db.session.get(Room, room_id)
+        assert (room.booked_rooms, room.available_rooms) == (3, 7), (room.booked_rooms, room.available_rooms)
+        indexes = {row[1]: row[2] for row in db.session.execute(text("PRAGMA index_list(applications)"))}
+        assert indexes.get('uq_applications_student_id_room_id') == 1 and 'ix_applications_student_id_room_id' not in indexes
+
+
+def check_shipped_db():
+    fd, db_path = tempfile.mkstemp(suffix='.db', prefix='uwidorm-shipped-')
+    os.close(fd)
+    shutil.copyfile(os.path.join(BASE_DIR, 'uwidormfinder.db'), db_path)
+    try:
+        app, _ = make_app(db_path)
+        assert app.extensions['unique_applications'] is False, 'the shipped database predates the unique index'
+        with app.app_context():
+            room = sample_room()
+            db.session.add(room)
+            db.session.commit()
+            room_id = room.id
+        client = app.test_client()
+        login_as(client, FIRST_STUDENT_ID + 950)
+        for expected in (302, 200):
+            response = client.post('/submit_application', data=application_form(FIRST_STUDENT_ID + 950, room_id))
+            assert response.status_code == expected, response.status_code
+        assert 'already booked' in response.get_data(as_text=True)
+        with app.app_context():
+            assert Application.query.filter_by(room_id=room_id).count() == 1
+            upgrade(directory=MIGRATIONS)
+            assert db.session.execute(text("SELECT version_num FROM alembic_version")).scalar() == '4a9e2f7c1b63'
+        app, _ = make_app(db_path)
+        assert app.extensions['unique_applications'] is True
+    finally:
+        remove_db(db_path)
+
+
+def main(threads=16, rounds=20):
+    app, db_path = make_app()
+    try:
+        with app.app_context():
+            rooms = [sample_room(total_rooms=threads, booked_rooms=0, available_rooms=threads) for _ in range(rounds)]
+            db.session.add_all(rooms)
+            db.session.commit()
+            room_ids = [room.id for room in rooms]
+
+        totals = {'booked': 0, 'duplicate': 0, 'other': 0}
+        start = time.perf_counter()
+        for n, room_id in enumerate(room_ids):
+            outcomes = race(app, room_id, FIRST_STUDENT_ID + n, threads)
+            assert outcomes['booked'] == 1 and outcomes['other'] == 0, outcomes
+            for key, count in outcomes.items():
+                totals[key] += count
+        elapsed = time.perf_counter() - start
+
+        with app.app_context():
+            for n, room_id in enumerate(room_ids):
+                room = db.session.get(Room, room_id)
+                count = Application.query.filter_by(student_id=str(FIRST_STUDENT_ID + n), room_id=room_id).count()
+                assert count == 1 and room.booked_rooms == 1 and room.available_rooms == threads - 1, (count, room.booked_rooms)
+        print(f"threads={threads} rounds={rounds} outcomes={totals} {totals['booked'] + totals['duplicate']} submissions in {elapsed:.2f}s, duplicates=0")
+
+        check_migration(app)
+        print('migration 3e8a6d0f2c71 removed duplicates and gave their seats back')
+        check_shipped_db()
+        print('shipped database upgrades to head and gets the unique index')
+    finally:
+        remove_db(db_path)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,160 @@
+"""Application event log: what gets written, and the log at scale.
+
+Walks one application through submit, edit, receipt upload, withdrawal
+and an admin transition and checks the events each step wrote, including
+that a rolled back submission leaves none. Then fills the log with
+--events rows spread over two years and times the system_log tail (first
+and deep pages), the streaming export and batched retention pruning.
+
+    python -m benchmarks.event_log [events]
+"""
+import io
+import json
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select
+
+from app import db
+from app.events import EVENTS, prune
+from app.models import Application, ApplicationEvent
+from app.transitions import transition_applications
+from benchmarks.common import login_as, make_app, remove_db, sample_room, summarize, timed
+from benchmarks.journey import RECEIPT, application_form
+
+STUDENT_ID = 620000001
+
+
+def history(application_id):
+    return db.session.execute(
+        select(ApplicationEvent.kind, ApplicationEvent.old_status, ApplicationEvent.new_status)
+        .where(ApplicationEvent.application_id == application_id)
+        .order_by(ApplicationEvent.id)
+    ).all()
+
+
+def check_writes(app):
+    rooms = [sample_room(), sample_room()]
+    db.session.add_all(rooms)
+    db.session.commit()
+    client = app.test_client()
+    login_as(client, STUDENT_ID)
+
+    client.post('/submit_application', data=application_form(STUDENT_ID, rooms[0].id))
+    application_id = db.session.execute(select(Application.id).filter_by(room_id=rooms[0].id)).scalar()
+    before = db.session.execute(select(func.count()).select_from(EVENTS)).scalar()
+    client.post('/submit_application', data=application_form(STUDENT_ID, rooms[0].id))
+    assert db.session.execute(select(func.count()).select_from(EVENTS)).scalar() == before, 'a rolled back submission logs nothing'
+
+    client.post(f'/edit_application/{rooms[0].id}', data={'telephone': '8765551111', 'agreement': 'on'})
+    transition_applications([application_id], 'Application Approved')
+    client.post(f'/upload_receipt/{application_id}', data={'receipt': (io.BytesIO(RECEIPT), 'receipt.pdf')},
+                content_type='multipart/form-data')
+    client.post(f'/withdraw_application/{application_id}')
+    # Refused once withdrawn, and for other students' applications
+    client.post(f'/upload_receipt/{application_id}', data={'receipt': (io.BytesIO(RECEIPT), 'receipt.pdf')},
+                content_type='multipart/form-data')
+    login_as(client, STUDENT_ID + 1)
+    client.post(f'/upload_receipt/{application_id}', data={'receipt': (io.BytesIO(RECEIPT), 'receipt.pdf')},
+                content_type='multipart/form-data')
+    login_as(client, STUDENT_ID)
+
+    client.post('/submit_application', data=application_form(STUDENT_ID, rooms[1].id))
+    other = db.session.execute(select(Application.id).filter_by(room_id=rooms[1].id)).scalar()
+    transition_applications([other], 'Application Approved')
+
+    assert history(application_id) == [
+        ('created', None, 'Pending'),
+        ('edit', None, 'Pending'),
+        ('status', 'Pending', 'Application Approved'),
+        ('status', 'Application Approved', 'Payment Under Review'),
+        ('upload', None, None),
+        ('status', 'Payment Under Review', 'Withdrawn'),
+    ], history(application_id)
+    assert history(other) == [('created', None, 'Pending'), ('status', 'Pending', 'Application Approved')]
+    assert db.session.execute(
+        select(ApplicationEvent.actor).where(ApplicationEvent.application_id == application_id).limit(1)
+    ).scalar() == str(STUDENT_ID)
+
+    login_as(client, 1, usertype='admin')
+    body = client.get(f'/system_log?application_id={application_id}').get_data(as_text=True)
+    assert 'Payment Under Review &rarr; Withdrawn' in body, body
+
+
+def seed(n_events, rnd):
+    now = datetime.utcnow()
+    kinds = ['created', 'status', 'status', 'edit', 'upload']
+    chunk = []
+    for n in range(n_events):
+        # Oldest first, as an append-only log would be
+        ts = now - timedelta(days=730 * (n_events - n) / n_events)
+        chunk.append({'application_id': rnd.randint(1, n_events // 5), 'ts': ts, 'kind': rnd.choice(kinds),
+                      'old_status': 'Pending', 'new_status': 'Application Approved', 'actor': None, 'detail': None})
+        if len(chunk) == 10_000:
+            db.session.execute(insert(EVENTS), chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(insert(EVENTS), chunk)
+    db.session.commit()
+    return now
+
+
+def main(n_events=200_000):
+    storage = tempfile.mkdtemp(prefix='uwidorm-receipts-')
+    app, db_path = make_app(RECEIPT_STORAGE_DIR=storage, PAGE_SIZE=50)
+    try:
+        with app.app_context():
+            check_writes(app)
+            now = seed(n_events, random.Random(0))
+            total = db.session.execute(select(func.count()).select_from(EVENTS)).scalar()
+
+            client = app.test_client()
+            login_as(client, 1, usertype='admin')
+            first = summarize(timed(lambda: client.get('/system_log'), 50))
+            cursor = None
+            for _ in range(200):
+                response = client.get('/system_log', query_string={'cursor': cursor} if cursor else {})
+                body = response.get_data(as_text=True)
+                cursor = body.split('cursor=')[1].split('"')[0] if 'cursor=' in body else None
+            deep = summarize(timed(lambda: client.get('/system_log', query_string={'cursor': cursor}), 50))
+            print(f"system_log tail  page 1 p50 {first['p50_ms']:.2f}ms  page 200 p50 {deep['p50_ms']:.2f}ms  ({total} events)")
+
+            start = time.perf_counter()
+            response = client.get('/system_log/export')
+            assert response.is_streamed
+            first_chunk = None
+            lines = 0
+            for chunk in response.response:
+                if first_chunk is None:
+                    first_chunk = time.perf_counter() - start
+                lines += chunk.count(b'\n') if isinstance(chunk, bytes) else chunk.count('\n')
+            elapsed = time.perf_counter() - start
+            assert lines == total, (lines, total)
+            print(f"export {lines} rows as JSON Lines: first chunk {first_chunk * 1000:.1f}ms, all {elapsed:.2f}s")
+            csv_lines = sum(chunk.count('\n') if isinstance(chunk, str) else chunk.count(b'\n')
+                            for chunk in client.get('/system_log/export?format=csv').response)
+            assert csv_lines == total + 1
+            assert json.loads(client.get('/system_log/export?application_id=1').get_data(as_text=True).splitlines()[0])['application_id'] == 1
+
+            cutoff = now - timedelta(days=365)
+            expected = db.session.execute(select(func.count()).where(EVENTS.c.ts < cutoff)).scalar()
+            start = time.perf_counter()
+            deleted = prune(cutoff, batch_size=5000)
+            elapsed = time.perf_counter() - start
+            assert deleted == expected and db.session.execute(select(func.count()).where(EVENTS.c.ts < cutoff)).scalar() == 0
+            print(f"pruned {deleted} events older than 365 days in {elapsed:.2f}s "
+                  f"({-(-deleted // 5000)} batches, {elapsed / max(1, -(-deleted // 5000)) * 1000:.1f}ms each)")
+
+            login_as(client, STUDENT_ID)
+            assert client.get('/system_log/export').status_code == 403
+    finally:
+        remove_db(db_path)
+        shutil.rmtree(storage)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,96 @@
+"""Room card fragment cache: a 500-room result page rendered cold and warm.
+
+Also checks that cached cards follow ORM edits, bulk updates and seat
+bookings, and that the cache stays under its size cap.
+
+    python -m benchmarks.fragment_cache [rooms] [repeat]
+"""
+import sys
+
+from flask import render_template
+from sqlalchemy import update
+
+from app import db
+from app.fragments import FragmentCache, get_fragments
+from app.inventory import get_inventory
+from app.models import Room
+from app.reservations import take_seat
+from benchmarks.common import login_as, make_app, remove_db, sample_room, summarize, timed
+
+
+def seed(n_rooms):
+    db.session.add_all(
+        sample_room(building=1 + i % 4, floor_number=1 + i % 6, description=f"Room {i}: " + 'Bright corner room. ' * 8)
+        for i in range(n_rooms)
+    )
+    db.session.commit()
+
+
+def page(app, rooms):
+    with app.test_request_context('/room_search', method='POST'):
+        return render_template('room_search.html', rooms=rooms, filters={}, next_cursor=None)
+
+
+def check_invalidation(app, client):
+    fragments = get_fragments()
+    room = Room.query.order_by(Room.building, Room.floor_number, Room.id).first()
+
+    def html():
+        return client.post('/room_search', data={}).get_data(as_text=True)
+
+    html()
+    room.description = 'Freshly painted'
+    db.session.commit()
+    assert 'Freshly painted' in html(), 'ORM edits bump the room version'
+
+    cached, misses = fragments.stats['entries'], fragments.stats['misses']
+    take_seat(room.id)
+    db.session.commit()
+    available = db.session.get(Room, room.id).available_rooms
+    body = html()
+    assert fragments.stats['entries'] == cached + 1, 'seat bookings keep the other cached cards'
+    assert fragments.stats['misses'] == misses + 1, 'only the booked card is rendered again'
+    assert f"Available: {available}" in body
+
+    db.session.execute(update(Room).where(Room.id == room.id).values(description='Bulk edited'))
+    db.session.commit()
+    assert fragments.stats['entries'] == 0, 'bulk room writes drop the cache'
+    assert 'Bulk edited' in html()
+
+
+def main(n_rooms=500, repeat=30):
+    app, db_path = make_app(PAGE_SIZE=n_rooms, FRAGMENT_CACHE_MAX_BYTES=2 * 1024 * 1024)
+    try:
+        with app.app_context():
+            seed(n_rooms)
+            client = app.test_client()
+            login_as(client, 620000001)
+            check_invalidation(app, client)
+
+            rooms = get_inventory().search()[:n_rooms]
+            fragments = get_fragments()
+            fragments.clear()
+            cold_html = page(app, rooms)
+            assert page(app, rooms) == cold_html, 'cached cards render identically'
+
+            cold = summarize(timed(lambda: (fragments.clear(), page(app, rooms)), repeat))
+            warm = summarize(timed(lambda: page(app, rooms), repeat))
+            print(f"render {n_rooms} cards  cold p50 {cold['p50_ms']:6.2f}ms  warm p50 {warm['p50_ms']:6.2f}ms  ({cold['p50_ms'] / warm['p50_ms']:.1f}x)")
+
+            fragments.clear()
+            cold = summarize(timed(lambda: (fragments.clear(), client.post('/room_search', data={})), repeat))
+            warm = summarize(timed(lambda: client.post('/room_search', data={}), repeat))
+            print(f"POST /room_search      cold p50 {cold['p50_ms']:6.2f}ms  warm p50 {warm['p50_ms']:6.2f}ms")
+            stats = fragments.stats
+            print(f"cache: {stats['entries']} entries, {stats['size'] / 1024:.0f} KiB")
+
+            capped = FragmentCache(max_entries=5000, max_bytes=64 * 1024)
+            for room in rooms:
+                capped.render(('card', room.id), lambda: 'x' * 1000)
+            assert capped.stats['size'] <= 64 * 1024 and capped.stats['entries'] < len(rooms)
+    finally:
+        remove_db(db_path)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,190 @@
+"""The student journey, end to end, with per-route latency and query counts.
+
+Seeds a database with benchmarks.seed, then walks --students fresh
+students through login -> room_search -> book_room -> submit_application
+-> track_application -> upload_receipt with the Flask test client, with an
+admin approving each application before its receipt is uploaded. Writes
+one JSON document (stdout, or --output) so runs can be compared across
+commits with benchmarks.compare. Per-route throughput is requests divided
+by the time spent in that route, i.e. what one client sees serially.
+
+    python -m benchmarks.journey --students 200 --users 10000 --rooms 1000 --applications 50000 --output run.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+import sqlalchemy
+from sqlalchemy import event, select
+from werkzeug.security import generate_password_hash
+
+from app import db
+from app.models import Application, Room, User
+from app.transitions import transition_applications
+from benchmarks.common import make_app, remove_db, summarize
+from benchmarks.seed import BENCH_PASSWORD, seed_database, student_id, user_rows
+
+RECEIPT = b'%PDF-1.4\n' + b'0' * 50_000
+
+
+class Recorder:
+    # Latency, query count and status code per route name
+    def __init__(self, engine):
+        self.samples = defaultdict(list)
+        self.queries = defaultdict(int)
+        self.statuses = defaultdict(Counter)
+        self._count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_query)
+
+    def _on_query(self, *args):
+        self._count += 1
+
+    def call(self, route, fn, *args, **kwargs):
+        self._count = 0
+        start = time.perf_counter()
+        response = fn(*args, **kwargs)
+        self.samples[route].append(time.perf_counter() - start)
+        self.queries[route] += self._count
+        self.statuses[route][str(response.status_code)] += 1
+        return response
+
+    def report(self):
+        routes = {}
+        for route, samples in self.samples.items():
+            stats = summarize(samples)
+            stats['throughput_rps'] = len(samples) / sum(samples) if samples else 0.0
+            stats['queries_per_request'] = self.queries[route] / len(samples)
+            stats['statuses'] = dict(self.statuses[route])
+            routes[route] = stats
+        return routes
+
+
+def application_form(sid, room_id):
+    return {
+        'room_id': room_id, 'student_id': sid, 'first_name': 'Bench', 'last_name': 'Student',
+        'email': f"{sid}@mymona.uwi.edu", 'telephone': '8765550000', 'gender': 'Female',
+        'education_level': 'undergraduate', 'programType': 'bachelors',
+        'reason_for_applying': 'Closer to classes', 'agreement': 'on',
+    }
+
+
+def journey(app, client, recorder, sid, rnd, room_ids):
+    recorder.call('login', client.post, '/login', data={'userID': sid, 'password': BENCH_PASSWORD})
+    filters = rnd.choice([{}, {'room_type': 'Single'}, {'room_type': 'Double', 'availability': 'now'}, {'dormitory': str(rnd.randint(1, 10))}])
+    recorder.call('room_search', client.post, '/room_search', data=filters)
+    room_id = rnd.choice(room_ids)
+    recorder.call('book_room', client.get, f'/book_room/{room_id}/book')
+    recorder.call('submit_application', client.post, '/submit_application', data=application_form(sid, room_id))
+    recorder.call('track_application', client.get, '/track_application')
+    with app.app_context():
+        application_id = db.session.execute(
+            select(Application.id).filter_by(student_id=str(sid), room_id=room_id)
+        ).scalar()
+    if application_id is None:
+        # The room filled up, submit_application re-rendered the form
+        return False
+    with app.app_context():
+        # An admin approves it; receipts are only accepted after that
+        transition_applications([application_id], 'Application Approved')
+    recorder.call('upload_receipt', client.post, f'/upload_receipt/{application_id}', data={
+        'receipt': (io.BytesIO(RECEIPT), 'receipt.pdf'),
+    }, content_type='multipart/form-data')
+    client.get('/logout')
+    return True
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(students, users, rooms, applications, seed, hash_method, **overrides):
+    storage = tempfile.mkdtemp(prefix='uwidorm-receipts-')
+    # create_app prints the database URI, keep stdout for the report
+    with contextlib.redirect_stdout(sys.stderr):
+        app, db_path = make_app(RECEIPT_STORAGE_DIR=storage, PASSWORD_HASH_METHOD=hash_method, **overrides)
+    try:
+        with app.app_context():
+            start = time.perf_counter()
+            seed_database(users, rooms, applications, seed, hash_method)
+            seed_seconds = time.perf_counter() - start
+            # Journey students are new users without applications
+            password_hash = generate_password_hash(BENCH_PASSWORD, method=hash_method)
+            db.session.execute(User.__table__.insert(), list(user_rows(students, random.Random(seed), password_hash, start=users)))
+            db.session.commit()
+            room_ids = db.session.execute(select(Room.id).where(Room.available_rooms > 0)).scalars().all()
+            engine = db.engine
+
+        client = app.test_client()
+        # Starts the password hashing pool outside the measurements
+        client.post('/login', data={'userID': student_id(users), 'password': BENCH_PASSWORD})
+        client.get('/logout')
+        recorder = Recorder(engine)
+        rnd = random.Random(seed)
+        completed = 0
+        start = time.perf_counter()
+        for index in range(users, users + students):
+            completed += journey(app, client, recorder, student_id(index), rnd, room_ids)
+        elapsed = time.perf_counter() - start
+
+        return {
+            'meta': {
+                'commit': git_commit(),
+                'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'sqlalchemy': sqlalchemy.__version__,
+                'database': engine.dialect.name,
+                'scale': {'users': users, 'rooms': rooms, 'applications': applications, 'seed': seed},
+                'password_hash_method': hash_method,
+                'seed_seconds': round(seed_seconds, 3),
+            },
+            'journeys': {
+                'students': students,
+                'completed': completed,
+                'elapsed_s': elapsed,
+                'journeys_per_s': students / elapsed if elapsed else 0.0,
+            },
+            'routes': recorder.report(),
+        }
+    finally:
+        remove_db(db_path)
+        shutil.rmtree(storage)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--students', type=int, default=100)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--rooms', type=int, default=200)
+    parser.add_argument('--applications', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--hash-method', default='pbkdf2:sha256:1000',
+                        help='Password hash for seeded users; the production cost dominates login otherwise.')
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout.')
+    args = parser.parse_args()
+
+    report = run(args.students, args.users, args.rooms, args.applications, args.seed, args.hash_method)
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as fh:
+            fh.write(text + '\n')
+        for route, stats in report['routes'].items():
+            print(f"{route:20} p50 {stats['p50_ms']:7.2f}ms  p95 {stats['p95_ms']:7.2f}ms  p99 {stats['p99_ms']:7.2f}ms  {stats['queries_per_request']:5.2f} queries", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Page latency by depth: keyset cursors against LIMIT/OFFSET.
+
+    python -m benchmarks.keyset_pages [rooms] [page_size]
+"""
+import random
+import sys
+import time
+
+from app import db
+from app.inventory import room_sort_key
+from app.models import Room
+from app.pagination import encode_cursor, paginate_query
+from app.routes import ROOM_PAGE_KEYS
+from benchmarks.common import make_app, remove_db
+
+
+def seed(n_rooms):
+    rnd = random.Random(9)
+    db.session.execute(Room.__table__.insert(), [
+        {
+            'building': rnd.randint(1, 40), 'room_type': rnd.choice(['Single', 'Double']), 'floor_number': rnd.randint(1, 12),
+            'description': 'Synthetic room', 'total_rooms': 2, 'booked_rooms': 0, 'available_rooms': 2,
+            'image_url': 'images/singleroom-irvine.png',
+        }
+        for _ in range(n_rooms)
+    ])
+    db.session.commit()
+
+
+def time_page(fn, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+        db.session.expunge_all()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main(n_rooms=50_000, page_size=20):
+    app, db_path = make_app()
+    try:
+        with app.app_context():
+            seed(n_rooms)
+            ordered = Room.query.filter_by(room_type='Single').order_by(*ROOM_PAGE_KEYS)
+            total = ordered.count()
+            for depth in (0, total // 10, total // 2, total - page_size):
+                cursor = None
+                if depth:
+                    cursor = encode_cursor(room_sort_key(ordered.offset(depth - 1).first()))
+                keyset = time_page(lambda: paginate_query(Room.query.filter_by(room_type='Single'), ROOM_PAGE_KEYS, room_sort_key, cursor, page_size))
+                offset = time_page(lambda: ordered.offset(depth).limit(page_size).all())
+                print(f"row {depth:6}: keyset {keyset:6.2f}ms  offset {offset:6.2f}ms")
+    finally:
+        remove_db(db_path)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,175 @@
+"""Keyword room search: FTS5 with BM25 ranking against a LIKE scan.
+
+Seeds --rooms rooms with synthetic descriptions, checks that the index
+finds the same rooms as LIKE '%term%', follows inserts, description
+updates and deletes through its triggers, and that room_search pages
+through ranked results with the structured filters applied. Then times
+the first page of search_rooms for a set of queries with FTS5 and with
+the LIKE fallback (which stops early on common words because it does not
+rank), and finding every match both ways. Finally rebuilds the index
+through its migration.
+
+    python -m benchmarks.keyword_search [rooms]
+"""
+import os
+import random
+import sys
+
+from flask import current_app
+from flask_migrate import stamp, upgrade
+from sqlalchemy import func, select, text, update
+
+from app import db
+from app.fulltext import FTS_TABLE, like_matches
+from app.models import Room
+from app.routes import room_filters, search_rooms
+from benchmarks.common import login_as, make_app, remove_db, sample_room, summarize, timed
+from config import BASE_DIR
+
+MIGRATIONS = os.path.join(BASE_DIR, 'migrations')
+# No word is a substring of another, so LIKE and the index agree
+WORDS = [
+    'quiet', 'sunny', 'balcony', 'wardrobe', 'desk', 'kitchenette', 'ensuite', 'shower', 'garden', 'courtyard',
+    'library', 'gym', 'laundry', 'spacious', 'cosy', 'renovated', 'airy', 'lounge', 'study', 'view',
+    'corner', 'parking', 'breezy', 'modern', 'carpet', 'tiled', 'fan', 'mirror', 'shelves', 'lockers',
+]
+RARE_WORDS = ['rooftop', 'piano', 'hammock']
+QUERIES = [
+    ('common word', {'keywords': 'desk'}),
+    ('rare word', {'keywords': 'rooftop'}),
+    ('two words', {'keywords': 'quiet balcony'}),
+    ('word + filters', {'keywords': 'garden', 'room_type': 'Double', 'dormitory': '2'}),
+    ('rare + filters', {'keywords': 'piano', 'dormitory': '3', 'availability': 'now'}),
+]
+
+
+def description(rnd):
+    words = rnd.sample(WORDS, 6)
+    if rnd.random() < 0.002:
+        words.append(rnd.choice(RARE_WORDS))
+    return ' '.join(words).capitalize() + '.'
+
+
+def seed(n_rooms, rnd):
+    rows = []
+    for _ in range(n_rooms):
+        rows.append({
+            'building': rnd.randint(1, 4), 'room_type': rnd.choice(['Single', 'Double']),
+            'floor_number': rnd.randint(1, 6), 'description': description(rnd),
+            'total_rooms': 4, 'booked_rooms': 0, 'available_rooms': rnd.randint(0, 4),
+            'image_url': 'images/singleroom-irvine.png',
+        })
+    for start in range(0, n_rooms, 10_000):
+        db.session.execute(Room.__table__.insert(), rows[start:start + 10_000])
+    db.session.commit()
+
+
+def fts_ids(keywords):
+    return set(db.session.execute(
+        text(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match"), {'match': keywords}
+    ).scalars())
+
+
+def like_ids(keywords):
+    return {row.id for row in like_matches(Room.query.with_entities(Room.id), keywords)}
+
+
+def all_pages(criteria):
+    rooms, cursor = search_rooms(criteria, None, 50)
+    while cursor:
+        page, cursor = search_rooms(criteria, cursor, 50)
+        rooms.extend(page)
+    return rooms
+
+
+def check_search(app):
+    for word in ['desk', 'rooftop', 'quiet']:
+        assert fts_ids(word) == like_ids(word), word
+
+    criteria = room_filters({'keywords': 'garden', 'room_type': 'Double', 'dormitory': '2', 'availability': 'now'})
+    rooms = all_pages(criteria)
+    expected = like_ids('garden') & {
+        room.id for room in Room.query.filter_by(room_type='Double', building=2).filter(Room.available_rooms > 0)
+    }
+    assert expected and {room.id for room in rooms} == expected
+    assert len(rooms) == len(expected), 'pages neither skip nor repeat rooms'
+    rank_of = dict(db.session.execute(text(
+        f"SELECT rowid, bm25({FTS_TABLE}) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH 'garden'"
+    )).all())
+    assert [rank_of[room.id] for room in rooms] == sorted(rank_of[room.id] for room in rooms), 'best matches first'
+
+    # Operators in user input are plain words: no room says "or" or "near"
+    assert all_pages(room_filters({'keywords': 'desk OR "NEAR(*'})) == []
+
+    # The seed may have no rooftop room in building 1, so add one
+    db.session.add(sample_room(building=1, description='Rooftop terrace with a desk'))
+    db.session.commit()
+    client = app.test_client()
+    login_as(client, 620000001)
+    body = client.post('/room_search', data={'keywords': 'rooftop', 'dormitory': '1'}).get_data(as_text=True)
+    assert 'Rooftop terrace with a desk' in body, 'results for the keyword are shown'
+
+    # Triggers follow inserts, description updates and deletes
+    room = sample_room(description='Has a trampoline')
+    db.session.add(room)
+    db.session.commit()
+    assert fts_ids('trampoline') == {room.id}
+    db.session.execute(update(Room).where(Room.id == room.id).values(description='Has a sauna'))
+    db.session.commit()
+    assert fts_ids('trampoline') == set() and fts_ids('sauna') == {room.id}
+    db.session.execute(update(Room).where(Room.id == room.id).values(available_rooms=0))
+    db.session.commit()
+    assert fts_ids('sauna') == {room.id}
+    db.session.delete(room)
+    db.session.commit()
+    assert fts_ids('sauna') == set()
+
+
+def measure(label, values):
+    criteria = room_filters(values)
+    current_app.extensions['room_fulltext'] = True
+    fts = summarize(timed(lambda: search_rooms(criteria, None, 20), 30))
+    current_app.extensions['room_fulltext'] = False
+    like = summarize(timed(lambda: search_rooms(criteria, None, 20), 10))
+    current_app.extensions['room_fulltext'] = None
+    # Every match, which is what ranking needs: LIKE has to read every description
+    words = ' '.join(criteria['keywords'].split())
+    matched = len(fts_ids(words))
+    fts_all = summarize(timed(lambda: fts_ids(words), 10))
+    like_all = summarize(timed(lambda: like_ids(words), 5))
+    print(f"{label:<16} first page: FTS5 + bm25 p50 {fts['p50_ms']:7.2f}ms  LIKE (unranked) p50 {like['p50_ms']:7.2f}ms"
+          f"   all {matched:>6} matches: FTS5 {fts_all['p50_ms']:7.2f}ms  LIKE {like_all['p50_ms']:7.2f}ms")
+
+
+def check_migration(app):
+    with app.app_context():
+        before = fts_ids('balcony')
+        for statement in ('DROP TRIGGER rooms_fts_ai', 'DROP TRIGGER rooms_fts_ad', 'DROP TRIGGER rooms_fts_au',
+                          f'DROP TABLE {FTS_TABLE}'):
+            db.session.execute(text(statement))
+        db.session.commit()
+        db.session.remove()
+        stamp(directory=MIGRATIONS, revision='e71b3c9d5a24')
+        upgrade(directory=MIGRATIONS, revision='4a9e2f7c1b63')
+        assert fts_ids('balcony') == before
+        triggers = set(db.session.execute(text("SELECT name FROM sqlite_master WHERE type = 'trigger'")).scalars())
+        assert {'rooms_fts_ai', 'rooms_fts_ad', 'rooms_fts_au'} <= triggers
+
+
+def main(n_rooms=50_000):
+    app, db_path = make_app(ROOM_INVENTORY_INDEX=True)
+    try:
+        with app.app_context():
+            seed(n_rooms, random.Random(5))
+            total = db.session.execute(select(func.count()).select_from(Room)).scalar()
+            check_search(app)
+            print(f"{total} rooms")
+            for label, values in QUERIES:
+                measure(label, values)
+        check_migration(app)
+    finally:
+        remove_db(db_path)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
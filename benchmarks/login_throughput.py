@@ -0,0 +1,99 @@
+"""Login throughput and tail latency per password hashing pool size.
+
+Concurrent client threads log in through the Flask test client while
+PASSWORD_HASH_WORKERS varies (0 hashes inline on the request thread).
+Also checks that a stored hash with an old cost is upgraded on login, and
+that a hash slower than PASSWORD_HASH_TIMEOUT answers 503 while still
+holding its queue slot.
+
+    python -m benchmarks.login_throughput [logins] [client_threads] [iterations]
+"""
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash
+
+from app import db
+from app.models import User
+from benchmarks.common import make_app, remove_db, summarize
+
+PASSWORD = 'correct horse battery staple'
+USERS = 50
+
+
+def seed(app, method):
+    pwhash = generate_password_hash(PASSWORD, method)
+    with app.app_context():
+        db.session.add_all(
+            User(user_id=620000000 + i, fname='Test', lname='Student', email=f'{i}@mymona.uwi.edu', usertype='student', password=pwhash)
+            for i in range(USERS)
+        )
+        # One user still on an older, cheaper cost
+        db.session.add(User(user_id=1, fname='Old', lname='Hash', email='old@mymona.uwi.edu', usertype='student', password=generate_password_hash(PASSWORD, 'pbkdf2:sha256:1000')))
+        db.session.commit()
+
+
+def check_rehash(app, method):
+    client = app.test_client()
+    response = client.post('/login', data={'userID': '1', 'password': PASSWORD})
+    assert response.status_code == 302
+    with app.app_context():
+        assert User.query.filter_by(user_id=1).first().password.startswith(method + '$')
+
+
+def check_timeout():
+    method = 'pbkdf2:sha256:2000000'
+    app, db_path = make_app(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_MAX_PENDING=1, PASSWORD_HASH_TIMEOUT=0.05,
+                            PASSWORD_HASH_METHOD=method)
+    try:
+        seed(app, method)
+        client = app.test_client()
+        response = client.post('/login', data={'userID': '620000000', 'password': PASSWORD})
+        assert response.status_code == 503, response.status_code
+        hasher = app.extensions['password_hasher']
+        assert not hasher._pending.acquire(blocking=False), 'the abandoned job keeps its slot'
+        assert client.post('/login', data={'userID': '620000000', 'password': PASSWORD}).status_code == 503
+        hasher.shutdown()
+    finally:
+        remove_db(db_path)
+
+
+def run(workers, n_logins, n_threads, method):
+    app, db_path = make_app(PASSWORD_HASH_WORKERS=workers, PASSWORD_HASH_METHOD=method)
+    try:
+        seed(app, method)
+        local = threading.local()
+
+        def login(i):
+            if not hasattr(local, 'client'):
+                local.client = app.test_client()
+            start = time.perf_counter()
+            response = local.client.post('/login', data={'userID': str(620000000 + i % USERS), 'password': PASSWORD})
+            assert response.status_code == 302, response.status_code
+            return time.perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=n_threads) as clients:
+            list(clients.map(login, range(n_threads)))  # warm up the process pool
+            start = time.perf_counter()
+            samples = list(clients.map(login, range(n_logins)))
+            elapsed = time.perf_counter() - start
+
+        check_rehash(app, method)
+        stats = summarize(samples)
+        print(
+            f"hash_workers={workers} clients={n_threads} logins/s={n_logins / elapsed:7.1f} "
+            f"p50={stats['p50_ms']:.1f}ms p95={stats['p95_ms']:.1f}ms p99={stats['p99_ms']:.1f}ms"
+        )
+        app.extensions['password_hasher'].shutdown()
+    finally:
+        remove_db(db_path)
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:4]]
+    n_logins, n_threads, iterations = args + [200, 8, 200_000][len(args):]
+    check_timeout()
+    for workers in (0, 1, 2, 4):
+        run(workers, n_logins, n_threads, f'pbkdf2:sha256:{iterations}')
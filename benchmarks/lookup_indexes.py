@@ -0,0 +1,104 @@
+"""Before/after numbers for the lookup index migration (f7436d0620e1).
+
+Seeds ~100k applications and a few thousand rooms without the new
+indexes, runs the hot lookups, applies the migration through Flask-Migrate
+and runs them again. Prints EXPLAIN QUERY PLAN and p50/p99 latency.
+
+    python -m benchmarks.lookup_indexes [applications] [rooms]
+"""
+import os
+import random
+import sys
+
+from flask_migrate import stamp, upgrade
+from sqlalchemy import text
+
+from app import db
+from app.models import Application, Room
+from benchmarks.common import make_app, remove_db, summarize, timed
+from config import BASE_DIR
+
+MIGRATIONS = os.path.join(BASE_DIR, 'migrations')
+NEW_INDEXES = ['ix_applications_student_id_room_id', 'ix_rooms_type_building_floor', 'ix_rooms_building_floor']
+# create_all builds the current schema; later indexes go too so the seed can hold duplicates
+LATER_INDEXES = ['uq_applications_student_id_room_id']
+
+QUERIES = {
+    'applications by student': (
+        "SELECT * FROM applications WHERE student_id = :student_id",
+        lambda rnd, n_students, n_rooms: {'student_id': str(620000000 + rnd.randrange(n_students))},
+    ),
+    'application by student and room': (
+        "SELECT * FROM applications WHERE student_id = :student_id AND room_id = :room_id LIMIT 1",
+        lambda rnd, n_students, n_rooms: {'student_id': str(620000000 + rnd.randrange(n_students)), 'room_id': rnd.randrange(1, n_rooms + 1)},
+    ),
+    'room search (all filters)': (
+        "SELECT * FROM rooms WHERE room_type = :room_type AND building = :building AND floor_number = :floor AND available_rooms > 0",
+        lambda rnd, n_students, n_rooms: {'room_type': rnd.choice(['Single', 'Double']), 'building': rnd.randint(1, 4), 'floor': rnd.randint(1, 6)},
+    ),
+    'room search (building, floor)': (
+        "SELECT * FROM rooms WHERE building = :building AND floor_number = :floor",
+        lambda rnd, n_students, n_rooms: {'building': rnd.randint(1, 4), 'floor': rnd.randint(1, 6)},
+    ),
+}
+
+
+def seed(n_applications, n_rooms):
+    rnd = random.Random(42)
+    n_students = n_applications // 3
+    rooms = [
+        {
+            'building': rnd.randint(1, 4), 'room_type': rnd.choice(['Single', 'Double']),
+            'floor_number': rnd.randint(1, 6), 'description': 'Synthetic room',
+            'total_rooms': 4, 'booked_rooms': 0, 'available_rooms': rnd.randint(0, 4),
+            'image_url': 'images/singleroom-irvine.png',
+        }
+        for _ in range(n_rooms)
+    ]
+    db.session.execute(Room.__table__.insert(), rooms)
+    applications = [
+        {
+            'student_id': str(620000000 + rnd.randrange(n_students)), 'first_name': 'Test', 'last_name': 'Student',
+            'email': 'student@mymona.uwi.edu', 'telephone': '8765550000', 'gender': 'Male',
+            'education_level': 'undergraduate', 'program_type': 'bachelors', 'reason_for_applying': 'Synthetic',
+            'agreement': True, 'room_id': rnd.randrange(1, n_rooms + 1), 'status': 'Pending',
+        }
+        for _ in range(n_applications)
+    ]
+    db.session.execute(Application.__table__.insert(), applications)
+    db.session.commit()
+    return n_students
+
+
+def measure(label, n_students, n_rooms, repeat=500):
+    print(f"\n== {label} ==")
+    connection = db.session.connection()
+    for name, (sql, make_params) in QUERIES.items():
+        rnd = random.Random(7)
+        plan = connection.execute(text(f"EXPLAIN QUERY PLAN {sql}"), make_params(rnd, n_students, n_rooms)).fetchall()
+        stats = summarize(timed(lambda: connection.execute(text(sql), make_params(rnd, n_students, n_rooms)).fetchall(), repeat))
+        print(f"{name}: p50={stats['p50_ms']:.3f}ms p99={stats['p99_ms']:.3f}ms")
+        for row in plan:
+            print(f"    {row[-1]}")
+
+
+def main(n_applications=100_000, n_rooms=3_000):
+    app, db_path = make_app()
+    try:
+        with app.app_context():
+            for name in NEW_INDEXES + LATER_INDEXES:
+                db.session.execute(text(f"DROP INDEX IF EXISTS {name}"))
+            db.session.commit()
+            stamp(directory=MIGRATIONS, revision='7d961e4b544c')
+            n_students = seed(n_applications, n_rooms)
+            measure('before migration', n_students, n_rooms)
+            db.session.remove()
+            upgrade(directory=MIGRATIONS, revision='f7436d0620e1')
+            db.session.execute(text("ANALYZE"))
+            measure('after migration', n_students, n_rooms)
+    finally:
+        remove_db(db_path)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,94 @@
+"""Mixed read/write load with and without the SQLite engine profile.
+
+Reader threads run the per-student application lookup while writer
+threads insert applications and commit, all against one database file.
+Writers do not retry, so every "database is locked" error is counted.
+
+    python -m benchmarks.mixed_load [seconds] [readers] [writers]
+"""
+import itertools
+import random
+import sys
+import threading
+import time
+
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from app.models import Application
+from benchmarks.common import make_app, remove_db, sample_application, sample_room
+
+PROFILES = {
+    'defaults': {'SQLITE_PRAGMAS': {}},
+    'tuned': {},
+}
+
+
+def run(name, overrides, seconds, readers, writers):
+    app, db_path = make_app(**overrides)
+    try:
+        with app.app_context():
+            # Ten applications per student, one per room, as the unique
+            # (student_id, room_id) index allows
+            rooms = [sample_room(total_rooms=10_000, available_rooms=10_000) for _ in range(10)]
+            db.session.add_all(rooms)
+            db.session.flush()
+            db.session.add_all(sample_application(620000000 + n % 500, rooms[n // 500].id) for n in range(5000))
+            db.session.commit()
+            room_id = rooms[0].id
+
+        # Writers apply as new students so their inserts never collide
+        new_students = itertools.count(630000000)
+
+        counts = {'reads': 0, 'writes': 0, 'locked': 0}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + seconds
+
+        def reader():
+            rnd = random.Random()
+            done = 0
+            with app.app_context():
+                while time.perf_counter() < deadline:
+                    Application.query.filter_by(student_id=str(620000000 + rnd.randrange(500))).all()
+                    db.session.rollback()
+                    done += 1
+            with lock:
+                counts['reads'] += done
+
+        def writer():
+            done = locked = 0
+            with app.app_context():
+                while time.perf_counter() < deadline:
+                    try:
+                        db.session.add(sample_application(next(new_students), room_id))
+                        db.session.commit()
+                        done += 1
+                    except OperationalError:
+                        db.session.rollback()
+                        locked += 1
+            with lock:
+                counts['writes'] += done
+                counts['locked'] += locked
+
+        threads = [threading.Thread(target=reader) for _ in range(readers)]
+        threads += [threading.Thread(target=writer) for _ in range(writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        with app.app_context():
+            journal_mode = db.session.execute(db.text('PRAGMA journal_mode')).scalar()
+        print(
+            f"{name:8} journal={journal_mode:6} reads/s={counts['reads'] / seconds:8.1f} "
+            f"writes/s={counts['writes'] / seconds:7.1f} locked_errors={counts['locked']}"
+        )
+    finally:
+        remove_db(db_path)
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:4]]
+    seconds, readers, writers = args + [5, 8, 4][len(args):]
+    for name, overrides in PROFILES.items():
+        run(name, overrides, seconds, readers, writers)
@@ -0,0 +1,197 @@
+"""Occupancy summary: consistency under every write path, and report latency.
+
+Drives submissions (seated and waitlisted), a rolled back duplicate, an
+edit, a withdrawal with promotion, bulk transitions, an ORM seat change
+and an allocation run, and checks after each that the summary matches a
+full GROUP BY over rooms and applications. Then times /admin/occupancy
+against the GROUP BY it replaces at growing data sizes, the rebuild and
+check commands, and the migration that creates and fills the tables.
+
+    python -m benchmarks.occupancy [applications]
+"""
+import os
+import random
+import sys
+import time
+
+from flask_migrate import stamp, upgrade
+from sqlalchemy import func, select, text, update
+
+from app import db
+from app.allocation import run_allocation
+from app.models import Application, Room
+from app.occupancy import SUMMARY, check, is_dirty, rebuild
+from app.transitions import transition_applications
+from benchmarks.common import application_row, login_as, make_app, remove_db, sample_room, summarize, timed
+from benchmarks.journey import application_form
+from config import BASE_DIR
+
+MIGRATIONS = os.path.join(BASE_DIR, 'migrations')
+FIRST_STUDENT_ID = 620000000
+ROOM_TYPES = ['Single', 'Double', 'Suite']
+
+
+def consistent(label, dirty=False):
+    assert is_dirty() == dirty, f"{label}: dirty is {is_dirty()}"
+    if not dirty:
+        assert check() == [], f"{label}: {check()}"
+
+
+def application_id(sid, room_id):
+    return db.session.execute(select(Application.id).filter_by(student_id=str(sid), room_id=room_id)).scalar()
+
+
+def check_paths(app):
+    rooms = [sample_room(total_rooms=1, available_rooms=1), sample_room(building=2, room_type='Double')]
+    db.session.add_all(rooms)
+    db.session.commit()
+    room_ids = [room.id for room in rooms]
+    rebuild()
+    db.session.commit()
+    consistent('rooms added')
+
+    clients = {}
+    for n in range(3):
+        sid = FIRST_STUDENT_ID + n
+        clients[sid] = client = app.test_client()
+        login_as(client, sid)
+        client.post('/submit_application', data=application_form(sid, room_ids[0]))
+    consistent('seated and waitlisted submissions')
+    first = application_id(FIRST_STUDENT_ID, room_ids[0])
+
+    clients[FIRST_STUDENT_ID].post('/submit_application', data=application_form(FIRST_STUDENT_ID, room_ids[0]))
+    consistent('rolled back duplicate')
+
+    clients[FIRST_STUDENT_ID + 1].post(f'/edit_application/{room_ids[0]}', data={'telephone': '8765551111', 'agreement': 'on'})
+    clients[FIRST_STUDENT_ID].post(f'/withdraw_application/{first}')
+    consistent('withdrawal with promotion')
+
+    for n in range(3, 8):
+        sid = FIRST_STUDENT_ID + n
+        login_as(clients[FIRST_STUDENT_ID], sid)
+        clients[FIRST_STUDENT_ID].post('/submit_application', data=application_form(sid, room_ids[1]))
+    ids = db.session.execute(select(Application.id).where(Application.room_id == room_ids[1])).scalars().all()
+    transition_applications(ids[:2], 'Application Approved')
+    transition_applications(ids[1:4], 'Rejected')
+    consistent('bulk transitions')
+
+    room = db.session.get(Room, room_ids[1])
+    room.total_rooms += 5
+    room.available_rooms += 5
+    db.session.commit()
+    consistent('ORM seat change')
+    room.building = 3
+    db.session.commit()
+    consistent('room moved to another building', dirty=True)
+    rebuild()
+    db.session.commit()
+
+    run_allocation()
+    consistent('allocation run', dirty=True)
+    login_as(clients[FIRST_STUDENT_ID], 1, usertype='admin')
+    body = clients[FIRST_STUDENT_ID].get('/admin/occupancy').get_data(as_text=True)
+    assert 'Application Approved' in body and 'Rejected' in body, body
+    consistent('read after allocation')
+
+    runner = app.test_cli_runner()
+    assert runner.invoke(args=['occupancy', 'check']).exit_code == 0
+    db.session.execute(update(SUMMARY).where(SUMMARY.c.status == 'Rejected').values(count=SUMMARY.c['count'] + 1))
+    db.session.commit()
+    assert runner.invoke(args=['occupancy', 'check']).exit_code != 0
+    assert runner.invoke(args=['occupancy', 'check', '--fix']).exit_code == 0
+    consistent('check --fix')
+
+    login_as(clients[FIRST_STUDENT_ID], FIRST_STUDENT_ID)
+    assert clients[FIRST_STUDENT_ID].get('/admin/occupancy').status_code == 302
+
+
+def seed(n_applications, rnd, start_id):
+    rooms = [
+        sample_room(building=building, floor_number=floor, room_type=room_type, total_rooms=20, booked_rooms=0, available_rooms=20)
+        for building in range(1, 9) for floor in range(1, 6) for room_type in ROOM_TYPES for _ in range(4)
+    ]
+    db.session.add_all(rooms)
+    db.session.flush()
+    room_ids = [room.id for room in rooms]
+    statuses = ['Pending', 'Application Approved', 'Payment Under Review', 'Room Booked', 'Waitlisted', 'Rejected', 'Withdrawn']
+    rows = []
+    for n in range(n_applications):
+        rows.append(application_row(start_id + n, rnd.choice(room_ids), status=rnd.choice(statuses)))
+        if len(rows) == 10_000:
+            db.session.execute(Application.__table__.insert(), rows)
+            rows = []
+    if rows:
+        db.session.execute(Application.__table__.insert(), rows)
+    db.session.commit()
+
+
+def group_by_report():
+    # The scan every view would need without the summary
+    return db.session.execute(
+        select(Room.building, Room.floor_number, Room.room_type, Application.status, func.count())
+        .join(Application, Application.room_id == Room.id)
+        .group_by(Room.building, Room.floor_number, Room.room_type, Application.status)
+    ).all()
+
+
+def check_migration(app):
+    with app.app_context():
+        db.session.execute(text("DROP TABLE occupancy_summary"))
+        db.session.execute(text("DROP TABLE occupancy_state"))
+        db.session.commit()
+        db.session.remove()
+        stamp(directory=MIGRATIONS, revision='c2d86e5a1f93')
+        upgrade(directory=MIGRATIONS, revision='e71b3c9d5a24')
+        consistent('migration')
+
+
+def main(n_applications=400_000):
+    app, db_path = make_app()
+    try:
+        with app.app_context():
+            check_paths(app)
+
+            client = app.test_client()
+            login_as(client, 1, usertype='admin')
+            rnd = random.Random(0)
+            seeded = 0
+            for size in (n_applications // 16, n_applications // 4, n_applications):
+                seed(size - seeded, rnd, FIRST_STUDENT_ID + 1000 + seeded)
+                seeded = size
+                assert is_dirty(), 'bulk inserts mark the summary stale'
+                start = time.perf_counter()
+                client.get('/admin/occupancy')
+                first = time.perf_counter() - start
+                consistent(f'{size} applications')
+                page = summarize(timed(lambda: client.get('/admin/occupancy'), 30))
+                scan = summarize(timed(group_by_report, 5))
+                print(f"{size:>8} applications  dashboard p50 {page['p50_ms']:6.2f}ms (first view, rebuilding, {first * 1000:.0f}ms)"
+                      f"   GROUP BY scan p50 {scan['p50_ms']:7.1f}ms")
+
+            start = time.perf_counter()
+            mismatches = check()
+            print(f"check {n_applications} applications: {time.perf_counter() - start:.2f}s, {len(mismatches)} mismatches")
+            assert not mismatches
+
+            # What incremental upkeep adds to a seat change
+            room_ids = db.session.execute(select(Room.id).limit(200)).scalars().all()
+            sid = FIRST_STUDENT_ID + 5_000_000
+            samples = []
+            for room_id in room_ids:
+                login_as(client, sid)
+                form = application_form(sid, room_id)
+                start = time.perf_counter()
+                client.post('/submit_application', data=form)
+                samples.append(time.perf_counter() - start)
+                sid += 1
+            submit = summarize(samples)
+            consistent('after timed submissions')
+            print(f"submit_application with summary upkeep p50 {submit['p50_ms']:.2f}ms")
+
+        check_migration(app)
+    finally:
+        remove_db(db_path)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
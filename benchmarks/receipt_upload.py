@@ -0,0 +1,96 @@
+"""Receipt upload latency with many receipts already stored.
+
+Compares the old flat-directory scheme (os.listdir over every receipt on
+each upload) with the content-addressed store, with n receipts already on
+disk, then times the full upload_receipt route.
+
+    python -m benchmarks.receipt_upload [existing_receipts] [uploads]
+"""
+import io
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+
+from app import db
+from app.models import Application, Receipt
+from app.receipts import save_receipt, stream_to_storage
+from benchmarks.common import application_row, login_as, make_app, remove_db, sample_room, summarize, timed
+from werkzeug.datastructures import FileStorage
+
+PAYLOAD = b'%PDF-1.4\n' + os.urandom(200 * 1024)
+
+
+def legacy_upload(folder, student_id, room_id, application_id):
+    # The previous upload_receipt body: scan the folder, delete by prefix, save
+    prefix = f"Payment_receipt_{student_id}_{room_id}_{application_id}"
+    for existing_file in os.listdir(folder):
+        if existing_file.startswith(prefix):
+            os.remove(os.path.join(folder, existing_file))
+    with open(os.path.join(folder, f"{prefix}.pdf"), 'wb') as out:
+        out.write(PAYLOAD)
+
+
+def seed(app, n):
+    with app.app_context():
+        room = sample_room()
+        db.session.add(room)
+        db.session.flush()
+        db.session.execute(
+            Application.__table__.insert(),
+            [application_row(620000000 + i, room.id, status='Application Approved') for i in range(n)],
+        )
+        rows = []
+        now = datetime.utcnow()
+        for i in range(n):
+            sha256, path, size = stream_to_storage(io.BytesIO(b'receipt %d' % i), 'pdf')
+            rows.append({'application_id': i + 1, 'sha256': sha256, 'path': path, 'size': size, 'original_filename': 'receipt.pdf', 'uploaded_at': now})
+        db.session.execute(Receipt.__table__.insert(), rows)
+        db.session.commit()
+
+
+def main(n=100_000, uploads=200):
+    storage = tempfile.mkdtemp(prefix='uwidorm-receipts-')
+    legacy = tempfile.mkdtemp(prefix='uwidorm-legacy-')
+    app, db_path = make_app(RECEIPT_STORAGE_DIR=storage)
+    try:
+        for i in range(n):
+            with open(os.path.join(legacy, f"Payment_receipt_{620000000 + i}_1_{i + 1}.pdf"), 'wb') as out:
+                out.write(b'receipt %d' % i)
+        seed(app, n)
+
+        counter = iter(range(10 ** 9))
+        legacy_stats = summarize(timed(lambda: legacy_upload(legacy, 620000000 + next(counter) % n, 1, next(counter) % n + 1), uploads))
+
+        def store_one():
+            i = next(counter) % n
+            application = db.session.get(Application, i + 1)
+            replaced = save_receipt(application, FileStorage(io.BytesIO(PAYLOAD + b'%d' % i), filename='receipt.pdf'))
+            db.session.commit()
+            return replaced
+
+        with app.app_context():
+            store_stats = summarize(timed(store_one, uploads))
+
+        client = app.test_client()
+
+        def upload_one():
+            i = next(counter) % n
+            login_as(client, 620000000 + i)
+            response = client.post(f'/upload_receipt/{i + 1}', data={'receipt': (io.BytesIO(PAYLOAD + b'%d' % i), 'receipt.pdf')}, content_type='multipart/form-data')
+            assert response.status_code == 302
+
+        route_stats = summarize(timed(upload_one, uploads))
+        print(f"existing receipts={n}")
+        print(f"legacy listdir store   p50={legacy_stats['p50_ms']:.2f}ms p99={legacy_stats['p99_ms']:.2f}ms")
+        print(f"content-addressed store p50={store_stats['p50_ms']:.2f}ms p99={store_stats['p99_ms']:.2f}ms")
+        print(f"upload_receipt route   p50={route_stats['p50_ms']:.2f}ms p99={route_stats['p99_ms']:.2f}ms")
+    finally:
+        remove_db(db_path)
+        shutil.rmtree(storage, ignore_errors=True)
+        shutil.rmtree(legacy, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
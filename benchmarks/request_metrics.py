@@ -0,0 +1,73 @@
+"""Overhead of per-request instrumentation, and what it reports.
+
+Runs the student journey with REQUEST_METRICS_ENABLED off and on, then
+checks the Server-Timing header against an independent query count and
+reads the histograms back from /metrics, and that a refused duplicate
+submission leaves nothing behind on the pooled connection.
+
+    python -m benchmarks.request_metrics [students]
+"""
+import re
+import sys
+
+from sqlalchemy import func, select
+
+from app import db
+from app.models import Room
+from benchmarks.common import count_queries, login_as, make_app, remove_db, sample_room
+from benchmarks.journey import application_form, run
+
+SERVER_TIMING = re.compile(r'(\w+);dur=([\d.]+)(?:;desc="(\d+) queries")?')
+
+
+def check_report():
+    app, db_path = make_app(REQUEST_METRICS_ENABLED=True, METRICS_TOKEN='scrape-me')
+    try:
+        with app.app_context():
+            db.session.add_all(sample_room(building=1 + i % 3) for i in range(50))
+            db.session.commit()
+            engine = db.engine
+        client = app.test_client()
+        login_as(client, 620000001)
+        with count_queries(engine) as counter:
+            response = client.get('/view_booking')
+        timings = {name: (float(dur), desc) for name, dur, desc in SERVER_TIMING.findall(response.headers['Server-Timing'])}
+        assert int(timings['db'][1]) == counter['count'], (timings, counter)
+        assert {'db', 'tpl', 'app'} <= set(timings)
+        assert timings['app'][0] >= timings['db'][0] + timings['tpl'][0] * 0.99
+
+        for _ in range(20):
+            client.post('/room_search', data={'room_type': 'Single'})
+        assert client.get('/metrics').status_code == 403, 'students cannot read metrics'
+        scraped = client.get('/metrics', headers={'Authorization': 'Bearer scrape-me'}).get_data(as_text=True)
+        assert 'uwidorm_request_duration_ms_count{endpoint="main.room_search"} 20' in scraped, scraped
+        login_as(client, 1, usertype='admin')
+        endpoints = client.get('/metrics?format=json').get_json()['endpoints']
+        assert endpoints['main.room_search']['count'] == 20
+        assert 'static' not in endpoints
+
+        # The duplicate's INSERT fails on the unique index inside the request
+        login_as(client, 620000001)
+        with app.app_context():
+            room_id = db.session.execute(select(func.min(Room.id))).scalar()
+        for _ in range(3):
+            client.post('/submit_application', data=application_form(620000001, room_id))
+        with app.app_context(), db.engine.connect() as connection:
+            assert connection.info == {}, connection.info
+    finally:
+        remove_db(db_path)
+
+
+def main(students=200):
+    check_report()
+    reports = {}
+    for enabled in (False, True):
+        reports[enabled] = run(students, 1000, 200, 1000, 0, 'pbkdf2:sha256:1000', REQUEST_METRICS_ENABLED=enabled)
+    print(f"{'route':20} {'off p50':>9} {'on p50':>9}")
+    for route, off in reports[False]['routes'].items():
+        on = reports[True]['routes'][route]
+        print(f"{route:20} {off['p50_ms']:8.2f}ms {on['p50_ms']:8.2f}ms")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
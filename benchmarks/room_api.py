@@ -0,0 +1,98 @@
+"""/api/rooms: cold searches, cached bodies and 304 revalidation.
+
+Also checks that the inventory version moves on every kind of room write
+and that a changed room shows up under a new ETag.
+
+    python -m benchmarks.room_api [rooms] [requests]
+"""
+import random
+import sys
+
+from sqlalchemy import update
+
+from app import db
+from app.inventory import inventory_version
+from app.models import Room
+from benchmarks.common import count_queries, login_as, make_app, remove_db, sample_room, summarize, timed
+from benchmarks.room_search import FILTERS, seed
+
+
+def check_versions(app, client):
+    with app.app_context():
+        before = inventory_version()
+        room = Room.query.order_by(Room.building, Room.floor_number, Room.id).first()
+        room.available_rooms += 1
+        db.session.commit()
+        assert inventory_version() == before + 1
+
+        # Flushing an untouched room is not a write
+        room.available_rooms = room.available_rooms
+        db.session.commit()
+        assert inventory_version() == before + 1
+
+        db.session.execute(update(Room).where(Room.id == room.id).values(available_rooms=0))
+        db.session.execute(update(Room).where(Room.id == room.id + 1).values(available_rooms=0))
+        db.session.commit()
+        assert inventory_version() == before + 2, 'one bump per transaction'
+
+        db.session.add(sample_room())
+        db.session.rollback()
+        assert inventory_version() == before + 2
+        room_id = room.id
+
+    first = client.get('/api/rooms', query_string={'availability': 'now'})
+    etag = first.headers['ETag']
+    assert room_id not in {r['id'] for r in first.get_json()['rooms']}
+    assert client.get('/api/rooms', query_string={'availability': 'now'}, headers={'If-None-Match': etag}).status_code == 304
+
+    with app.app_context():
+        db.session.execute(update(Room).where(Room.id == room_id).values(available_rooms=3))
+        db.session.commit()
+    changed = client.get('/api/rooms', query_string={'availability': 'now'}, headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+    assert room_id in {r['id'] for r in changed.get_json()['rooms']}
+
+    assert client.get('/api/rooms', query_string={'level': 'x'}).status_code == 400
+
+
+def main(n_rooms=3000, n_requests=300):
+    app, db_path = make_app()
+    try:
+        seed(app, n_rooms)
+        client = app.test_client()
+        login_as(client, 620000001)
+        check_versions(app, client)
+        with app.app_context():
+            engine = db.engine
+            cache = app.extensions['room_api_cache']
+
+        rnd = random.Random(5)
+        etags = {}
+
+        def html():
+            client.post('/room_search', data=rnd.choice(FILTERS))
+
+        def cold():
+            cache.clear()
+            client.get('/api/rooms', query_string=rnd.choice(FILTERS))
+
+        def warm():
+            client.get('/api/rooms', query_string=rnd.choice(FILTERS))
+
+        def revalidate():
+            index = rnd.randrange(len(FILTERS))
+            response = client.get('/api/rooms', query_string=FILTERS[index], headers={'If-None-Match': etags.get(index, '')})
+            etags[index] = response.headers['ETag']
+
+        for label, fn in (('html POST', html), ('api cold', cold), ('api cached', warm), ('api 304', revalidate)):
+            fn()
+            with count_queries(engine) as counter:
+                stats = summarize(timed(fn, n_requests))
+            print(f"{label:10} p50 {stats['p50_ms']:6.2f}ms  p95 {stats['p95_ms']:6.2f}ms  {counter['count'] / n_requests:.2f} queries/request")
+        print(f"cache entries {len(cache)}  hits {cache.hits}  misses {cache.misses}")
+    finally:
+        remove_db(db_path)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
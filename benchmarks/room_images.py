@@ -0,0 +1,121 @@
+"""Room image variants: generation time, incremental reruns and bytes saved.
+
+Works on a copy of app/static/images so the tree is left alone, then
+renders room_search against the resulting manifest to check the srcset
+markup. Also checks that paths outside the static folder are refused and
+that JPEGs from RGBA, palette and CMYK sources are written.
+
+    python -m benchmarks.room_images [copies]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from PIL import Image
+
+from app.images import build_images, load_manifest
+from benchmarks.common import login_as, make_app, remove_db, sample_room
+
+WIDTHS = (320, 640, 960)
+
+
+def prepare(static_dir, source_dir, copies):
+    # Distinct copies of every photo, so there is enough work for the pool
+    os.makedirs(os.path.join(static_dir, 'images'))
+    paths = []
+    for name in sorted(os.listdir(source_dir)):
+        if not name.lower().endswith(('.png', '.jpg', '.jpeg')) or 'w.' in name.rsplit('-', 1)[-1]:
+            continue
+        root, ext = os.path.splitext(name)
+        for copy in range(copies):
+            path = f"images/{root}_{copy}{ext}"
+            shutil.copyfile(os.path.join(source_dir, name), os.path.join(static_dir, path))
+            paths.append(path)
+    return paths
+
+
+def run(static_dir, paths, workers):
+    manifest = os.path.join(static_dir, 'images', 'variants.json')
+    start = time.perf_counter()
+    result = build_images(static_dir, paths, WIDTHS, workers, manifest)
+    return time.perf_counter() - start, result, manifest
+
+
+def check_sources():
+    static_dir = tempfile.mkdtemp(prefix='uwidorm-images-')
+    outside = tempfile.mkdtemp(prefix='uwidorm-outside-')
+    try:
+        os.makedirs(os.path.join(static_dir, 'images'))
+        Image.new('RGB', (400, 300)).save(os.path.join(outside, 'secret.png'))
+        # Content is PNG or CMYK JPEG; the .jpg name is what the variants are saved as
+        Image.new('RGBA', (400, 300), (0, 0, 0, 0)).save(os.path.join(static_dir, 'images', 'rgba.jpg'), 'PNG')
+        palette = Image.new('P', (400, 300))
+        palette.info['transparency'] = 0
+        palette.save(os.path.join(static_dir, 'images', 'palette.jpg'), 'PNG')
+        Image.new('CMYK', (400, 300)).save(os.path.join(static_dir, 'images', 'cmyk.jpg'))
+        sources = ['images/rgba.jpg', 'images/palette.jpg', 'images/cmyk.jpg']
+        escapes = [os.path.relpath(os.path.join(outside, 'secret.png'), static_dir), os.path.join(outside, 'secret.png')]
+        _, (generated, _, missing), _ = run(static_dir, sources + escapes, 0)
+        assert generated == sorted(sources) and sorted(missing) == sorted(escapes), (generated, missing)
+        assert os.listdir(outside) == ['secret.png'], 'nothing is written outside the static folder'
+        with Image.open(os.path.join(static_dir, 'images', 'cmyk-320w.jpg')) as variant:
+            assert variant.format == 'JPEG' and variant.mode == 'RGB'
+    finally:
+        shutil.rmtree(static_dir)
+        shutil.rmtree(outside)
+
+
+def main(copies=3):
+    check_sources()
+    app, db_path = make_app()
+    remove_db(db_path)
+    source_dir = os.path.join(app.static_folder, 'images')
+    static_dirs = []
+    for workers in (0, 2):
+        static_dir = tempfile.mkdtemp(prefix='uwidorm-images-')
+        static_dirs.append(static_dir)
+        try:
+            paths = prepare(static_dir, source_dir, copies)
+            elapsed, (generated, skipped, missing), manifest = run(static_dir, paths, workers)
+            assert len(generated) == len(paths) and not skipped and not missing
+            print(f"workers={workers} (cpus={os.cpu_count()}): {len(generated)} images in {elapsed:.2f}s")
+
+            elapsed, (generated, skipped, _), _ = run(static_dir, paths, workers)
+            assert not generated and len(skipped) == len(paths)
+            print(f"workers={workers}: rerun, all {len(skipped)} unchanged in {elapsed * 1000:.1f}ms")
+
+            with open(os.path.join(static_dir, paths[0]), 'ab') as fh:
+                fh.write(b'\0')
+            _, (generated, _, _), _ = run(static_dir, paths, workers)
+            assert generated == [paths[0]], generated
+        except BaseException:
+            shutil.rmtree(static_dir)
+            raise
+    shutil.rmtree(static_dirs[0])
+
+    entries = load_manifest(manifest)
+    for path in paths[::copies]:
+        original = os.path.getsize(os.path.join(static_dir, path))
+        width, smallest = entries[path]['variants']['webp'][0]
+        webp = os.path.getsize(os.path.join(static_dir, smallest))
+        print(f"{os.path.basename(path):32} {original / 1024:7.1f} KiB -> {width}w webp {webp / 1024:6.1f} KiB")
+
+    app, db_path = make_app(IMAGE_MANIFEST=manifest)
+    try:
+        with app.app_context():
+            from app import db
+            db.session.add(sample_room(image_url=paths[0]))
+            db.session.commit()
+        client = app.test_client()
+        login_as(client, 620000001)
+        html = client.post('/room_search', data={}).get_data(as_text=True)
+        assert 'type="image/webp"' in html and 'w.webp ' in html, 'room_search should emit srcset'
+    finally:
+        remove_db(db_path)
+        shutil.rmtree(static_dir)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
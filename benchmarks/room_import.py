@@ -0,0 +1,103 @@
+"""Timing for flask rooms import / export on a full term's inventory.
+
+Generates a synthetic CSV, imports it through the CLI, re-imports it as
+upserts (every row has an id) and exports it again, then checks that
+JSONL lines which are not objects are reported as rejected rows, and
+that a file without booked_rooms keeps the seats taken through the app.
+
+    python -m benchmarks.room_import [rooms] [batch_size]
+"""
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+from app import db
+from app.models import Room
+from app.reservations import take_seat
+from benchmarks.common import make_app, remove_db, sample_room
+
+
+def write_csv(path, n_rooms, with_ids):
+    rnd = random.Random(5)
+    with open(path, 'w', newline='') as out:
+        writer = csv.writer(out)
+        writer.writerow(['id', 'building', 'room_type', 'floor_number', 'description', 'total_rooms', 'booked_rooms', 'image_url'])
+        for i in range(n_rooms):
+            total = rnd.randint(1, 8)
+            writer.writerow([
+                i + 1 if with_ids else '', rnd.randint(1, 40), rnd.choice(['Single', 'Double', 'Suite']), rnd.randint(1, 12),
+                'Synthetic room with desk, wardrobe and shared bathroom', total, rnd.randint(0, total), 'images/singleroom-irvine.png',
+            ])
+        writer.writerow(['', 'x', 'Single', 1, 'bad row', 1, 0, 'images/singleroom-irvine.png'])
+
+
+def check_seat_counters(app, runner, workdir):
+    with app.app_context():
+        room = sample_room(total_rooms=4, booked_rooms=0, available_rooms=4)
+        db.session.add(room)
+        db.session.commit()
+        room_id = room.id
+        take_seat(room_id)
+        take_seat(room_id)
+        db.session.commit()
+
+    path = os.path.join(workdir, 'counters.csv')
+    for total, expected in ((5, (2, 3)), (1, (2, 3))):
+        with open(path, 'w', newline='') as out:
+            writer = csv.writer(out)
+            writer.writerow(['id', 'building', 'room_type', 'floor_number', 'description', 'total_rooms', 'image_url'])
+            writer.writerow([room_id, 1, 'Single', 1, 'Re-imported without counters', total, 'images/singleroom-irvine.png'])
+        result = runner.invoke(args=['rooms', 'import', path, '--no-images'])
+        with app.app_context():
+            room = db.session.get(Room, room_id)
+            assert (room.booked_rooms, room.available_rooms) == expected, (total, room.booked_rooms, room.available_rooms)
+            assert room.total_rooms == max(total, 5)
+    # The second file would leave fewer seats than are booked
+    assert result.exit_code == 1 and 'below the seats already booked' in result.output, result.output
+
+
+def main(n_rooms=50_000, batch_size=1000):
+    app, db_path = make_app()
+    workdir = tempfile.mkdtemp(prefix='uwidorm-import-')
+    try:
+        runner = app.test_cli_runner()
+        for label, with_ids in (('insert', False), ('upsert', True)):
+            path = os.path.join(workdir, f'{label}.csv')
+            write_csv(path, n_rooms, with_ids)
+            start = time.perf_counter()
+            result = runner.invoke(args=['rooms', 'import', path, '--batch-size', str(batch_size)])
+            elapsed = time.perf_counter() - start
+            assert result.exit_code == 1 and '1 rejected' in result.output, result.output
+            print(f"{label:6} {n_rooms} rows in {elapsed:.2f}s ({n_rooms / elapsed:,.0f} rows/s)")
+
+        with app.app_context():
+            assert Room.query.count() == n_rooms
+            assert Room.query.filter(Room.available_rooms != Room.total_rooms - Room.booked_rooms).count() == 0
+
+        export_path = os.path.join(workdir, 'export.jsonl')
+        start = time.perf_counter()
+        result = runner.invoke(args=['rooms', 'export', export_path])
+        assert result.exit_code == 0, result.output
+        print(f"export {n_rooms} rows in {time.perf_counter() - start:.2f}s")
+
+        check_seat_counters(app, runner, workdir)
+
+        # Lines that parse but are not objects are rejected rows, not crashes
+        bad_path = os.path.join(workdir, 'bad.jsonl')
+        with open(bad_path, 'w') as out:
+            out.write('[1, 2]\n3\n"room"\n')
+        result = runner.invoke(args=['rooms', 'import', bad_path])
+        assert result.exit_code == 1 and '3 rejected' in result.output, result.output
+        assert result.output.count('expected a JSON object') == 3, result.output
+    finally:
+        remove_db(db_path)
+        for name in os.listdir(workdir):
+            os.remove(os.path.join(workdir, name))
+        os.rmdir(workdir)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,164 @@
+"""room_search throughput with the in-process inventory index on and off.
+
+Also checks that the index matches the query path, follows room writes,
+takes bookings as patches rather than rebuilds, and can be searched while
+another thread patches it.
+
+    python -m benchmarks.room_search [rooms] [requests]
+"""
+import random
+import sys
+import threading
+import time
+
+from sqlalchemy import update
+
+from app import db
+from app.inventory import get_inventory
+from app.models import Room
+from app.reservations import run_with_retry, take_seat
+from benchmarks.common import count_queries, login_as, make_app, remove_db, sample_room
+
+FILTERS = [
+    {},
+    {'room_type': 'Single'},
+    {'room_type': 'Double', 'dormitory': '2'},
+    {'dormitory': '3', 'level': '4'},
+    {'room_type': 'Single', 'dormitory': '1', 'level': '2', 'availability': 'now'},
+    {'availability': 'now'},
+]
+
+
+def seed(app, n_rooms):
+    rnd = random.Random(3)
+    with app.app_context():
+        db.session.add_all(
+            sample_room(
+                building=rnd.randint(1, 4), room_type=rnd.choice(['Single', 'Double']),
+                floor_number=rnd.randint(1, 6), available_rooms=rnd.randint(0, 3),
+            )
+            for _ in range(n_rooms)
+        )
+        db.session.commit()
+
+
+def check_consistency(app):
+    with app.app_context():
+        query_ids = [room.id for room in Room.query.filter(Room.available_rooms > 0).order_by(Room.building, Room.floor_number, Room.id)]
+        assert [room.id for room in get_inventory().search(available_only=True)] == query_ids
+
+        room = Room.query.filter(Room.available_rooms > 0).first()
+        room.available_rooms = 0
+        db.session.commit()
+        assert room.id not in {r.id for r in get_inventory().search(available_only=True)}
+
+        db.session.execute(update(Room).where(Room.id == room.id).values(available_rooms=5))
+        db.session.commit()
+        assert room.id in {r.id for r in get_inventory().search(available_only=True)}
+
+        # A booking patches the counters without rebuilding the snapshot
+        inventory = get_inventory()
+        built_at = inventory._built_at
+        booked = room.booked_rooms
+        assert run_with_retry(lambda: take_seat(room.id))
+        record = next(r for r in inventory.search() if r.id == room.id)
+        assert (record.available_rooms, record.booked_rooms) == (4, booked + 1), record
+        assert inventory._built_at == built_at, 'bookings do not rebuild the index'
+
+
+def check_concurrent_patches(app):
+    # Searches iterate the snapshot without the lock while patches add, move and drop rooms
+    with app.app_context():
+        inventory = get_inventory()
+        template = inventory.search()[0]
+    errors = []
+    done = threading.Event()
+
+    def searcher():
+        try:
+            while not done.is_set():
+                inventory.search()
+                inventory.search(room_type='Single', available_only=True)
+        except Exception as exc:
+            errors.append(exc)
+            done.set()
+
+    # Switch threads as often as possible so iterations overlap patches
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    threads = [threading.Thread(target=searcher) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    deadline = time.perf_counter() + 1.0
+    n = 0
+    while time.perf_counter() < deadline and not done.is_set():
+        room_id = 10_000_000 + n % 50
+        floor = 100 + n % 7
+        inventory.patch({room_id: template._replace(id=room_id, floor_number=floor) if n % 3 else None})
+        n += 1
+    done.set()
+    for thread in threads:
+        thread.join()
+    sys.setswitchinterval(interval)
+    assert not errors, errors
+
+
+def throughput(app, n_requests):
+    client = app.test_client()
+    login_as(client, 620000001)
+    rnd = random.Random(11)
+    with app.app_context():
+        engine = db.engine
+    client.post('/room_search', data={})
+    with count_queries(engine) as counter:
+        start = time.perf_counter()
+        for _ in range(n_requests):
+            client.post('/room_search', data=rnd.choice(FILTERS))
+        elapsed = time.perf_counter() - start
+    return n_requests / elapsed, counter['count'] / n_requests
+
+
+def search_only(app, enabled, n_requests):
+    # The lookup alone, without template rendering
+    rnd = random.Random(11)
+    with app.app_context():
+        start = time.perf_counter()
+        for _ in range(n_requests):
+            filters = rnd.choice(FILTERS)
+            building = int(filters['dormitory']) if 'dormitory' in filters else None
+            floor_number = int(filters['level']) if 'level' in filters else None
+            if enabled:
+                get_inventory().search(filters.get('room_type'), building, floor_number, filters.get('availability') == 'now')
+            else:
+                query = Room.query
+                if 'room_type' in filters:
+                    query = query.filter_by(room_type=filters['room_type'])
+                if building is not None:
+                    query = query.filter_by(building=building)
+                if floor_number is not None:
+                    query = query.filter_by(floor_number=floor_number)
+                if filters.get('availability') == 'now':
+                    query = query.filter(Room.available_rooms > 0)
+                query.all()
+                db.session.expunge_all()
+        return n_requests / (time.perf_counter() - start)
+
+
+def main(n_rooms=3000, n_requests=300):
+    for enabled in (False, True):
+        app, db_path = make_app(ROOM_INVENTORY_INDEX=enabled)
+        try:
+            seed(app, n_rooms)
+            if enabled:
+                check_consistency(app)
+                check_concurrent_patches(app)
+            rps, queries = throughput(app, n_requests)
+            searches = search_only(app, enabled, n_requests * 10)
+            label = 'index' if enabled else 'query'
+            print(f"{label:5} rooms={n_rooms} {rps:8.1f} req/s  {queries:.2f} queries/request  {searches:9.1f} searches/s")
+        finally:
+            remove_db(db_path)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,78 @@
+"""Many threads booking the same room at once.
+
+Fires thousands of simultaneous submissions at one room with a limited
+number of seats, then checks that no seat was oversold and that the
+counters match the applications that got in. Also withdraws a batch of
+applications and checks that their seats come back.
+
+    python -m benchmarks.seat_contention [attempts] [threads] [seats]
+"""
+import sys
+import threading
+import time
+
+from app import db
+from app.models import Application, Room
+from app.reservations import RoomFullError, release_application, submit_with_seat
+from benchmarks.common import make_app, remove_db, sample_application, sample_room
+
+
+def main(attempts=2000, threads=32, seats=500):
+    app, db_path = make_app()
+    try:
+        with app.app_context():
+            room = sample_room(total_rooms=seats, booked_rooms=0, available_rooms=seats)
+            db.session.add(room)
+            db.session.commit()
+            room_id = room.id
+
+        outcomes = {'booked': 0, 'full': 0, 'error': 0}
+        lock = threading.Lock()
+        barrier = threading.Barrier(threads)
+        per_thread = attempts // threads
+
+        def worker(offset):
+            barrier.wait()
+            for i in range(per_thread):
+                with app.app_context():
+                    try:
+                        submit_with_seat(sample_application(620000000 + offset * per_thread + i, room_id))
+                        outcome = 'booked'
+                    except RoomFullError:
+                        outcome = 'full'
+                    except Exception:
+                        outcome = 'error'
+                with lock:
+                    outcomes[outcome] += 1
+
+        pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        start = time.perf_counter()
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        with app.app_context():
+            room = db.session.get(Room, room_id)
+            holding = Application.query.filter_by(room_id=room_id).count()
+            assert room.booked_rooms == holding == min(seats, per_thread * threads), (room.booked_rooms, holding)
+            assert room.available_rooms == seats - room.booked_rooms >= 0
+            assert outcomes['error'] == 0, outcomes
+
+            for application in Application.query.filter_by(room_id=room_id).limit(50).all():
+                release_application(application, 'Withdrawn')
+                release_application(application, 'Rejected')
+            room = db.session.get(Room, room_id)
+            db.session.refresh(room)
+            assert room.available_rooms == seats - room.booked_rooms == min(50, seats)
+
+        total = per_thread * threads
+        print(f"attempts={total} threads={threads} seats={seats} outcomes={outcomes}")
+        print(f"{total / elapsed:.1f} attempts/s, {outcomes['booked'] / elapsed:.1f} booking commits/s, oversold=0")
+    finally:
+        remove_db(db_path)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:4]))
@@ -0,0 +1,162 @@
+"""Synthetic users, rooms and applications at configurable scale.
+
+Rows are generated deterministically from --seed and written with chunked
+executemany INSERTs, so 1M applications take seconds rather than hours.
+Every user shares the password BENCH_PASSWORD, hashed once with
+--hash-method. Applications never repeat a (student, room) pair and the
+room seat counters match the applications that hold a seat.
+
+    python -m benchmarks.seed PATH --users 10000 --rooms 1000 --applications 50000
+"""
+import argparse
+import random
+import time
+from collections import Counter
+
+from sqlalchemy import bindparam, update
+from werkzeug.security import generate_password_hash
+
+from app import db
+from app.models import Application, Room, User
+from app.reservations import HOLDING_STATUSES
+from benchmarks.common import LEVELS, PROGRAMS, make_app
+
+BENCH_PASSWORD = 'bench-password'
+FIRST_STUDENT_ID = 620000000
+CHUNK_SIZE = 10_000
+
+FIRST_NAMES = ['Aaliyah', 'Andre', 'Brianna', 'Chad', 'Danielle', 'Damion', 'Gabrielle', 'Jermaine', 'Kimani', 'Keisha', 'Marlon', 'Monique', 'Nathan', 'Renee', 'Shanice', 'Tyrone']
+LAST_NAMES = ['Brown', 'Campbell', 'Clarke', 'Francis', 'Grant', 'Henry', 'James', 'Johnson', 'Lewis', 'Morgan', 'Reid', 'Robinson', 'Smith', 'Thompson', 'Williams', 'Wright']
+ROOM_TYPES = [('Single', 'images/singleroom-irvine.png'), ('Double', 'images/doubleroom-irvine.png')]
+# Rough shape of an intake: most applications are still in flight
+STATUSES = ['Pending'] * 5 + ['Application Approved'] * 2 + ['Payment Under Review', 'Room Booked', 'Rejected', 'Withdrawn']
+
+
+def student_id(index):
+    return FIRST_STUDENT_ID + index
+
+
+def _chunks(rows):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def user_rows(count, rnd, password_hash, start=0):
+    for index in range(start, start + count):
+        yield {
+            'user_id': student_id(index),
+            'fname': rnd.choice(FIRST_NAMES),
+            'lname': rnd.choice(LAST_NAMES),
+            'email': f"{student_id(index)}@mymona.uwi.edu",
+            'usertype': 'student',
+            'password': password_hash,
+        }
+
+
+def room_rows(count, rnd):
+    for _ in range(count):
+        room_type, image_url = rnd.choice(ROOM_TYPES)
+        yield {
+            'building': rnd.randint(1, 10),
+            'room_type': room_type,
+            'floor_number': rnd.randint(1, 6),
+            'description': f"{room_type} room with a desk, wardrobe and {rnd.choice(['garden', 'courtyard', 'street'])} view",
+            'total_rooms': 0,
+            'booked_rooms': 0,
+            'available_rooms': 0,
+            'image_url': image_url,
+        }
+
+
+def application_rows(count, n_users, n_rooms, rnd, held):
+    # Student i applies to rooms i, i + stride, i + 2 * stride, ... so pairs never repeat
+    stride = max(1, n_rooms // max(1, -(-count // n_users)))
+    for index in range(count):
+        student, round_ = index % n_users, index // n_users
+        room_id = (student + round_ * stride) % n_rooms + 1
+        status = rnd.choice(STATUSES)
+        if status in HOLDING_STATUSES:
+            held[room_id] += 1
+        yield {
+            'student_id': str(student_id(student)),
+            'first_name': rnd.choice(FIRST_NAMES),
+            'middle_name': None,
+            'last_name': rnd.choice(LAST_NAMES),
+            'email': f"{student_id(student)}@mymona.uwi.edu",
+            'telephone': f"876{rnd.randint(1000000, 9999999)}",
+            'gender': rnd.choice(['Female', 'Male']),
+            'education_level': rnd.choice(LEVELS),
+            'program_type': rnd.choice(PROGRAMS),
+            'reason_for_applying': 'Closer to classes and the library',
+            'co_curricular_activities': None,
+            'agreement': True,
+            'room_id': room_id,
+            'status': status,
+        }
+
+
+def seed_database(users, rooms, applications, seed=0, hash_method='pbkdf2:sha256:1000'):
+    """Fill the current app's database. Returns {table: rows written}."""
+    if applications and not (users and rooms):
+        raise ValueError('applications need at least one user and one room')
+    if applications > users * rooms:
+        raise ValueError('more applications than distinct (student, room) pairs')
+    if db.session.query(Room.id).first() is not None:
+        raise ValueError('seed_database expects an empty database')
+    rnd = random.Random(seed)
+    password_hash = generate_password_hash(BENCH_PASSWORD, method=hash_method)
+    for chunk in _chunks(user_rows(users, rnd, password_hash)):
+        db.session.execute(User.__table__.insert(), chunk)
+    for chunk in _chunks(room_rows(rooms, rnd)):
+        db.session.execute(Room.__table__.insert(), chunk)
+    db.session.commit()
+
+    held = Counter()
+    for chunk in _chunks(application_rows(applications, users, rooms, rnd, held)):
+        db.session.execute(Application.__table__.insert(), chunk)
+        db.session.commit()
+
+    # Every room gets its held seats plus a few free ones
+    counters = [
+        {'room': room_id, 'booked': held[room_id], 'total': held[room_id] + rnd.randint(0, 4)}
+        for room_id in range(1, rooms + 1)
+    ]
+    rooms_table = Room.__table__
+    for chunk in _chunks(counters):
+        db.session.execute(
+            update(rooms_table)
+            .where(rooms_table.c.id == bindparam('room'))
+            .values(booked_rooms=bindparam('booked'), total_rooms=bindparam('total'),
+                    available_rooms=bindparam('total') - bindparam('booked')),
+            chunk,
+        )
+    db.session.commit()
+    return {'users': users, 'rooms': rooms, 'applications': applications}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('path', help='SQLite file to create')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--rooms', type=int, default=200)
+    parser.add_argument('--applications', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--hash-method', default='pbkdf2:sha256:1000')
+    args = parser.parse_args()
+
+    app, _ = make_app(args.path)
+    with app.app_context():
+        start = time.perf_counter()
+        counts = seed_database(args.users, args.rooms, args.applications, args.seed, args.hash_method)
+        elapsed = time.perf_counter() - start
+    print(f"seeded {counts} into {args.path} in {elapsed:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Request throughput with SQL metrics off and on.
+
+With metrics on, also checks that statements which raise leave nothing
+behind on the pooled connection.
+
+    python -m benchmarks.sql_metrics_overhead [requests]
+"""
+import logging
+import os
+import sys
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from benchmarks.common import login_as, make_app, remove_db, sample_application, sample_room
+
+STUDENT_ID = 620000001
+
+PROFILES = {
+    'disabled': {'SQL_METRICS_ENABLED': False},
+    'enabled': {'SQL_METRICS_ENABLED': True, 'SQL_LOG_SAMPLE_RATE': 0.01},
+}
+
+
+def check_failed_statements(app):
+    with app.app_context(), db.engine.connect() as connection:
+        for _ in range(50):
+            try:
+                connection.execute(text('SELECT * FROM no_such_table'))
+            except OperationalError:
+                connection.rollback()
+        assert connection.info == {}, connection.info
+
+
+def run(name, overrides, n_requests):
+    app, db_path = make_app(**overrides)
+    try:
+        if overrides.get('SQL_METRICS_ENABLED'):
+            check_failed_statements(app)
+        with app.app_context():
+            rooms = [sample_room() for _ in range(5)]
+            db.session.add_all(rooms)
+            db.session.flush()
+            db.session.add_all(sample_application(STUDENT_ID, room.id) for room in rooms)
+            db.session.commit()
+        client = app.test_client()
+        login_as(client, STUDENT_ID)
+        start = time.perf_counter()
+        for _ in range(n_requests):
+            client.get('/track_application')
+        elapsed = time.perf_counter() - start
+        print(f"{name:8} {n_requests / elapsed:8.1f} req/s")
+    finally:
+        remove_db(db_path)
+
+
+if __name__ == '__main__':
+    # Send log output somewhere cheap so the comparison measures formatting, not the terminal
+    logging.basicConfig(stream=open(os.devnull, 'w'))
+    n_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    for name, overrides in PROFILES.items():
+        run(name, overrides, n_requests)
@@ -0,0 +1,117 @@
+"""Bytes transferred for a cold and a warm dashboard load.
+
+A tiny browser fetches the dashboard, every same-origin stylesheet and
+image it references (including url() references inside CSS) and caches
+them. The warm load skips responses that are still fresh and revalidates
+the rest with If-None-Match. Runs once against plain /static and once
+after `flask assets build`.
+
+    python -m benchmarks.static_assets
+"""
+import posixpath
+import re
+import shutil
+import tempfile
+
+from app import db
+from app.assets import build_assets
+from benchmarks.common import login_as, make_app, remove_db, sample_application, sample_room
+
+HTML_REF = re.compile(r"""(?:href|src)=["']\s*(/[^"'\s]+)""")
+CSS_REF = re.compile(r"""url\(\s*['"]?([^'")]+)""")
+HEADERS = {'Accept-Encoding': 'br, gzip'}
+STUDENT_ID = 620000001
+
+
+class Browser:
+    def __init__(self, client):
+        self.client = client
+        self.cache = {}
+        self.requests = 0
+        self.bytes = 0
+
+    def get(self, url):
+        cached = self.cache.get(url)
+        if cached is not None and 'immutable' in cached.headers.get('Cache-Control', ''):
+            return cached
+        headers = dict(HEADERS)
+        if cached is not None and cached.headers.get('ETag'):
+            headers['If-None-Match'] = cached.headers['ETag']
+        response = self.client.get(url, headers=headers)
+        self.requests += 1
+        self.bytes += len(response.data)
+        if response.status_code == 304:
+            return cached
+        assert response.status_code == 200, (url, response.status_code)
+        self.cache[url] = response
+        return response
+
+    def load(self, url):
+        page = self.get(url)
+        for ref in HTML_REF.findall(page.get_data(as_text=True)):
+            if ref.startswith(('/static/', '/assets/')):
+                self.load_asset(ref)
+
+    def load_asset(self, url):
+        response = self.get(url)
+        if url.endswith('.css'):
+            body = self.client_css(response)
+            for ref in CSS_REF.findall(body):
+                if not ref.startswith(('data:', 'http:', 'https:')):
+                    self.get(posixpath.normpath(posixpath.join(posixpath.dirname(url), ref)))
+
+    @staticmethod
+    def client_css(response):
+        encoding = response.headers.get('Content-Encoding')
+        data = response.data
+        if encoding == 'br':
+            import brotli
+            data = brotli.decompress(data)
+        elif encoding == 'gzip':
+            import gzip
+            data = gzip.decompress(data)
+        return data.decode('utf-8')
+
+
+def measure(label, **overrides):
+    app, db_path = make_app(**overrides)
+    try:
+        with app.app_context():
+            for image in ('images/singleroom-irvine.png', 'images/doubleroom-irvine.png'):
+                room = sample_room(image_url=image)
+                db.session.add(room)
+                db.session.flush()
+                db.session.add(sample_application(STUDENT_ID, room.id))
+            db.session.commit()
+        client = app.test_client()
+        login_as(client, STUDENT_ID)
+        browser = Browser(client)
+        results = []
+        for _ in ('cold', 'warm'):
+            browser.requests = browser.bytes = 0
+            browser.load('/dashboard')
+            results.append((browser.requests, browser.bytes))
+        (cold_requests, cold_bytes), (warm_requests, warm_bytes) = results
+        print(f"{label:13} cold {cold_requests:2} requests {cold_bytes / 1024:8.1f} KiB   warm {warm_requests:2} requests {warm_bytes / 1024:8.1f} KiB")
+        return results
+    finally:
+        remove_db(db_path)
+
+
+def main():
+    build_dir = tempfile.mkdtemp(prefix='uwidorm-assets-')
+    try:
+        plain = measure('/static', ASSET_BUILD_DIR=build_dir)
+        app, db_path = make_app()
+        remove_db(db_path)
+        manifest = build_assets(app.static_folder, build_dir)
+        assert 'css/styles.css' in manifest['assets']
+        built = measure('fingerprinted', ASSET_BUILD_DIR=build_dir)
+        assert built[0][1] < plain[0][1], 'precompressed CSS should shrink the cold load'
+        assert built[1][0] == 1, 'a warm load should only fetch the page itself'
+    finally:
+        shutil.rmtree(build_dir)
+
+
+if __name__ == '__main__':
+    main()
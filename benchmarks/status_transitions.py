@@ -0,0 +1,76 @@
+"""Approving a full intake through the admin status endpoint.
+
+Seeds n Pending applications, approves them all in one request, rejects a
+slice to check the room counters, and compares against the same work sent
+one application per request.
+
+    python -m benchmarks.status_transitions [applications] [rooms]
+"""
+import sys
+import time
+
+from sqlalchemy import func
+
+from app import db
+from app.models import Application, Room
+from benchmarks.common import application_row, login_as, make_app, remove_db, sample_room
+
+ENDPOINT = '/admin/applications/status'
+
+
+def seed(app, n_applications, n_rooms):
+    with app.app_context():
+        per_room = n_applications // n_rooms + 1
+        rooms = [sample_room(total_rooms=per_room, booked_rooms=0, available_rooms=per_room) for _ in range(n_rooms)]
+        db.session.add_all(rooms)
+        db.session.flush()
+        rows = [application_row(620000000 + i, rooms[i % n_rooms].id) for i in range(n_applications)]
+        db.session.execute(Application.__table__.insert(), rows)
+        # Seats are taken at submission, mirror that for the seeded rows
+        for room in rooms:
+            taken = sum(1 for row in rows if row['room_id'] == room.id)
+            room.booked_rooms = taken
+            room.available_rooms = per_room - taken
+        db.session.commit()
+
+
+def main(n_applications=20_000, n_rooms=2_000):
+    app, db_path = make_app()
+    try:
+        seed(app, n_applications, n_rooms)
+        client = app.test_client()
+        login_as(client, 1, usertype='admin')
+
+        ids = list(range(1, n_applications + 1))
+        start = time.perf_counter()
+        response = client.post(ENDPOINT, json={'ids': ids + [n_applications + 1], 'status': 'Application Approved'})
+        elapsed = time.perf_counter() - start
+        body = response.get_json()
+        assert response.status_code == 200 and body['applied'] == n_applications, body.get('error')
+        assert body['results'][-1]['outcome'] == 'not_found'
+        print(f"approve {n_applications} in one request: {elapsed:.2f}s")
+
+        response = client.post(ENDPOINT, json={'ids': ids[:10], 'status': 'Room Booked'})
+        assert all(result['outcome'] == 'invalid_transition' for result in response.get_json()['results'])
+
+        reject = ids[:n_applications // 10]
+        start = time.perf_counter()
+        response = client.post(ENDPOINT, json={'ids': reject, 'status': 'Rejected'})
+        print(f"reject {len(reject)} in one request: {time.perf_counter() - start:.2f}s")
+        with app.app_context():
+            booked = db.session.query(func.sum(Room.booked_rooms)).scalar()
+            assert booked == n_applications - len(reject), booked
+            assert Room.query.filter(Room.available_rooms + Room.booked_rooms != Room.total_rooms).count() == 0
+
+        sample = ids[len(reject):len(reject) + 200]
+        start = time.perf_counter()
+        for application_id in sample:
+            client.post(ENDPOINT, json={'ids': [application_id], 'status': 'Payment Under Review'})
+        per_row = (time.perf_counter() - start) / len(sample)
+        print(f"one application per request: {per_row * 1000:.2f}ms each, ~{per_row * n_applications:.1f}s for {n_applications}")
+    finally:
+        remove_db(db_path)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
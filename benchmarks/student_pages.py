@@ -0,0 +1,60 @@
+"""Query count check for the student pages.
+
+Seeds one student with a growing number of applications and asserts that
+dashboard, view_booking and track_application issue the same number of
+queries regardless of how many applications there are.
+
+    python -m benchmarks.student_pages
+"""
+
+from app import db
+from app.models import Application
+from benchmarks.common import count_queries, login_as, make_app, remove_db, sample_application, sample_room, summarize, timed
+
+STUDENT_ID = 620000001
+PAGES = ['/dashboard', '/view_booking', '/track_application']
+
+
+def seed(app, n):
+    with app.app_context():
+        Application.query.delete()
+        rooms = [sample_room(building=i % 4 + 1, floor_number=i % 6 + 1) for i in range(n)]
+        db.session.add_all(rooms)
+        db.session.flush()
+        db.session.add_all(sample_application(STUDENT_ID, room.id) for room in rooms)
+        db.session.commit()
+
+
+def page_query_counts(app, client):
+    counts = {}
+    with app.app_context():
+        engine = db.engine
+    for page in PAGES:
+        with count_queries(engine) as counter:
+            response = client.get(page)
+        assert response.status_code == 200, (page, response.status_code)
+        counts[page] = counter['count']
+    return counts
+
+
+def run(strategy, sizes=(1, 10, 100)):
+    app, db_path = make_app(ROOM_LOADING_STRATEGY=strategy)
+    try:
+        client = app.test_client()
+        login_as(client, STUDENT_ID)
+        baseline = None
+        for n in sizes:
+            seed(app, n)
+            counts = page_query_counts(app, client)
+            if baseline is None:
+                baseline = counts
+            assert counts == baseline, f"query count grew with {n} applications: {counts} != {baseline}"
+            latency = summarize(timed(lambda: client.get('/track_application'), 50))
+            print(f"{strategy:8} n={n:<4} queries={counts} track_application p50={latency['p50_ms']:.2f}ms")
+    finally:
+        remove_db(db_path)
+
+
+if __name__ == '__main__':
+    for strategy in ('joined', 'selectin'):
+        run(strategy)
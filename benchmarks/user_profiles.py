@@ -0,0 +1,115 @@
+"""User profile cache: the booking form with and without a cached profile.
+
+Also checks that profiles follow ORM edits, bulk updates and rolled back
+changes, and that the TTL and size cap hold.
+
+    python -m benchmarks.user_profiles [repeat]
+"""
+import sys
+import time
+
+from sqlalchemy import update
+
+from app import db
+from app.models import User
+from app.profiles import ProfileCache, UserProfile, get_profile
+from benchmarks.common import count_queries, login_as, make_app, remove_db, sample_room, summarize, timed
+
+STUDENT_ID = 620000001
+
+
+def seed():
+    db.session.add(User(user_id=STUDENT_ID, fname='Bench', lname='Student', email=f'{STUDENT_ID}@mymona.uwi.edu',
+                        usertype='student', password='x'))
+    room = sample_room()
+    db.session.add(room)
+    db.session.commit()
+    return room.id
+
+
+def check_invalidation():
+    profile = get_profile(STUDENT_ID)
+    assert isinstance(profile, UserProfile) and profile.fname == 'Bench'
+    assert get_profile(STUDENT_ID) is profile, 'second lookup is served from the cache'
+    try:
+        profile.fname = 'Changed'
+    except AttributeError:
+        pass
+    else:
+        raise AssertionError('profiles are immutable')
+
+    user = User.query.filter_by(user_id=STUDENT_ID).first()
+    user.fname = 'Renamed'
+    db.session.flush()
+    db.session.rollback()
+    assert get_profile(STUDENT_ID) is profile, 'rolled back edits keep the cached profile'
+
+    user = User.query.filter_by(user_id=STUDENT_ID).first()
+    user.fname = 'Renamed'
+    db.session.commit()
+    assert get_profile(STUDENT_ID).fname == 'Renamed', 'ORM edits drop the cached profile'
+
+    db.session.execute(update(User).where(User.user_id == STUDENT_ID).values(lname='Bulk'))
+    db.session.commit()
+    assert get_profile(STUDENT_ID).lname == 'Bulk', 'bulk user writes clear the cache'
+    assert get_profile(999) is None
+
+    short = ProfileCache(max_entries=2, ttl=0.05)
+    loads = []
+
+    def load(user_id):
+        loads.append(user_id)
+        return UserProfile(user_id, 'A', 'B', 'a@b', 'student')
+
+    for user_id in (1, 2, 3, 1):
+        short.get(user_id, load)
+    assert loads == [1, 2, 3, 1], 'the least recently used profile is evicted'
+    time.sleep(0.06)
+    short.get(1, load)
+    assert loads[-1] == 1 and len(loads) == 5, 'expired profiles are reloaded'
+
+
+def main(repeat=500):
+    app, db_path = make_app()
+    try:
+        with app.app_context():
+            room_id = seed()
+            profiles = app.extensions['user_profiles']
+            check_invalidation()
+
+            client = app.test_client()
+            login_as(client, STUDENT_ID)
+            url = f'/book_room/{room_id}/book'
+
+            def uncached():
+                profiles.clear()
+                client.get(url)
+
+            with count_queries(db.engine) as cold_queries:
+                uncached()
+            client.get(url)
+            with count_queries(db.engine) as warm_queries:
+                client.get(url)
+            assert warm_queries['count'] == cold_queries['count'] - 1, 'a cached profile saves the user query'
+
+            cold = summarize(timed(uncached, repeat))
+            warm = summarize(timed(lambda: client.get(url), repeat))
+            print(f"GET book_room  uncached p50 {cold['p50_ms']:6.3f}ms ({cold_queries['count']} queries)"
+                  f"  cached p50 {warm['p50_ms']:6.3f}ms ({warm_queries['count']} queries)")
+
+            start = time.perf_counter()
+            for _ in range(repeat):
+                profiles.clear()
+                get_profile(STUDENT_ID)
+            loaded = (time.perf_counter() - start) / repeat
+            start = time.perf_counter()
+            for _ in range(repeat):
+                get_profile(STUDENT_ID)
+            cached = (time.perf_counter() - start) / repeat
+            print(f"get_profile    load {loaded * 1e6:7.1f}us  cached {cached * 1e6:7.1f}us  stats {profiles.stats}")
+    finally:
+        remove_db(db_path)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
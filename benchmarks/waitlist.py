@@ -0,0 +1,277 @@
+"""Room waitlists: queue positions and promotions with a long queue.
+
+Walks a full room through the routes first: later applicants are
+waitlisted in priority order, see their position on track_application,
+and move up when a seat is released, an edit of the education level
+moves an applicant in the queue, and a stale queue entry is skipped
+without keeping the seat, and positions can be read while another thread
+applies queue changes. Then queues --entries applications
+for one room and times position lookups (against the COUNT(*) query they
+replace) and promotions as seats are released one at a time.
+
+    python -m benchmarks.waitlist [entries] [promotions]
+"""
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+
+from flask_migrate import stamp, upgrade
+from sqlalchemy import event, func, select, text, update
+
+from app import db
+from app.models import Application, Room, WaitlistEntry
+from app.reservations import priority_rank, release_application
+from app.transitions import transition_applications
+from app.waitlist import RoomQueue, Waitlist, get_waitlist
+from benchmarks.common import LEVELS, PROGRAMS, application_row, login_as, make_app, remove_db, sample_room, summarize
+from benchmarks.journey import application_form
+from config import BASE_DIR
+
+MIGRATIONS = os.path.join(BASE_DIR, 'migrations')
+FIRST_STUDENT_ID = 620000000
+
+
+def status(application_id):
+    return db.session.execute(select(Application.status).where(Application.id == application_id)).scalar()
+
+
+def application_id(sid, room_id):
+    return db.session.execute(select(Application.id).filter_by(student_id=str(sid), room_id=room_id)).scalar()
+
+
+def check_routes(app):
+    room = sample_room(total_rooms=1, booked_rooms=0, available_rooms=1)
+    db.session.add(room)
+    db.session.commit()
+    room_id = room.id
+
+    clients = {}
+    for n, level in enumerate(['undergraduate', 'undergraduate', 'postgraduate', 'undergraduate']):
+        sid = FIRST_STUDENT_ID + n
+        clients[sid] = client = app.test_client()
+        login_as(client, sid)
+        form = application_form(sid, room_id)
+        form['education_level'] = level
+        client.post('/submit_application', data=form)
+    first, second, postgrad, last = (application_id(sid, room_id) for sid in clients)
+    assert status(first) == 'Pending' and {status(second), status(postgrad), status(last)} == {'Waitlisted'}
+
+    # Postgraduates go ahead of earlier undergraduates
+    statements = []
+
+    def capture(conn, cursor, statement, *args):
+        statements.append(statement.lower())
+
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    body = clients[FIRST_STUDENT_ID + 1].get('/track_application').get_data(as_text=True)
+    event.remove(db.engine, 'before_cursor_execute', capture)
+    assert 'You are number 2 on its waitlist' in body, body
+    assert not any('count(' in statement for statement in statements), 'positions are not counted per view'
+    assert 'number 1 on' in clients[FIRST_STUDENT_ID + 2].get('/track_application').get_data(as_text=True)
+
+    clients[FIRST_STUDENT_ID].post(f'/withdraw_application/{first}')
+    assert status(postgrad) == 'Pending', 'a released seat goes to the head of the waitlist'
+    room = db.session.get(Room, room_id)
+    db.session.refresh(room)
+    assert (room.booked_rooms, room.available_rooms) == (1, 0)
+    assert 'number 1 on' in clients[FIRST_STUDENT_ID + 1].get('/track_application').get_data(as_text=True)
+
+    clients[FIRST_STUDENT_ID + 1].post(f'/withdraw_application/{second}')
+    assert status(second) == 'Withdrawn' and db.session.get(Room, room_id).booked_rooms == 1
+    assert 'number 1 on' in clients[FIRST_STUDENT_ID + 3].get('/track_application').get_data(as_text=True)
+
+    outcomes = transition_applications([postgrad], 'Rejected')
+    assert outcomes[0]['outcome'] == 'applied' and status(last) == 'Pending', 'bulk transitions promote too'
+    assert db.session.execute(select(func.count()).select_from(WaitlistEntry)).scalar() == 0
+
+
+def check_edit_and_stale_entry(app):
+    room = sample_room(total_rooms=1, booked_rooms=0, available_rooms=1)
+    db.session.add(room)
+    db.session.commit()
+    room_id = room.id
+    clients = {}
+    for n in range(3):
+        sid = FIRST_STUDENT_ID + 100 + n
+        clients[sid] = client = app.test_client()
+        login_as(client, sid)
+        client.post('/submit_application', data=application_form(sid, room_id))
+    holder, second, third = (application_id(sid, room_id) for sid in clients)
+    third_client = clients[FIRST_STUDENT_ID + 102]
+    assert 'number 2 on' in third_client.get('/track_application').get_data(as_text=True)
+
+    # The edit form posts the same fields as the booking form; a masters
+    # student goes ahead of a bachelors one at the same level
+    third_client.post(f'/edit_application/{room_id}', data={'education_level': 'undergraduate', 'programType': 'masters', 'agreement': 'on'})
+    assert 'number 1 on' in third_client.get('/track_application').get_data(as_text=True), 'edits re-rank the queue'
+    clients[FIRST_STUDENT_ID + 101].post(f'/edit_application/{room_id}', data={'education_level': 'postgraduate', 'agreement': 'on'})
+    assert 'number 2 on' in third_client.get('/track_application').get_data(as_text=True), 'postgraduates go first'
+
+    # Leave a stale entry at the head, as a status change outside the waitlist would
+    db.session.execute(update(Application).where(Application.id == second).values(status='Rejected'))
+    db.session.commit()
+    clients[FIRST_STUDENT_ID + 100].post(f'/withdraw_application/{holder}')
+    assert status(second) == 'Rejected' and status(third) == 'Pending', 'the stale entry is skipped'
+    room = db.session.get(Room, room_id)
+    db.session.refresh(room)
+    assert (room.booked_rooms, room.available_rooms) == (1, 0)
+    assert db.session.execute(select(func.count()).select_from(WaitlistEntry).filter_by(room_id=room_id)).scalar() == 0
+
+
+def check_concurrent_reads():
+    # Readers walk the priority buckets while apply() adds new priorities
+    waitlist = Waitlist()
+    waitlist._rooms[1] = RoomQueue((0, application_id) for application_id in range(1, 101))
+    errors = []
+    done = threading.Event()
+
+    def reader():
+        try:
+            while not done.is_set():
+                for application_id in range(1, 101, 7):
+                    assert waitlist.position(1, application_id) == application_id
+        except Exception as exc:
+            errors.append(exc)
+            done.set()
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    threads = [threading.Thread(target=reader) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    deadline = time.perf_counter() + 1.0
+    n = 0
+    while time.perf_counter() < deadline and not done.is_set():
+        application_id = 1000 + n
+        waitlist.apply([('add', 1, 1 + n, application_id)])
+        waitlist.apply([('remove', 1, None, application_id)])
+        n += 1
+    done.set()
+    for thread in threads:
+        thread.join()
+    sys.setswitchinterval(interval)
+    assert not errors, errors
+
+
+def seed_queue(room_id, entries, rnd):
+    now = datetime.utcnow()
+    rows = []
+    for index in range(entries):
+        rows.append(application_row(
+            FIRST_STUDENT_ID + 1000 + index, room_id, status='Waitlisted',
+            education_level=rnd.choice(LEVELS),
+            program_type=rnd.choice(PROGRAMS),
+        ))
+    for start in range(0, entries, 10_000):
+        db.session.execute(Application.__table__.insert(), rows[start:start + 10_000])
+    db.session.commit()
+    applications = db.session.execute(
+        select(Application.id, Application.education_level, Application.program_type)
+        .where(Application.room_id == room_id, Application.status == 'Waitlisted')
+    ).all()
+    db.session.execute(WaitlistEntry.__table__.insert(), [
+        {'application_id': application.id, 'room_id': room_id, 'priority': priority_rank(application), 'created_at': now}
+        for application in applications
+    ])
+    db.session.commit()
+    return [application.id for application in applications]
+
+
+def counted_position(room_id, application_id):
+    # What a position costs without the in-memory queue
+    return db.session.execute(text(
+        "SELECT COUNT(*) + 1 FROM waitlist w, waitlist me WHERE me.application_id = :id AND w.room_id = :room "
+        "AND (w.priority < me.priority OR (w.priority = me.priority AND w.application_id < me.application_id))"
+    ), {'id': application_id, 'room': room_id}).scalar()
+
+
+def check_migration(app):
+    with app.app_context():
+        db.session.execute(text("DROP TABLE waitlist"))
+        db.session.commit()
+        db.session.remove()
+        stamp(directory=MIGRATIONS, revision='3e8a6d0f2c71')
+        upgrade(directory=MIGRATIONS, revision='9c4f1b7e2a08')
+        indexes = {row[1] for row in db.session.execute(text("PRAGMA index_list(waitlist)"))}
+        assert 'ix_waitlist_room_priority' in indexes
+
+
+def main(entries=100_000, promotions=200):
+    app, db_path = make_app(WAITLIST_MAX_AGE=3600)
+    try:
+        with app.app_context():
+            check_routes(app)
+            check_edit_and_stale_entry(app)
+            check_concurrent_reads()
+
+            rnd = random.Random(0)
+            holder = sample_room(total_rooms=promotions, booked_rooms=promotions, available_rooms=0)
+            db.session.add(holder)
+            db.session.commit()
+            room_id = holder.id
+            db.session.execute(Application.__table__.insert(), [
+                application_row(FIRST_STUDENT_ID + 500_000 + n, room_id) for n in range(promotions)
+            ])
+            db.session.commit()
+            start = time.perf_counter()
+            ids = seed_queue(room_id, entries, rnd)
+            print(f"queued {entries} entries in {time.perf_counter() - start:.1f}s")
+
+            waitlist = get_waitlist()
+            waitlist.clear()
+            start = time.perf_counter()
+            waitlist.queue(room_id)
+            print(f"load room queue: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+            sample = rnd.sample(ids, 500)
+            expected = {application_id: counted_position(room_id, application_id) for application_id in sample[:50]}
+            for application_id, position in expected.items():
+                assert waitlist.position(room_id, application_id) == position, application_id
+
+            samples = []
+            for application_id in sample:
+                start = time.perf_counter()
+                waitlist.position(room_id, application_id)
+                samples.append(time.perf_counter() - start)
+            memory = summarize(samples)
+            samples = []
+            for application_id in sample[:100]:
+                start = time.perf_counter()
+                counted_position(room_id, application_id)
+                samples.append(time.perf_counter() - start)
+            counted = summarize(samples)
+            print(f"position  in memory p50 {memory['p50_ms'] * 1000:7.1f}us p99 {memory['p99_ms'] * 1000:7.1f}us"
+                  f"   COUNT(*) p50 {counted['p50_ms']:7.2f}ms p99 {counted['p99_ms']:7.2f}ms")
+
+            holders = db.session.execute(
+                select(Application).where(Application.room_id == room_id, Application.status == 'Pending')
+            ).scalars().all()
+            tail = max(ids, key=lambda application_id: (waitlist.position(room_id, application_id), application_id))
+            before = waitlist.position(room_id, tail)
+            head = db.session.execute(
+                select(WaitlistEntry.application_id).where(WaitlistEntry.room_id == room_id)
+                .order_by(WaitlistEntry.priority, WaitlistEntry.application_id).limit(promotions)
+            ).scalars().all()
+            samples = []
+            for application in holders[:promotions]:
+                start = time.perf_counter()
+                release_application(application, 'Withdrawn')
+                samples.append(time.perf_counter() - start)
+            promoted = summarize(samples)
+            assert [status(application_id) for application_id in head] == ['Pending'] * len(head), 'the head of the queue was promoted, in order'
+            assert waitlist.position(room_id, tail) == before - len(head)
+            assert waitlist.position(room_id, head[-1]) is None
+            room = db.session.get(Room, room_id)
+            assert (room.booked_rooms, room.available_rooms) == (promotions, 0)
+            print(f"release + promote ({len(samples)} seats)  p50 {promoted['p50_ms']:.2f}ms  p99 {promoted['p99_ms']:.2f}ms")
+
+        check_migration(app)
+    finally:
+        remove_db(db_path)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -4,6 +4,80 @@ BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 
 class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'uwiuwiuwi')
-    SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(BASE_DIR, 'uwidormfinder.db')}"
+    # DATABASE_URL can point at another database, e.g. a local PostgreSQL
+    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', f"sqlite:///{os.path.join(BASE_DIR, 'uwidormfinder.db')}").replace('postgres://', 'postgresql://', 1)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_ECHO = True
\ No newline at end of file
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', '10')),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '20')),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', '30')),
+        'pool_pre_ping': True,
+    }
+    # Applied to every new SQLite connection, see app/engine.py
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+        'cache_size': -int(os.getenv('SQLITE_CACHE_KB', '20000')),
+        'mmap_size': int(os.getenv('SQLITE_MMAP_BYTES', str(256 * 1024 * 1024))),
+        'temp_store': 'MEMORY',
+    }
+    SQLALCHEMY_ECHO = os.getenv('SQLALCHEMY_ECHO', '0') == '1'
+    # Eager loading strategy for Application.room: 'joined' or 'selectin'
+    ROOM_LOADING_STRATEGY = os.getenv('ROOM_LOADING_STRATEGY', 'joined')
+    # Answer room_search from an in-process index instead of querying rooms
+    ROOM_INVENTORY_INDEX = os.getenv('ROOM_INVENTORY_INDEX', '1') == '1'
+    # Seconds before a worker rebuilds its index to pick up other workers' writes
+    ROOM_INVENTORY_MAX_AGE = int(os.getenv('ROOM_INVENTORY_MAX_AGE', '30'))
+    # Attempts and base delay (seconds) when a booking hits a locked database
+    RESERVATION_MAX_ATTEMPTS = int(os.getenv('RESERVATION_MAX_ATTEMPTS', '5'))
+    RESERVATION_BACKOFF = float(os.getenv('RESERVATION_BACKOFF', '0.05'))
+    # SQL timing: per-statement totals plus logging of slow and sampled statements
+    SQL_METRICS_ENABLED = os.getenv('SQL_METRICS_ENABLED', '0') == '1'
+    SQL_SLOW_THRESHOLD_MS = float(os.getenv('SQL_SLOW_THRESHOLD_MS', '100'))
+    SQL_LOG_SAMPLE_RATE = float(os.getenv('SQL_LOG_SAMPLE_RATE', '0'))
+    SQL_LOG_PARAMETERS = os.getenv('SQL_LOG_PARAMETERS', '0') == '1'
+    # Server-Timing headers and per-endpoint histograms served by /metrics
+    REQUEST_METRICS_ENABLED = os.getenv('REQUEST_METRICS_ENABLED', '0') == '1'
+    REQUEST_METRICS_LOG = os.getenv('REQUEST_METRICS_LOG', '0') == '1'
+    REQUEST_METRICS_WINDOW = int(os.getenv('REQUEST_METRICS_WINDOW', '300'))
+    # Bearer token that lets a metrics scraper read /metrics without an admin session
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+    # Largest request body Flask accepts, and the cap applied while streaming a receipt
+    MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', str(5 * 1024 * 1024)))
+    RECEIPT_MAX_BYTES = MAX_CONTENT_LENGTH
+    RECEIPT_STORAGE_DIR = os.getenv('RECEIPT_STORAGE_DIR', os.path.join(BASE_DIR, 'app', 'static', 'uploads', 'receipts'))
+    # Password KDF cost, and the process pool it runs in (0 workers hashes inline)
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000000')
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', '32'))
+    PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', '10'))
+    # Token buckets for CPU-heavy endpoints, per client and shared (rates are per second)
+    ADMISSION_CONTROL_ENABLED = os.getenv('ADMISSION_CONTROL_ENABLED', '1') == '1'
+    ADMISSION_LIMITS = {
+        'auth': {'client_rate': 0.5, 'client_burst': 5, 'total_rate': 20, 'total_burst': 40},
+        'upload': {'client_rate': 0.2, 'client_burst': 3, 'total_rate': 5, 'total_burst': 10},
+    }
+    ADMISSION_MAX_CLIENTS = int(os.getenv('ADMISSION_MAX_CLIENTS', '10000'))
+    # Rows per page for room_search, view_booking and track_application
+    PAGE_SIZE = int(os.getenv('PAGE_SIZE', '20'))
+    # Output of `flask assets build`; templates use /static until it exists
+    ASSET_BUILD_DIR = os.getenv('ASSET_BUILD_DIR', os.path.join(BASE_DIR, 'build', 'assets'))
+    # Room image variants written by `flask images build` and after `flask rooms import`
+    IMAGE_WIDTHS = tuple(int(width) for width in os.getenv('IMAGE_WIDTHS', '320,640,960').split(','))
+    IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', '2'))
+    IMAGE_MANIFEST = os.getenv('IMAGE_MANIFEST', os.path.join(BASE_DIR, 'app', 'static', 'images', 'variants.json'))
+    # Serialized /api/rooms responses kept per worker
+    API_CACHE_SIZE = int(os.getenv('API_CACHE_SIZE', '256'))
+    # Rendered room card fragments kept per worker, see app/fragments.py
+    FRAGMENT_CACHE_MAX_ENTRIES = int(os.getenv('FRAGMENT_CACHE_MAX_ENTRIES', '5000'))
+    FRAGMENT_CACHE_MAX_BYTES = int(os.getenv('FRAGMENT_CACHE_MAX_BYTES', str(4 * 1024 * 1024)))
+    FRAGMENT_CACHE_MAX_AGE = int(os.getenv('FRAGMENT_CACHE_MAX_AGE', '300'))
+    # Read-only user profiles kept per worker, see app/profiles.py
+    PROFILE_CACHE_SIZE = int(os.getenv('PROFILE_CACHE_SIZE', '10000'))
+    PROFILE_CACHE_TTL = int(os.getenv('PROFILE_CACHE_TTL', '300'))
+    # Seconds before a worker reloads a room's waitlist copy, see app/waitlist.py
+    WAITLIST_MAX_AGE = int(os.getenv('WAITLIST_MAX_AGE', '30'))
+    # Application event log retention, see app/events.py
+    EVENT_RETENTION_DAYS = int(os.getenv('EVENT_RETENTION_DAYS', '365'))
+    EVENT_PRUNE_BATCH_SIZE = int(os.getenv('EVENT_PRUNE_BATCH_SIZE', '5000'))
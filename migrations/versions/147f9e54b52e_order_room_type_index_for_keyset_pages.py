@@ -0,0 +1,32 @@
+"""Order the room_type index for keyset pagination
+
+Drops available_rooms from ix_rooms_type_building_floor so that
+room_type = ? ORDER BY building, floor_number, id is read straight from the
+index without a temp b-tree.
+
+Revision ID: 147f9e54b52e
+Revises: dd6b6267697c
+Create Date: 2026-10-18 11:40:52.904113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '147f9e54b52e'
+down_revision = 'dd6b6267697c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('rooms', schema=None) as batch_op:
+        batch_op.drop_index('ix_rooms_type_building_floor')
+        batch_op.create_index('ix_rooms_type_building_floor', ['room_type', 'building', 'floor_number'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('rooms', schema=None) as batch_op:
+        batch_op.drop_index('ix_rooms_type_building_floor')
+        batch_op.create_index('ix_rooms_type_building_floor', ['room_type', 'building', 'floor_number', 'available_rooms'], unique=False)
@@ -0,0 +1,77 @@
+"""Make (student_id, room_id) unique on applications
+
+Duplicates left by the old check-then-insert are removed first. Each
+(student_id, room_id) group keeps the application with a receipt, then one
+that still holds a seat, then the oldest; removed applications that held
+a seat give it back to the room counters.
+
+Revision ID: 3e8a6d0f2c71
+Revises: 5b0c2e7a91d4
+Create Date: 2026-10-18 13:41:27.905316
+
+"""
+from itertools import groupby
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3e8a6d0f2c71'
+down_revision = '5b0c2e7a91d4'
+branch_labels = None
+depends_on = None
+
+HOLDING_STATUSES = ('Pending', 'Application Approved', 'Payment Under Review', 'Room Booked')
+
+
+def remove_duplicates(connection):
+    rows = connection.execute(sa.text(
+        "SELECT a.id, a.student_id, a.room_id, a.status, r.id IS NOT NULL AS has_receipt "
+        "FROM applications a "
+        "JOIN (SELECT student_id, room_id FROM applications WHERE room_id IS NOT NULL "
+        "      GROUP BY student_id, room_id HAVING COUNT(*) > 1) d "
+        "  ON d.student_id = a.student_id AND d.room_id = a.room_id "
+        "LEFT JOIN receipts r ON r.application_id = a.id "
+        "ORDER BY a.student_id, a.room_id"
+    )).fetchall()
+
+    removed, seats = [], {}
+    for _, group in groupby(rows, key=lambda row: (row.student_id, row.room_id)):
+        group = sorted(group, key=lambda row: (not row.has_receipt, row.status not in HOLDING_STATUSES, row.id))
+        for row in group[1:]:
+            removed.append(row.id)
+            if row.status in HOLDING_STATUSES:
+                seats[row.room_id] = seats.get(row.room_id, 0) + 1
+
+    for start in range(0, len(removed), 500):
+        ids = {'ids': removed[start:start + 500]}
+        connection.execute(sa.text("DELETE FROM receipts WHERE application_id IN :ids").bindparams(sa.bindparam('ids', expanding=True)), ids)
+        connection.execute(sa.text("DELETE FROM applications WHERE id IN :ids").bindparams(sa.bindparam('ids', expanding=True)), ids)
+    if seats:
+        connection.execute(sa.text(
+            "UPDATE rooms SET "
+            "booked_rooms = CASE WHEN booked_rooms > :n THEN booked_rooms - :n ELSE 0 END, "
+            "available_rooms = available_rooms + CASE WHEN booked_rooms > :n THEN :n ELSE booked_rooms END "
+            "WHERE id = :room_id"
+        ), [{'room_id': room_id, 'n': n} for room_id, n in seats.items()])
+
+
+def upgrade():
+    connection = op.get_bind()
+    indexes = {index['name'] for index in sa.inspect(connection).get_indexes('applications')}
+    # A table made by create_all already has the unique index and no duplicates
+    if 'uq_applications_student_id_room_id' in indexes:
+        return
+    remove_duplicates(connection)
+
+    with op.batch_alter_table('applications', schema=None) as batch_op:
+        if 'ix_applications_student_id_room_id' in indexes:
+            batch_op.drop_index('ix_applications_student_id_room_id')
+        batch_op.create_index('uq_applications_student_id_room_id', ['student_id', 'room_id'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('applications', schema=None) as batch_op:
+        batch_op.drop_index('uq_applications_student_id_room_id')
+        batch_op.create_index('ix_applications_student_id_room_id', ['student_id', 'room_id'], unique=False)
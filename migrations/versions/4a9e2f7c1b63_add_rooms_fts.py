@@ -0,0 +1,50 @@
+"""Add rooms_fts full-text index and its triggers
+
+Revision ID: 4a9e2f7c1b63
+Revises: e71b3c9d5a24
+Create Date: 2026-10-18 17:26:48.519037
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4a9e2f7c1b63'
+down_revision = 'e71b3c9d5a24'
+branch_labels = None
+depends_on = None
+
+
+# External-content index over rooms.description. A batch_alter_table that
+# recreates rooms drops these triggers; run 'rebuild' after recreating them
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS rooms_fts USING fts5("
+        "description, content='rooms', content_rowid='id', tokenize='porter unicode61')"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS rooms_fts_ai AFTER INSERT ON rooms BEGIN "
+        "INSERT INTO rooms_fts(rowid, description) VALUES (new.id, new.description); END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS rooms_fts_ad AFTER DELETE ON rooms BEGIN "
+        "INSERT INTO rooms_fts(rooms_fts, rowid, description) VALUES ('delete', old.id, old.description); END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS rooms_fts_au AFTER UPDATE OF description ON rooms BEGIN "
+        "INSERT INTO rooms_fts(rooms_fts, rowid, description) VALUES ('delete', old.id, old.description); "
+        "INSERT INTO rooms_fts(rowid, description) VALUES (new.id, new.description); END"
+    )
+    op.execute("INSERT INTO rooms_fts(rooms_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("DROP TRIGGER IF EXISTS rooms_fts_au")
+    op.execute("DROP TRIGGER IF EXISTS rooms_fts_ad")
+    op.execute("DROP TRIGGER IF EXISTS rooms_fts_ai")
+    op.execute("DROP TABLE IF EXISTS rooms_fts")
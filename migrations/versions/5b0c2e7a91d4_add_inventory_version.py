@@ -0,0 +1,34 @@
+"""Add inventory_version change counter
+
+Single-row table bumped by every transaction that writes rooms, read by the
+JSON room API to build ETags.
+
+Revision ID: 5b0c2e7a91d4
+Revises: 147f9e54b52e
+Create Date: 2026-10-18 12:58:10.318420
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b0c2e7a91d4'
+down_revision = '147f9e54b52e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_app runs create_all before Alembic, so the table may exist already
+    if not sa.inspect(op.get_bind()).has_table('inventory_version'):
+        op.create_table('inventory_version',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('version', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('id')
+        )
+    op.execute("INSERT INTO inventory_version (id, version) SELECT 1, 0 WHERE NOT EXISTS (SELECT 1 FROM inventory_version WHERE id = 1)")
+
+
+def downgrade():
+    op.drop_table('inventory_version')
@@ -0,0 +1,45 @@
+"""Add waitlist table
+
+One row per Waitlisted application, read in (room_id, priority,
+application_id) order when a seat frees up.
+
+Revision ID: 9c4f1b7e2a08
+Revises: 3e8a6d0f2c71
+Create Date: 2026-10-18 14:26:53.610472
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c4f1b7e2a08'
+down_revision = '3e8a6d0f2c71'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_app runs create_all before Alembic, so the table may exist already
+    if sa.inspect(op.get_bind()).has_table('waitlist'):
+        return
+    op.create_table('waitlist',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('application_id', sa.Integer(), nullable=False),
+        sa.Column('room_id', sa.Integer(), nullable=False),
+        sa.Column('priority', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['application_id'], ['applications.id'], ),
+        sa.ForeignKeyConstraint(['room_id'], ['rooms.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('application_id')
+    )
+    with op.batch_alter_table('waitlist', schema=None) as batch_op:
+        batch_op.create_index('ix_waitlist_room_priority', ['room_id', 'priority', 'application_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('waitlist', schema=None) as batch_op:
+        batch_op.drop_index('ix_waitlist_room_priority')
+
+    op.drop_table('waitlist')
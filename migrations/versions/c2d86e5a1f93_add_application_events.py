@@ -0,0 +1,44 @@
+"""Add application_events log
+
+Revision ID: c2d86e5a1f93
+Revises: 9c4f1b7e2a08
+Create Date: 2026-10-18 15:08:34.274519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2d86e5a1f93'
+down_revision = '9c4f1b7e2a08'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_app runs create_all before Alembic, so the table may exist already
+    if sa.inspect(op.get_bind()).has_table('application_events'):
+        return
+    op.create_table('application_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('application_id', sa.Integer(), nullable=False),
+        sa.Column('ts', sa.DateTime(), nullable=False),
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('old_status', sa.String(length=50), nullable=True),
+        sa.Column('new_status', sa.String(length=50), nullable=True),
+        sa.Column('actor', sa.String(length=20), nullable=True),
+        sa.Column('detail', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('application_events', schema=None) as batch_op:
+        batch_op.create_index('ix_application_events_application_ts', ['application_id', 'ts'], unique=False)
+        batch_op.create_index('ix_application_events_ts', ['ts'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('application_events', schema=None) as batch_op:
+        batch_op.drop_index('ix_application_events_ts')
+        batch_op.drop_index('ix_application_events_application_ts')
+
+    op.drop_table('application_events')
@@ -0,0 +1,43 @@
+"""Create receipts table
+
+Revision ID: dd6b6267697c
+Revises: f7436d0620e1
+Create Date: 2026-10-18 10:02:17.530961
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'dd6b6267697c'
+down_revision = 'f7436d0620e1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_app runs create_all before Alembic, so the table may exist already
+    if sa.inspect(op.get_bind()).has_table('receipts'):
+        return
+    op.create_table('receipts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('application_id', sa.Integer(), nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('path', sa.String(length=255), nullable=False),
+        sa.Column('original_filename', sa.String(length=255), nullable=True),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('uploaded_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['application_id'], ['applications.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('application_id')
+    )
+    with op.batch_alter_table('receipts', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_receipts_sha256'), ['sha256'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('receipts', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_receipts_sha256'))
+
+    op.drop_table('receipts')
@@ -0,0 +1,56 @@
+"""Add occupancy_summary and occupancy_state
+
+Revision ID: e71b3c9d5a24
+Revises: c2d86e5a1f93
+Create Date: 2026-10-18 16:42:11.803265
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e71b3c9d5a24'
+down_revision = 'c2d86e5a1f93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_app runs create_all before Alembic; tables made there start
+    # marked dirty and are filled on the first read
+    if sa.inspect(op.get_bind()).has_table('occupancy_state'):
+        return
+    op.create_table('occupancy_summary',
+        sa.Column('building', sa.Integer(), nullable=False),
+        sa.Column('floor_number', sa.Integer(), nullable=False),
+        sa.Column('room_type', sa.String(length=50), nullable=False),
+        sa.Column('status', sa.String(length=50), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('building', 'floor_number', 'room_type', 'status')
+    )
+    op.create_table('occupancy_state',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('dirty', sa.Boolean(), nullable=False),
+        sa.Column('rebuilt_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    # Filled from the existing rows here, then kept incrementally by app/occupancy.py
+    op.execute(
+        "INSERT INTO occupancy_summary (building, floor_number, room_type, status, count) "
+        "SELECT r.building, r.floor_number, r.room_type, COALESCE(a.status, ''), COUNT(*) "
+        "FROM applications a JOIN rooms r ON r.id = a.room_id "
+        "GROUP BY r.building, r.floor_number, r.room_type, COALESCE(a.status, '')"
+    )
+    for column, bucket in (('total_rooms', 'seats:total'), ('booked_rooms', 'seats:booked'), ('available_rooms', 'seats:available')):
+        op.execute(
+            "INSERT INTO occupancy_summary (building, floor_number, room_type, status, count) "
+            f"SELECT building, floor_number, room_type, '{bucket}', SUM(COALESCE({column}, 0)) "
+            "FROM rooms GROUP BY building, floor_number, room_type"
+        )
+    op.execute("INSERT INTO occupancy_state (id, dirty, rebuilt_at) VALUES (1, false, CURRENT_TIMESTAMP)")
+
+
+def downgrade():
+    op.drop_table('occupancy_state')
+    op.drop_table('occupancy_summary')
@@ -0,0 +1,44 @@
+"""Add indexes for application and room search lookups
+
+Revision ID: f7436d0620e1
+Revises: 7d961e4b544c
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7436d0620e1'
+down_revision = '7d961e4b544c'
+branch_labels = None
+depends_on = None
+
+
+def index_names(table):
+    return {index['name'] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    # Tables made by create_all (create_app runs it before Alembic) already have their indexes
+    applications = index_names('applications')
+    if not applications & {'ix_applications_student_id_room_id', 'uq_applications_student_id_room_id'}:
+        with op.batch_alter_table('applications', schema=None) as batch_op:
+            batch_op.create_index('ix_applications_student_id_room_id', ['student_id', 'room_id'], unique=False)
+
+    rooms = index_names('rooms')
+    with op.batch_alter_table('rooms', schema=None) as batch_op:
+        if 'ix_rooms_type_building_floor' not in rooms:
+            batch_op.create_index('ix_rooms_type_building_floor', ['room_type', 'building', 'floor_number', 'available_rooms'], unique=False)
+        if 'ix_rooms_building_floor' not in rooms:
+            batch_op.create_index('ix_rooms_building_floor', ['building', 'floor_number'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('rooms', schema=None) as batch_op:
+        batch_op.drop_index('ix_rooms_building_floor')
+        batch_op.drop_index('ix_rooms_type_building_floor')
+
+    with op.batch_alter_table('applications', schema=None) as batch_op:
+        batch_op.drop_index('ix_applications_student_id_room_id')